@@ -0,0 +1,28 @@
+# benchmarks/_synthetic_corpus.py
+# Zipf-distributed synthetic text, shaped like chunked technical docs (no downloads needed).
+import random
+
+
+def synthetic_texts(n_docs: int, vocab_size: int = 50_000, min_len: int = 40, max_len: int = 160, seed: int = 0):
+	rng = random.Random(seed)
+	vocab = [f"t{i}" for i in range(vocab_size)]
+	weights = [1.0 / (i + 1) for i in range(vocab_size)]
+	cum = []
+	total = 0.0
+	for w in weights:
+		total += w
+		cum.append(total)
+	for _ in range(n_docs):
+		k = rng.randint(min_len, max_len)
+		yield " ".join(rng.choices(vocab, cum_weights=cum, k=k))
+
+
+def synthetic_queries(n: int, vocab_size: int = 50_000, terms: int = 6, seed: int = 1):
+	# mostly mid-frequency terms plus a couple of common ones, like real questions
+	rng = random.Random(seed)
+	out = []
+	for _ in range(n):
+		common = [f"t{rng.randint(0, 50)}" for _ in range(2)]
+		rare = [f"t{rng.randint(50, vocab_size // 4)}" for _ in range(terms - 2)]
+		out.append(" ".join(common + rare))
+	return out
@@ -0,0 +1,30 @@
+# benchmarks/_tiny_lm.py
+# Randomly initialised Llama-style causal LM, small enough to benchmark on CPU without downloads.
+import torch
+from transformers import LlamaConfig, LlamaForCausalLM
+
+
+def tiny_causal_lm(hidden_size: int = 256, layers: int = 4, vocab_size: int = 4096, seed: int = 0):
+	torch.manual_seed(seed)
+	config = LlamaConfig(
+		vocab_size=vocab_size,
+		hidden_size=hidden_size,
+		intermediate_size=hidden_size * 4,
+		num_hidden_layers=layers,
+		num_attention_heads=max(1, hidden_size // 64),
+		num_key_value_heads=max(1, hidden_size // 64),
+		max_position_embeddings=4096,
+		pad_token_id=0,
+		bos_token_id=1,
+		eos_token_id=2,
+	)
+	return LlamaForCausalLM(config).eval()
+
+
+def random_prompts(n: int, vocab_size: int = 4096, min_len: int = 16, max_len: int = 256, seed: int = 0):
+	g = torch.Generator().manual_seed(seed)
+	out = []
+	for _ in range(n):
+		length = int(torch.randint(min_len, max_len + 1, (1,), generator=g))
+		out.append(torch.randint(3, vocab_size, (length,), generator=g))
+	return out
@@ -0,0 +1,91 @@
+# benchmarks/bench_backends.py
+"""
+Compare LLMHandler inference backends on a small model.
+
+	python -m benchmarks.bench_backends --model HuggingFaceTB/SmolLM2-135M-Instruct \\
+		--backends cpu_fp32 cpu_int8 cpu_bf16 --new-tokens 64
+
+Each backend runs in its own subprocess so resident memory is not polluted by
+the previous one. Reports load time, resident memory after load, and decode tokens/s.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def _rss_mb() -> float:
+	try:
+		import psutil
+		return psutil.Process().memory_info().rss / 1024**2
+	except Exception:
+		pass
+	try:
+		with open("/proc/self/statm") as f:
+			return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+	except Exception:
+		import resource	# peak, not current, but better than nothing
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_one(model_id: str, backend: str, new_tokens: int, repeats: int) -> dict:
+	import torch
+	from transformers import AutoTokenizer
+	from chat_app.llm_handler import load_model
+
+	base_rss = _rss_mb()
+	t0 = time.perf_counter()
+	model = load_model(model_id, backend)
+	load_s = time.perf_counter() - t0
+	rss = _rss_mb() - base_rss
+
+	tok = AutoTokenizer.from_pretrained(model_id)
+	prompt = "Explain in a few sentences how a BM25 retriever ranks documents."
+	enc = tok(prompt, return_tensors="pt").to(next(model.parameters()).device)
+
+	with torch.inference_mode():
+		model.generate(**enc, max_new_tokens=4, do_sample=False)	# warm-up
+		generated, elapsed = 0, 0.0
+		for _ in range(repeats):
+			t0 = time.perf_counter()
+			out = model.generate(**enc, max_new_tokens=new_tokens, min_new_tokens=new_tokens, do_sample=False)
+			elapsed += time.perf_counter() - t0
+			generated += out.shape[-1] - enc["input_ids"].shape[-1]
+
+	return {
+		"backend": backend,
+		"load_s": round(load_s, 2),
+		"rss_mb": round(rss, 1),
+		"tokens_per_s": round(generated / elapsed, 2) if elapsed else 0.0,
+	}
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument("--model", default="HuggingFaceTB/SmolLM2-135M-Instruct")
+	ap.add_argument("--backends", nargs="+", default=["cpu_fp32", "cpu_int8", "cpu_bf16"])
+	ap.add_argument("--new-tokens", type=int, default=64)
+	ap.add_argument("--repeats", type=int, default=3)
+	ap.add_argument("--single", help=argparse.SUPPRESS)
+	args = ap.parse_args()
+
+	if args.single:
+		print(json.dumps(_run_one(args.model, args.single, args.new_tokens, args.repeats)))
+		return
+
+	print(f"{'backend':<10} {'load_s':>8} {'rss_mb':>9} {'tok/s':>8}")
+	for backend in args.backends:
+		cmd = [sys.executable, "-m", "benchmarks.bench_backends", "--model", args.model,
+			   "--new-tokens", str(args.new_tokens), "--repeats", str(args.repeats), "--single", backend]
+		proc = subprocess.run(cmd, capture_output=True, text=True)
+		if proc.returncode != 0:
+			print(f"{backend:<10} failed: {proc.stderr.strip().splitlines()[-1] if proc.stderr else proc.returncode}")
+			continue
+		r = json.loads(proc.stdout.strip().splitlines()[-1])
+		print(f"{r['backend']:<10} {r['load_s']:>8} {r['rss_mb']:>9} {r['tokens_per_s']:>8}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,99 @@
+# benchmarks/bench_batching.py
+"""
+Load test for the continuous-batching scheduler against a tiny local causal LM (CPU is fine).
+
+	python -m benchmarks.bench_batching --clients 8 --requests 32 --new-tokens 64
+
+Reports generated tokens/s for one-at-a-time model.generate (what LLMHandler did
+before) and for BatchScheduler with the same prompts submitted from concurrent threads.
+"""
+import argparse
+import threading
+import time
+
+import torch
+
+from chat_app.batch_scheduler import BatchScheduler
+from ._tiny_lm import tiny_causal_lm, random_prompts
+
+
+def _percentile(xs, p):
+	xs = sorted(xs)
+	return xs[min(len(xs) - 1, int(round(p / 100.0 * (len(xs) - 1))))] if xs else 0.0
+
+
+def run_sequential(model, prompts, new_tokens):
+	lock = threading.Lock()	# mimics a single shared model: one generate at a time
+	t0 = time.perf_counter()
+	total = 0
+	with torch.inference_mode():
+		for p in prompts:
+			with lock:
+				out = model.generate(
+					input_ids=p.unsqueeze(0),
+					attention_mask=torch.ones_like(p).unsqueeze(0),
+					max_new_tokens=new_tokens,
+					min_new_tokens=new_tokens,
+					do_sample=False,
+					pad_token_id=0,
+				)
+			total += out.shape[-1] - p.numel()
+	return total, time.perf_counter() - t0
+
+
+def run_batched(model, prompts, new_tokens, clients, max_batch):
+	sched = BatchScheduler(model, pad_token_id=0, max_batch_size=max_batch, max_wait_ms=5)
+	sched.start()
+	latencies = []
+	totals = []
+	work = list(prompts)
+	lock = threading.Lock()
+
+	def _client():
+		while True:
+			with lock:
+				if not work:
+					return
+				p = work.pop()
+			req = sched.submit(p, max_new_tokens=new_tokens, eos_token_id=None)
+			ids = req.result()
+			with lock:
+				totals.append(len(ids))
+				latencies.append(req.finished - req.submitted)
+
+	t0 = time.perf_counter()
+	threads = [threading.Thread(target=_client) for _ in range(clients)]
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	elapsed = time.perf_counter() - t0
+	sched.stop()
+	return sum(totals), elapsed, latencies, sched.stats
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument("--clients", type=int, default=8)
+	ap.add_argument("--requests", type=int, default=32)
+	ap.add_argument("--new-tokens", type=int, default=64)
+	ap.add_argument("--max-batch", type=int, default=8)
+	ap.add_argument("--hidden", type=int, default=256)
+	ap.add_argument("--layers", type=int, default=4)
+	args = ap.parse_args()
+
+	model = tiny_causal_lm(hidden_size=args.hidden, layers=args.layers)
+	prompts = random_prompts(args.requests)
+
+	seq_tokens, seq_time = run_sequential(model, prompts, args.new_tokens)
+	print(f"sequential : {seq_tokens} tokens in {seq_time:.2f}s -> {seq_tokens / seq_time:.1f} tok/s")
+
+	b_tokens, b_time, lat, stats = run_batched(model, prompts, args.new_tokens, args.clients, args.max_batch)
+	print(f"batched    : {b_tokens} tokens in {b_time:.2f}s -> {b_tokens / b_time:.1f} tok/s "
+		  f"(x{(b_tokens / b_time) / (seq_tokens / seq_time):.2f})")
+	print(f"latency    : p50={_percentile(lat, 50):.2f}s p95={_percentile(lat, 95):.2f}s")
+	print(f"scheduler  : {stats}")
+
+
+if __name__ == "__main__":
+	main()
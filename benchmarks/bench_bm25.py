@@ -0,0 +1,96 @@
+# benchmarks/bench_bm25.py
+"""
+Query latency of the inverted-index BM25Index vs the previous rank_bm25 implementation
+(BM25Okapi.get_scores over every document + a full sort) on a synthetic corpus.
+
+	python -m benchmarks.bench_bm25 --docs 1000000 --queries 50
+	python -m benchmarks.bench_bm25 --docs 100000 --queries 200   # quicker
+
+Both indexes get the same documents; top-k ids are checked for agreement.
+The rank_bm25 baseline is skipped when the package is not installed.
+"""
+import argparse
+import os
+import re
+import statistics
+import tempfile
+import time
+
+from chat_app.sparse_bm25 import BM25Index
+from ._synthetic_corpus import synthetic_texts, synthetic_queries
+
+
+class _LegacyBM25:
+	"""BM25Index as it was: BM25Okapi over token lists, every query scores the whole corpus."""
+
+	def __init__(self, ids, texts):
+		from rank_bm25 import BM25Okapi
+		self.ids = ids
+		self._bm = BM25Okapi([self._tok(t) for t in texts])
+
+	def _tok(self, text):
+		return re.findall(r"\w+", (text or "").lower())
+
+	def search(self, query, top_k=20):
+		scores = self._bm.get_scores(self._tok(query))
+		ranked = sorted(zip(self.ids, scores), key=lambda x: x[1], reverse=True)
+		return ranked[:top_k]
+
+
+def _latencies(index, queries, top_k):
+	out, results = [], []
+	for q in queries:
+		t0 = time.perf_counter()
+		results.append(index.search(q, top_k=top_k))
+		out.append(time.perf_counter() - t0)
+	return out, results
+
+
+def _report(name, build_s, lat):
+	lat_ms = sorted(x * 1000 for x in lat)
+	p95 = lat_ms[min(len(lat_ms) - 1, int(0.95 * (len(lat_ms) - 1)))]
+	print(f"{name:<10}: build {build_s:7.1f}s | query mean {statistics.mean(lat_ms):8.2f}ms "
+		  f"p50 {statistics.median(lat_ms):8.2f}ms p95 {p95:8.2f}ms")
+	return statistics.mean(lat_ms)
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument("--docs", type=int, default=1_000_000)
+	ap.add_argument("--queries", type=int, default=50)
+	ap.add_argument("--top-k", type=int, default=50)
+	ap.add_argument("--vocab", type=int, default=50_000)
+	args = ap.parse_args()
+
+	texts = list(synthetic_texts(args.docs, vocab_size=args.vocab))
+	ids = [f"chunk-{i}" for i in range(len(texts))]
+	queries = synthetic_queries(args.queries, vocab_size=args.vocab)
+
+	with tempfile.TemporaryDirectory() as tmpdir:
+		t0 = time.perf_counter()
+		index = BM25Index(os.path.join(tmpdir, "bm25_corpus.jsonl"))
+		index.add(ids, texts)
+		new_build = time.perf_counter() - t0
+		new_lat, new_res = _latencies(index, queries, args.top_k)
+		new_mean = _report("inverted", new_build, new_lat)
+
+	try:
+		t0 = time.perf_counter()
+		legacy = _LegacyBM25(ids, texts)
+		old_build = time.perf_counter() - t0
+	except ImportError:
+		print("rank_bm25 is not installed; skipping the baseline")
+		return
+	old_lat, old_res = _latencies(legacy, queries, args.top_k)
+	old_mean = _report("rank_bm25", old_build, old_lat)
+	print(f"speedup   : x{old_mean / new_mean:.1f} mean query latency")
+
+	same = sum(
+		[i for i, _ in a] == [i for i, s in b if s > 0][:len(a)]
+		for a, b in zip(new_res, old_res)
+	)
+	print(f"agreement : {same}/{len(queries)} queries with identical top-{args.top_k} ids")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,98 @@
+# benchmarks/bench_bm25_csr.py
+"""
+CSR (numpy/scipy) BM25 backend vs the inverted index vs rank_bm25.BM25Okapi on a
+synthetic corpus, one query at a time and as one batch (evaluation runs).
+
+	python -m benchmarks.bench_bm25_csr --docs 100000 --queries 200 --top-k 10
+
+Every backend's top-k is checked against rank_bm25: scores must agree to 1e-9
+rank by rank, and ids must agree except inside a tie at the k-th score.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from chat_app.sparse_bm25 import BM25Index
+from chat_app.sparse_csr import CSRBM25Index
+from ._synthetic_corpus import synthetic_texts, synthetic_queries
+
+
+def _okapi_top_k(bm, ids, tok, queries, top_k):
+	out = []
+	for q in queries:
+		scores = bm.get_scores(tok(q))
+		top = np.argsort(-scores, kind="stable")[:top_k]
+		out.append([(ids[i], float(scores[i])) for i in top if scores[i] > 0])
+	return out
+
+
+def _same(got, want) -> bool:
+	if len(got) != len(want):
+		return False
+	if any(abs(a[1] - b[1]) > 1e-9 for a, b in zip(got, want)):
+		return False
+	kth = want[-1][1] if want else 0.0
+	strict = lambda hits: {i for i, s in hits if s > kth + 1e-9}
+	return strict(got) == strict(want)
+
+
+def _timed(fn):
+	t0 = time.perf_counter()
+	res = fn()
+	return res, time.perf_counter() - t0
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument("--docs", type=int, default=100_000)
+	ap.add_argument("--queries", type=int, default=200)
+	ap.add_argument("--top-k", type=int, default=10)
+	ap.add_argument("--vocab", type=int, default=50_000)
+	args = ap.parse_args()
+
+	texts = list(synthetic_texts(args.docs, vocab_size=args.vocab))
+	ids = [f"chunk-{i}" for i in range(len(texts))]
+	queries = synthetic_queries(args.queries, vocab_size=args.vocab)
+	n, k = len(queries), args.top_k
+
+	with tempfile.TemporaryDirectory() as tmpdir:
+		inv = BM25Index(os.path.join(tmpdir, "inv", "bm25_corpus.jsonl"))
+		csr = CSRBM25Index(os.path.join(tmpdir, "csr", "bm25_corpus.jsonl"))
+		_, inv_build = _timed(lambda: inv.add(ids, texts))
+		_, csr_build = _timed(lambda: (csr.add(ids, texts), csr.search("warmup", 1)))
+
+		runs = {}
+		runs["inverted"] = _timed(lambda: [inv.search(q, k) for q in queries])
+		runs["csr"] = _timed(lambda: [csr.search(q, k) for q in queries])
+		runs["csr batch"] = _timed(lambda: csr.search_batch(queries, k))
+		builds = {"inverted": inv_build, "csr": csr_build, "csr batch": csr_build}
+
+		try:
+			from rank_bm25 import BM25Okapi
+		except ImportError:
+			BM25Okapi = None
+			print("rank_bm25 is not installed; skipping the baseline and the agreement check")
+		if BM25Okapi is not None:
+			t0 = time.perf_counter()
+			bm = BM25Okapi([inv._tok(t) for t in texts])
+			builds["rank_bm25"] = time.perf_counter() - t0
+			runs["rank_bm25"] = _timed(lambda: _okapi_top_k(bm, ids, inv._tok, queries, k))
+		inv.close()
+		csr.close()
+
+	print(f"corpus: {len(texts)} docs, {n} queries, top-{k}")
+	base = runs.get("rank_bm25", runs["inverted"])[1]
+	for name, (res, dt) in runs.items():
+		line = f"{name:<10}: build {builds[name]:6.1f}s | {dt * 1000 / n:8.2f} ms/query | x{base / dt:6.1f}"
+		if "rank_bm25" in runs:
+			want = runs["rank_bm25"][0]
+			same = sum(_same(g, w) for g, w in zip(res, want))
+			line += f" | identical to rank_bm25: {same}/{n}"
+		print(line)
+
+
+if __name__ == "__main__":
+	main()
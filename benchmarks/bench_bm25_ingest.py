@@ -0,0 +1,76 @@
+# benchmarks/bench_bm25_ingest.py
+"""
+BM25 ingest throughput on the wiki_pages corpus: one add() per file, the way
+RAGStore.ingest feeds the index.
+
+	python -m benchmarks.bench_bm25_ingest --repeat 20 --chunk-words 120
+
+"rebuild" reproduces the old behaviour (the whole index rebuilt from every stored
+token list on each add, i.e. BM25Okapi(self.docs)); "incremental" is BM25Index.add.
+--repeat ingests the corpus several times under new ids to make it larger.
+"""
+import argparse
+import glob
+import html
+import os
+import re
+import tempfile
+import time
+
+from chat_app.sparse_bm25 import BM25Index
+
+_TAGS = re.compile(r"<(script|style)[^>]*>.*?</\1>|<[^>]+>", re.S | re.I)
+
+
+class _RebuildOnAdd(BM25Index):
+	def add(self, ids, texts):
+		super().add(ids, texts)
+		docs = getattr(self, "_all_docs", [])
+		docs.extend(zip(ids, (self._tok(t) for t in texts)))
+		self._all_docs = docs
+		ids_all, toks_all = [d[0] for d in docs], [d[1] for d in docs]
+		self.__init__(self.persist_path, self.k1, self.b, self.epsilon)
+		self._all_docs = docs
+		self._index(ids_all, toks_all)
+		self._refresh_idf_floor()
+
+
+def _files(folder, chunk_words):
+	out = []
+	for path in sorted(glob.glob(os.path.join(folder, "*.html"))):
+		with open(path, "r", encoding="utf-8", errors="ignore") as f:
+			words = html.unescape(_TAGS.sub(" ", f.read())).split()
+		chunks = [" ".join(words[i:i + chunk_words]) for i in range(0, len(words), chunk_words)]
+		out.append((os.path.basename(path), chunks))
+	return out
+
+
+def _ingest(cls, files, repeat):
+	with tempfile.TemporaryDirectory() as tmpdir:
+		index = cls(os.path.join(tmpdir, "bm25_corpus.jsonl"))
+		t0 = time.perf_counter()
+		n = 0
+		for r in range(repeat):
+			for name, chunks in files:
+				index.add([f"{r}:{name}#{i}" for i in range(len(chunks))], chunks)
+				n += len(chunks)
+		index.search("linux kernel", top_k=10)	# includes the lazy statistics refresh
+		return n, time.perf_counter() - t0
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument("--folder", default="wiki_pages")
+	ap.add_argument("--repeat", type=int, default=10)
+	ap.add_argument("--chunk-words", type=int, default=120)
+	args = ap.parse_args()
+
+	files = _files(args.folder, args.chunk_words)
+	print(f"corpus      : {len(files)} files, {sum(len(c) for _, c in files)} chunks x {args.repeat}")
+	for name, cls in (("rebuild", _RebuildOnAdd), ("incremental", BM25Index)):
+		n, dt = _ingest(cls, files, args.repeat)
+		print(f"{name:<12}: {n} chunks in {dt:6.2f}s -> {n / dt:8.0f} chunks/s")
+
+
+if __name__ == "__main__":
+	main()
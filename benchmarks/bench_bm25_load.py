@@ -0,0 +1,139 @@
+# benchmarks/bench_bm25_load.py
+"""
+BM25 cold start: the JSON-lines loader (parse every token list, rebuild postings
+in Python) vs the memory-mapped binary segment.
+
+	python -m benchmarks.bench_bm25_load --corpus chroma_reseach/bm25_corpus.jsonl --synthetic 200000
+
+Each load runs in a fresh interpreter so resident memory (VmRSS / ru_maxrss) is
+not shared between the two. The source corpus is copied to a temp dir first;
+migrating it there does not touch the original file.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks._synthetic_corpus import synthetic_queries, synthetic_texts
+from chat_app.sparse_bm25 import BM25Index
+
+
+def _rss_mb() -> float:
+	try:
+		with open("/proc/self/status") as f:
+			for line in f:
+				if line.startswith("VmRSS:"):
+					return int(line.split()[1]) / 1024
+	except OSError:
+		pass
+	try:
+		import psutil
+		return psutil.Process().memory_info().rss / 2**20
+	except ImportError:
+		return float("nan")
+
+
+def _child(mode: str, path: str, queries: list[str]) -> dict:
+	rss0 = _rss_mb()
+	t0 = time.perf_counter()
+	index = BM25Index(path)
+	if mode == "jsonl":
+		# the loader as it was: replay every record into in-memory postings
+		for rec in index._records():
+			if rec.get("op") == "delete":
+				index._tombstone(rec["id"])
+			elif rec.get("op") is None:
+				index._index([rec["id"]], [rec["tokens"]], [rec.get("source")])
+	else:
+		index.load()
+	load_s = time.perf_counter() - t0
+	rss_loaded = _rss_mb()
+	t0 = time.perf_counter()
+	index.search(queries[0], top_k=10)
+	first_ms = (time.perf_counter() - t0) * 1000
+	t0 = time.perf_counter()
+	for q in queries:
+		index.search(q, top_k=10)
+	return {
+		"docs": len(index),
+		"load_s": load_s,
+		"first_query_ms": first_ms,
+		"query_ms": (time.perf_counter() - t0) * 1000 / len(queries),
+		"rss_load_mb": rss_loaded - rss0,
+		"rss_after_queries_mb": _rss_mb() - rss0,
+	}
+
+
+def _run(mode: str, path: str, queries_file: str) -> dict:
+	out = subprocess.run(
+		[sys.executable, "-m", "benchmarks.bench_bm25_load", "--child", mode, path, queries_file],
+		check=True, capture_output=True, text=True,
+	)
+	return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _compare(label: str, jsonl_path: str, queries: list[str], tmpdir: str) -> None:
+	qfile = os.path.join(tmpdir, "queries.json")
+	with open(qfile, "w", encoding="utf-8") as f:
+		json.dump(queries, f)
+	size_jsonl = os.path.getsize(jsonl_path)
+	before = _run("jsonl", jsonl_path, qfile)
+
+	t0 = time.perf_counter()
+	index = BM25Index(jsonl_path)
+	index.load()		# migrates: writes <name>.seg, empties the journal
+	migrate_s = time.perf_counter() - t0
+	size_seg = os.path.getsize(index.segment_path)
+	index.close()
+	after = _run("segment", jsonl_path, qfile)
+
+	print(f"\n{label}: {before['docs']} docs, JSONL {size_jsonl / 2**20:.1f} MB -> segment {size_seg / 2**20:.1f} MB "
+		  f"(one-off migration {migrate_s:.2f}s)")
+	print(f"{'':<10}{'load':>10}{'1st query':>12}{'query':>10}{'RSS load':>12}{'RSS +queries':>14}")
+	for name, r in (("jsonl", before), ("segment", after)):
+		print(f"{name:<10}{r['load_s'] * 1000:>8.0f}ms{r['first_query_ms']:>10.2f}ms{r['query_ms']:>8.2f}ms"
+			  f"{r['rss_load_mb']:>10.1f}MB{r['rss_after_queries_mb']:>12.1f}MB")
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument("--corpus", default="chroma_reseach/bm25_corpus.jsonl")
+	ap.add_argument("--synthetic", type=int, default=200_000, help="synthetic corpus size (0 to skip)")
+	ap.add_argument("--queries", type=int, default=200)
+	ap.add_argument("--child", nargs=3, metavar=("MODE", "PATH", "QUERIES"), help=argparse.SUPPRESS)
+	args = ap.parse_args()
+
+	if args.child:
+		mode, path, qfile = args.child
+		with open(qfile, encoding="utf-8") as f:
+			queries = json.load(f)
+		print(json.dumps(_child(mode, path, queries)))
+		return
+
+	if os.path.exists(args.corpus):
+		with tempfile.TemporaryDirectory() as tmpdir:
+			path = os.path.join(tmpdir, "bm25_corpus.jsonl")
+			shutil.copyfile(args.corpus, path)
+			words = []
+			for rec in BM25Index(path)._records():
+				words.extend(rec.get("tokens", [])[:3])
+				if len(words) >= args.queries * 3:
+					break
+			queries = [" ".join(words[i:i + 3]) for i in range(0, len(words), 3)] or ["bm25"]
+			_compare(args.corpus, path, queries, tmpdir)
+
+	if args.synthetic:
+		with tempfile.TemporaryDirectory() as tmpdir:
+			path = os.path.join(tmpdir, "bm25_corpus.jsonl")
+			with open(path, "w", encoding="utf-8") as f:
+				for i, text in enumerate(synthetic_texts(args.synthetic)):
+					f.write(json.dumps({"id": f"syn{i}", "tokens": text.split(), "source": f"doc{i // 40}.md"}) + "\n")
+			_compare(f"synthetic x{args.synthetic}", path, synthetic_queries(args.queries), tmpdir)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,57 @@
+# benchmarks/bench_ingest.py
+"""
+End-to-end ingest throughput (files/minute) on the wiki_pages corpus: the old
+one-file-at-a-time RAGStore.ingest against the staged pipeline with N convert
+processes.
+
+	python -m benchmarks.bench_ingest --workers 0 2 4
+
+Each run ingests into a fresh Chroma dir with the chunk embedding cache off, so
+every run pays for Docling and the encoder. Pipeline runs also print per-stage
+throughput (RAGStore.last_ingest_stats). Needs Docling, Chroma and the
+configured embedding model.
+"""
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+from chat_app.rag_store import RAGStore
+
+
+def _run(files, workers, embed_batch):
+	with tempfile.TemporaryDirectory() as tmpdir:
+		store = RAGStore(tmpdir)
+		store.embedder.chunk_cache = None
+		store.ingest_workers = workers
+		store._ingest_cfg = (embed_batch, store._ingest_cfg[1])
+		t0 = time.perf_counter()
+		added = store.ingest(files, use_vlm=False)
+		wall = time.perf_counter() - t0
+		if store._pipeline is not None:
+			store._pipeline.close()
+		return len(added), wall, store.last_ingest_stats
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument("--folder", default="wiki_pages")
+	ap.add_argument("--workers", type=int, nargs="+", default=[0, 2, 4])
+	ap.add_argument("--embed-batch", type=int, default=64)
+	args = ap.parse_args()
+
+	files = sorted(glob.glob(os.path.join(args.folder, "*.html")))
+	print(f"corpus: {len(files)} files")
+	for workers in args.workers:
+		n, wall, stats = _run(files, workers, args.embed_batch)
+		name = "sequential" if not workers else f"pipeline x{workers}"
+		line = f"{name:<14}: {n:>5} chunks in {wall:7.1f}s -> {len(files) * 60.0 / wall:6.1f} files/min"
+		if stats:
+			line += "  | " + " | ".join(
+				f"{k} {v['per_s']:.2f}/s busy {v['busy_s']:.1f}s" for k, v in stats["stages"].items())
+		print(line)
+
+
+if __name__ == "__main__":
+	main()
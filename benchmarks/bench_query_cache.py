@@ -0,0 +1,72 @@
+# benchmarks/bench_query_cache.py
+"""
+Query embedding cache on a replayed question log: the 30 test_results questions,
+each asked several times (with whitespace/case variants), in random order.
+
+	python -m benchmarks.bench_query_cache --repeat 5
+
+Reports hit rate and encoder time saved (Embedder.cache_stats) and the wall time
+of the same log without the cache. Uses the configured embedding model.
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from unittest.mock import patch
+
+from chat_app.disk_cache import DiskCache
+from chat_app.embedder import Embedder
+
+
+def _log(results_path, repeat, seed=0):
+	with open(results_path, encoding="utf-8") as f:
+		questions = list(json.load(f))
+	variants = lambda q: [q, q.lower(), "  " + q.replace(" ", "  ") + " "]
+	rng = random.Random(seed)
+	log = [rng.choice(variants(q)) for q in questions for _ in range(repeat)]
+	rng.shuffle(log)
+	return log
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument("--results", default="test_results/results.json")
+	ap.add_argument("--repeat", type=int, default=5)
+	args = ap.parse_args()
+
+	log = _log(args.results, args.repeat)
+	embedder = Embedder()
+	embedder.embed(["warmup"])
+
+	t0 = time.perf_counter()
+	for q in log:
+		embedder.embed([q])
+	uncached = time.perf_counter() - t0
+
+	with tempfile.TemporaryDirectory() as tmpdir:
+		embedder._disk = DiskCache(type="npy", cache_folder_path=tmpdir)
+		t0 = time.perf_counter()
+		for q in log:
+			embedder.embed_query(q)
+		cached = time.perf_counter() - t0
+		memory_run = embedder.cache_stats()
+
+		# a restart: empty LRU, vectors come back from the npy disk cache
+		embedder._queries.clear()
+		with patch.object(embedder, "_cache_stats", {k: 0 for k in embedder._cache_stats}):
+			t0 = time.perf_counter()
+			for q in log:
+				embedder.embed_query(q)
+			restart = time.perf_counter() - t0
+			restart_run = embedder.cache_stats()
+
+	print(f"log          : {len(log)} queries, {len(set(log))} distinct strings")
+	print(f"no cache     : {uncached:6.2f}s")
+	print(f"cache        : {cached:6.2f}s | hit rate {memory_run['hit_rate']:.2f} | "
+		  f"{memory_run['ms_per_encode']:.1f} ms/encode | est. saved {memory_run['est_saved_s']:.2f}s")
+	print(f"after restart: {restart:6.2f}s | disk hits {restart_run['disk_hits']} | hit rate {restart_run['hit_rate']:.2f}")
+
+
+if __name__ == "__main__":
+	main()
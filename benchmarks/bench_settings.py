@@ -0,0 +1,46 @@
+# benchmarks/bench_settings.py
+"""
+Per-request cost of reading settings: load_settings() (parse TOML/JSON, env
+overrides, rebuild dataclasses on every call) vs the cached get_settings().
+
+	python -m benchmarks.bench_settings --calls-per-request 6 --requests 2000
+
+A /rag request reads settings about six times (_cache_key x2, is_tech_science,
+redact_private per chunk, build_messages_hybrid); Scanner reads them per directory.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from chat_app.settings import Settings, save_settings, load_settings, get_settings
+
+
+def _time(fn, path, requests, calls):
+	t0 = time.perf_counter()
+	for _ in range(requests):
+		for _ in range(calls):
+			fn(path)
+	return (time.perf_counter() - t0) / requests
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument("--requests", type=int, default=2000)
+	ap.add_argument("--calls-per-request", type=int, default=6)
+	args = ap.parse_args()
+
+	with tempfile.TemporaryDirectory() as tmpdir:
+		path = os.path.join(tmpdir, "settings.toml")
+		save_settings(Settings(), path)
+		get_settings(path)	# warm the cache
+
+		before = _time(load_settings, path, args.requests, args.calls_per_request)
+		after = _time(get_settings, path, args.requests, args.calls_per_request)
+
+	print(f"load_settings : {before * 1e6:8.1f} us/request")
+	print(f"get_settings  : {after * 1e6:8.1f} us/request (x{before / after:.0f} faster)")
+
+
+if __name__ == "__main__":
+	main()
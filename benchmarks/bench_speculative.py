@@ -0,0 +1,104 @@
+# benchmarks/bench_speculative.py
+"""
+Plain greedy decoding vs speculative decoding (draft proposes, target verifies).
+
+	python -m benchmarks.bench_speculative --new-tokens 128 --draft-tokens 4
+	python -m benchmarks.bench_speculative --target Qwen/Qwen2.5-1.5B-Instruct --draft Qwen/Qwen2.5-0.5B-Instruct
+
+Without --target/--draft a tiny random model is used and the draft is the target
+truncated to its first --draft-layers layers, so acceptance is non-trivial without downloads.
+Reports tokens/s for both paths, the acceptance rate, and checks the outputs are identical.
+"""
+import argparse
+import copy
+import time
+
+import torch
+
+from chat_app.speculative import SpeculativeDecoder
+from ._tiny_lm import tiny_causal_lm, random_prompts
+
+
+def _truncated(model, layers):
+	draft = copy.deepcopy(model)
+	draft.model.layers = draft.model.layers[:layers]
+	draft.config.num_hidden_layers = layers
+	return draft.eval()
+
+
+def _load(model_id):
+	from transformers import AutoModelForCausalLM, AutoTokenizer
+	tok = AutoTokenizer.from_pretrained(model_id)
+	return AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=torch.float32).eval(), tok
+
+
+def run_plain(model, prompts, new_tokens):
+	total = 0
+	outputs = []
+	t0 = time.perf_counter()
+	with torch.inference_mode():
+		for p in prompts:
+			out = model.generate(
+				input_ids=p.unsqueeze(0),
+				attention_mask=torch.ones_like(p).unsqueeze(0),
+				max_new_tokens=new_tokens,
+				do_sample=False,
+				eos_token_id=None,
+				pad_token_id=0,
+			)
+			outputs.append(out[0])
+			total += out.shape[-1] - p.numel()
+	return total, time.perf_counter() - t0, outputs
+
+
+def run_speculative(decoder, prompts, new_tokens):
+	total = proposed = accepted = 0
+	outputs = []
+	t0 = time.perf_counter()
+	for p in prompts:
+		seq, stats, _ = decoder.generate(p.unsqueeze(0), max_new_tokens=new_tokens, eos_token_id=None)
+		outputs.append(seq[0])
+		total += stats.new_tokens
+		proposed += stats.proposed
+		accepted += stats.accepted
+	return total, time.perf_counter() - t0, outputs, (accepted / proposed if proposed else 0.0)
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument("--target", default="", help="HF model id (default: tiny random model)")
+	ap.add_argument("--draft", default="", help="HF model id of the draft (needs the target's tokenizer)")
+	ap.add_argument("--requests", type=int, default=8)
+	ap.add_argument("--new-tokens", type=int, default=128)
+	ap.add_argument("--draft-tokens", type=int, default=4)
+	ap.add_argument("--hidden", type=int, default=512)
+	ap.add_argument("--layers", type=int, default=8)
+	ap.add_argument("--draft-layers", type=int, default=2)
+	args = ap.parse_args()
+
+	if args.target:
+		target, tok = _load(args.target)
+		draft, _ = _load(args.draft) if args.draft else (_truncated(target, args.draft_layers), None)
+		text = ["Explain how a hash map works.", "Write a short poem about the sea.",
+				"List three uses of Python generators.", "What is a KV cache in transformers?"]
+		prompts = [tok(text[i % len(text)], return_tensors="pt")["input_ids"][0] for i in range(args.requests)]
+	else:
+		target = tiny_causal_lm(hidden_size=args.hidden, layers=args.layers)
+		draft = _truncated(target, args.draft_layers)
+		prompts = random_prompts(args.requests, min_len=16, max_len=64)
+
+	decoder = SpeculativeDecoder(target, draft, num_draft_tokens=args.draft_tokens)
+
+	p_tokens, p_time, p_out = run_plain(target, prompts, args.new_tokens)
+	print(f"greedy      : {p_tokens} tokens in {p_time:.2f}s -> {p_tokens / p_time:.1f} tok/s")
+
+	s_tokens, s_time, s_out, rate = run_speculative(decoder, prompts, args.new_tokens)
+	print(f"speculative : {s_tokens} tokens in {s_time:.2f}s -> {s_tokens / s_time:.1f} tok/s "
+		  f"(x{(s_tokens / s_time) / (p_tokens / p_time):.2f}), acceptance={rate:.2%}")
+
+	same = sum(torch.equal(a, b) for a, b in zip(p_out, s_out))
+	print(f"identical   : {same}/{len(prompts)} outputs")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,103 @@
+# benchmarks/eval_bm25_analyzers.py
+"""
+Sparse-only recall / MRR of BM25 analyzer chains on the test_results question set
+(the 30 questions of chat_app/hybrid_search_test.py over the chroma_reseach corpus),
+plus index size and query latency.
+
+	python -m benchmarks.eval_bm25_analyzers --k 3 10
+
+Question i of each block of ten targets core chunk i (test_results/core_chunks.json);
+blocks are keyword, semantic and fuzzy phrasings, as in hybrid_search_test.py.
+The corpus file stores plain lowercase words, so joining them back gives text every
+analyzer can start from.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from chat_app.sparse_bm25 import BM25Index
+
+CHAINS = {
+	"simple": [],
+	"stop": ["stopwords_en", "stopwords_pl"],
+	"stop+stem_en": ["stopwords_en", "stopwords_pl", "stem_en"],
+	"stop+stem+fold": ["stopwords_en", "stopwords_pl", "stem_en", "stem_pl", "fold"],
+	"stop+stem+fold+ngram4": ["stopwords_en", "stopwords_pl", "stem_en", "stem_pl", "fold", "ngram4"],
+}
+QTYPES = ("keyword", "semantic", "fuzzy")
+
+
+def _questions(results_dir):
+	with open(os.path.join(results_dir, "results.json"), encoding="utf-8") as f:
+		questions = list(json.load(f))
+	with open(os.path.join(results_dir, "core_chunks.json"), encoding="utf-8") as f:
+		core = [v[0] for v in json.load(f).values()]
+	return [(q, core[i % len(core)], QTYPES[i // len(core)]) for i, q in enumerate(questions)]
+
+
+def _corpus(path):
+	ids, texts = [], []
+	with open(path, encoding="utf-8") as f:
+		for line in f:
+			if line.strip():
+				rec = json.loads(line)
+				if rec.get("op") is None:
+					ids.append(rec["id"])
+					texts.append(" ".join(rec["tokens"]))
+	return ids, texts
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument("--corpus", default="chroma_reseach/bm25_corpus.jsonl")
+	ap.add_argument("--results-dir", default="test_results")
+	ap.add_argument("--k", type=int, nargs="+", default=[3, 10])
+	ap.add_argument("--repeat", type=int, default=20, help="query passes for the latency figure")
+	args = ap.parse_args()
+
+	ids, texts = _corpus(args.corpus)
+	questions = _questions(args.results_dir)
+	max_k = max(args.k)
+	print(f"corpus: {len(ids)} chunks | {len(questions)} questions")
+	header = f"{'analyzer':<24}{'terms':>8}{'postings':>10}{'build':>8}{'query':>9}"
+	for k in args.k:
+		header += f"{f'R@{k}':>7}{f'MRR@{k}':>8}"
+	header += "   R@%d by type (kw/sem/fuzzy)" % args.k[0]
+	print(header)
+
+	for name, chain in CHAINS.items():
+		with tempfile.TemporaryDirectory() as tmpdir:
+			index = BM25Index(os.path.join(tmpdir, "bm25_corpus.jsonl"), analyzer=chain)
+			t0 = time.perf_counter()
+			index.add(ids, texts)
+			build_s = time.perf_counter() - t0
+			stats = index.stats()
+
+			ranks = []
+			t0 = time.perf_counter()
+			for r in range(args.repeat):
+				for q, target, qtype in questions:
+					hits = [i for i, _ in index.search(q, top_k=max_k)]
+					if r == 0:
+						ranks.append((hits.index(target) + 1 if target in hits else None, qtype))
+			query_ms = (time.perf_counter() - t0) * 1000 / (args.repeat * len(questions))
+			index.close()
+
+		line = f"{name:<24}{stats['terms']:>8}{stats['postings']:>10}{build_s:>7.2f}s{query_ms:>7.2f}ms"
+		for k in args.k:
+			hit = [rank is not None and rank <= k for rank, _ in ranks]
+			rr = [1.0 / rank if rank is not None and rank <= k else 0.0 for rank, _ in ranks]
+			line += f"{sum(hit) / len(hit):>7.2f}{sum(rr) / len(rr):>8.2f}"
+		k = args.k[0]
+		by_type = [
+			sum(rank is not None and rank <= k for rank, t in ranks if t == qtype) / max(1, sum(t == qtype for _, t in ranks))
+			for qtype in QTYPES
+		]
+		line += "   " + "/".join(f"{v:.1f}" for v in by_type)
+		print(line)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,151 @@
+# benchmarks/load_test_rag.py
+"""
+Load test for /rag with stubbed retrieval and generation (no models, no Chroma).
+
+	python -m benchmarks.load_test_rag --clients 32 --requests 400 --gen-ms 80 --retrieval-ms 15
+
+Starts ChatApp on the threaded WSGI server with stub LLMHandler/RAGStore/RAGRetriever,
+fires concurrent POST /rag requests and reports p50/p95/p99 latency, throughput and
+how many requests were turned away with 429 by the worker pools.
+The stub LLM holds one lock while "generating", like a single GPU would.
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import chat_app.chat_app as chat_module
+from chat_app.worker_pool import WorkerPool
+
+
+class _StubLLM:
+	_device = threading.Lock()
+	gen_s = 0.05
+
+	def __init__(self, *args, **kwargs):
+		pass
+
+	def chat_messages(self, messages, reset=True):
+		with self._device:
+			time.sleep(self.gen_s)
+		return "Stub answer citing [doc.md#0]."
+
+	def chat_next(self, prompt, session_id=None):
+		return self.chat_messages([], reset=False)
+
+	def metrics(self):
+		return {}
+
+
+class _StubStore:
+	def __init__(self, *args, **kwargs):
+		pass
+
+
+class _StubRetriever:
+	retrieval_s = 0.01
+
+	def __init__(self, *args, **kwargs):
+		pass
+
+	def build_messages_hybrid(self, question, top_k=None):
+		time.sleep(self.retrieval_s)
+		return {
+			"messages": [{"role": "user", "content": question}],
+			"sources": [{"source_file": "doc.md", "chunk_index": 0}],
+			"fmt_ids": {"doc.md#0"},
+			"is_sus": False,
+			"was_redacted": False,
+		}
+
+
+def _percentile(xs, p):
+	xs = sorted(xs)
+	return xs[min(len(xs) - 1, int(round(p / 100.0 * (len(xs) - 1))))] if xs else 0.0
+
+
+def _build_app(args):
+	_StubLLM.gen_s = args.gen_ms / 1000.0
+	_StubRetriever.retrieval_s = args.retrieval_ms / 1000.0
+	chat_module.LLMHandler = _StubLLM
+	chat_module.RAGStore = _StubStore
+	chat_module.RAGRetriever = _StubRetriever
+	chat_module.Scanner = None
+	chat_module.DiskCache = None	# every request goes through retrieval + generation
+	app = chat_module.ChatApp("stub-model")
+	app.gen_pool = WorkerPool("generation", args.gen_workers, args.gen_queue, args.timeout_s)
+	app.retrieval_pool = WorkerPool("retrieval", args.retrieval_workers, args.retrieval_queue, args.timeout_s)
+	return app
+
+
+def run(args):
+	from werkzeug.serving import make_server
+
+	app = _build_app(args)
+	server = make_server("127.0.0.1", 0, app.app, threaded=True)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	url = f"http://127.0.0.1:{server.server_port}/rag"
+
+	latencies, statuses = [], {}
+	lock = threading.Lock()
+	remaining = [args.requests]
+
+	def _client(i):
+		while True:
+			with lock:
+				if remaining[0] <= 0:
+					return
+				remaining[0] -= 1
+			body = json.dumps({"message": f"How does BM25 indexing work? #{i}"}).encode("utf-8")
+			req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+			t0 = time.perf_counter()
+			try:
+				with urllib.request.urlopen(req, timeout=args.timeout_s) as resp:
+					resp.read()
+					status = resp.status
+			except urllib.error.HTTPError as e:
+				status = e.code
+			except Exception:
+				status = "error"
+			dt = time.perf_counter() - t0
+			with lock:
+				statuses[status] = statuses.get(status, 0) + 1
+				if status == 200:
+					latencies.append(dt)
+
+	t0 = time.perf_counter()
+	threads = [threading.Thread(target=_client, args=(i,)) for i in range(args.clients)]
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	elapsed = time.perf_counter() - t0
+	server.shutdown()
+
+	ok = statuses.get(200, 0)
+	print(f"requests   : {args.requests} in {elapsed:.2f}s, statuses={statuses}")
+	print(f"throughput : {ok / elapsed:.1f} ok req/s")
+	print(f"latency    : p50={_percentile(latencies, 50) * 1000:.0f}ms "
+		  f"p95={_percentile(latencies, 95) * 1000:.0f}ms p99={_percentile(latencies, 99) * 1000:.0f}ms")
+	print(f"pools      : generation={app.gen_pool.snapshot()}")
+	print(f"             retrieval={app.retrieval_pool.snapshot()}")
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument("--clients", type=int, default=32)
+	ap.add_argument("--requests", type=int, default=400)
+	ap.add_argument("--gen-ms", type=float, default=50)
+	ap.add_argument("--retrieval-ms", type=float, default=10)
+	ap.add_argument("--gen-workers", type=int, default=1)
+	ap.add_argument("--gen-queue", type=int, default=16)
+	ap.add_argument("--retrieval-workers", type=int, default=4)
+	ap.add_argument("--retrieval-queue", type=int, default=64)
+	ap.add_argument("--timeout-s", type=float, default=120)
+	run(ap.parse_args())
+
+
+if __name__ == "__main__":
+	main()
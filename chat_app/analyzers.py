@@ -0,0 +1,166 @@
+# chat_app/analyzers.py
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Callable, Optional
+
+_WORD = re.compile(r"\w+")
+
+STOPWORDS_EN = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves
+""".split())
+
+STOPWORDS_PL = frozenset("""
+a aby ach albo ale ani aż bardzo bez bo bowiem by byli bym być był była było były będzie będą
+cali cała cały co coś czy czyli daleko dla do dość dzisiaj gdy gdyby gdyż gdzie go i ich ile im
+inne iż ja jak jakaś jakiś jako je jeden jedna jedno jego jej jemu jest jestem jeszcze jeśli
+jeżeli już ją każdy kiedy kto ktoś która które którego której który których którym którzy lub
+ma mają mi mnie mogą może mu my na nad nam nas nasz nasze nawet nic nich nie niech nigdy nim
+niż no o obok od około on ona one oni ono oraz po pod podczas pomimo ponad ponieważ przed
+przez przy sam sama się skąd są ta tak taka taki takie także tam te tego tej ten teraz też to
+tobie toteż trzeba tu tutaj twoi twój ty tych tylko tym u w wam was we według wiele wielu więc
+wszyscy wszystkich wszystkie wszystko właśnie z za zawsze ze że żeby
+""".split())
+
+_EN_SUFFIXES = (("ies", "y"), ("sses", "ss"), ("ness", ""), ("ments", ""), ("ment", ""),
+				("ingly", ""), ("edly", ""), ("ing", ""), ("ed", ""), ("ly", ""))
+
+# longest first; stripped only when at least _PL_MIN_STEM characters remain
+_PL_SUFFIXES = sorted("""
+owania owanie owaniu ościami ościach ościom ości ować iami iach iego iemu ymi ami ach ego emu
+owie owi ych ich ymi imi iej iem ów om ej ie ia ię ią iu em ym im ą ę a e i y u o
+""".split(), key=len, reverse=True)
+_PL_MIN_STEM = 3
+_PL_LETTERS = set("ąćęłńóśźż")
+_PL_ONLY_ENDINGS = ("ych", "ymi", "owie", "owi", "ami", "iem", "nym", "nej")
+
+# Polish letters without a Unicode decomposition
+_FOLD_EXTRA = str.maketrans({"ł": "l", "Ł": "L", "đ": "d", "ø": "o", "ß": "ss"})
+
+
+@lru_cache(maxsize=200_000)
+def stem_en(tok: str) -> str:
+	"""Light English suffix stripping (plurals, -ing / -ed / -ly / -ness / -ment, final -e)."""
+	if len(tok) <= 3 or not tok.isalpha():
+		return tok
+	for suf, rep in _EN_SUFFIXES:
+		if tok.endswith(suf) and len(tok) - len(suf) + len(rep) >= 3:
+			tok = tok[:-len(suf)] + rep
+			if suf in ("ing", "ed", "ingly", "edly") and len(tok) > 3 and tok[-1] == tok[-2] and tok[-1] not in "lsz":
+				tok = tok[:-1]		# running -> run, stopped -> stop
+			break
+	else:
+		if tok.endswith(("ches", "shes", "xes", "zes")) and len(tok) > 4:
+			tok = tok[:-2]
+		elif tok.endswith("s") and not tok.endswith(("ss", "us", "is")):
+			tok = tok[:-1]
+	if tok.endswith("e") and len(tok) > 4:
+		tok = tok[:-1]		# license / licensed -> licens
+	return tok
+
+
+@lru_cache(maxsize=200_000)
+def stem_pl(tok: str) -> str:
+	"""Light Polish stemming: strip the longest inflectional ending."""
+	if len(tok) <= _PL_MIN_STEM + 1 or tok.isdigit():
+		return tok
+	for suf in _PL_SUFFIXES:
+		if tok.endswith(suf) and len(tok) - len(suf) >= _PL_MIN_STEM:
+			return tok[:-len(suf)]
+	return tok
+
+
+@lru_cache(maxsize=200_000)
+def fold_ascii(tok: str) -> str:
+	"""zażółć -> zazolc: strip diacritics so queries typed without them still match."""
+	if tok.isascii():
+		return tok
+	tok = tok.translate(_FOLD_EXTRA)
+	return "".join(c for c in unicodedata.normalize("NFKD", tok) if not unicodedata.combining(c))
+
+
+def _is_polish(tok: str) -> bool:
+	return any(c in _PL_LETTERS for c in tok) or tok.endswith(_PL_ONLY_ENDINGS)
+
+
+def _stem_en_pl(tok: str) -> str:
+	if _is_polish(tok):
+		return stem_pl(tok)
+	stem = stem_en(tok)
+	return stem if stem != tok else stem_pl(tok)
+
+
+def _char_ngrams(tok: str, n: int) -> list[str]:
+	if len(tok) <= n:
+		return [tok]
+	padded = f"^{tok}$"
+	return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+class Analyzer:
+	"""
+	Text -> index terms: lowercase `\\w+` tokens, then the filters named in `chain`,
+	applied in this fixed order whatever order they are listed in:
+	- "stopwords_en", "stopwords_pl"	drop function words
+	- "stem_en", "stem_pl"				light suffix stripping; with both, tokens with
+										Polish letters or endings go to stem_pl, the
+										rest to stem_en and then stem_pl if unchanged
+	- "fold"							ASCII-fold diacritics (after stemming, which
+										needs them to tell Polish endings apart)
+	- "ngramN" (e.g. "ngram3")			replace each term by its character N-grams
+	An empty chain is the plain tokenizer BM25Index always used.
+	"""
+
+	FILTERS = ("stopwords_en", "stopwords_pl", "stem_en", "stem_pl", "fold")
+
+	def __init__(self, chain: Optional[list[str]] = None):
+		self.chain = [f.strip().lower() for f in (chain or []) if f and f.strip()]
+		self.ngram = 0
+		for f in self.chain:
+			if f.startswith("ngram") and f[5:].isdigit() and int(f[5:]) > 0:
+				self.ngram = int(f[5:])
+			elif f not in self.FILTERS:
+				raise ValueError(f"Unknown analyzer filter {f!r}; expected one of {self.FILTERS} or ngramN")
+		stop = set()
+		if "stopwords_en" in self.chain:
+			stop |= STOPWORDS_EN
+		if "stopwords_pl" in self.chain:
+			stop |= STOPWORDS_PL
+		self.stopwords = frozenset(stop)
+		self._steps = self._build_steps()
+
+	@property
+	def name(self) -> str:
+		return ",".join(self.chain) or "simple"
+
+	def __call__(self, text: str) -> list[str]:
+		toks = _WORD.findall((text or "").lower())
+		if self.stopwords:
+			toks = [t for t in toks if t not in self.stopwords]
+		for step in self._steps:
+			toks = [step(t) for t in toks]
+		if self.ngram:
+			toks = [g for t in toks for g in _char_ngrams(t, self.ngram)]
+		return toks
+
+	def _build_steps(self) -> list[Callable[[str], str]]:
+		steps = []
+		en, pl = "stem_en" in self.chain, "stem_pl" in self.chain
+		if en and pl:
+			steps.append(_stem_en_pl)
+		elif en:
+			steps.append(stem_en)
+		elif pl:
+			steps.append(stem_pl)
+		if "fold" in self.chain:
+			steps.append(fold_ascii)
+		return steps
+
+
+__all__ = ["Analyzer", "stem_en", "stem_pl", "fold_ascii", "STOPWORDS_EN", "STOPWORDS_PL"]
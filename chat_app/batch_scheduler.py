@@ -0,0 +1,306 @@
+# chat_app/batch_scheduler.py
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import torch
+
+from .kv_cache import _from_layers, _layers
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GenerationRequest:
+	input_ids: torch.Tensor				# 1-D prompt token ids
+	max_new_tokens: int = 500
+	eos_token_id: Optional[int] = None
+	streamer: object = None				# optional HF-style streamer (put/end)
+	stop: Optional[Callable[[list], bool]] = None	# called with the output ids; True retires the sequence
+	output_ids: list = field(default_factory=list)
+	error: Optional[BaseException] = None
+	submitted: float = field(default_factory=time.perf_counter)
+	first_token: Optional[float] = None
+	finished: Optional[float] = None
+	done: threading.Event = field(default_factory=threading.Event)
+
+	def result(self, timeout: Optional[float] = None) -> list[int]:
+		"""Block until the scheduler retires this request; returns generated token ids."""
+		if not self.done.wait(timeout):
+			raise TimeoutError("generation request timed out")
+		if self.error is not None:
+			raise self.error
+		return self.output_ids
+
+
+@dataclass
+class _BatchState:
+	past: tuple				# per layer (keys, values), each [B, H, T, D]
+	mask: torch.Tensor		# [B, T] attention mask over cached positions
+	pending: torch.Tensor	# [B] sampled tokens not yet fed back to the model
+
+
+class BatchScheduler:
+	"""
+	Continuous-batching decode loop for a causal LM.
+	- Callers submit() prompts from any thread and block on request.result().
+	- A single worker thread owns the model. Between decode steps it admits
+	  pending prompts (left-padded prefill, then merged into the running batch),
+	  decodes one token for every active sequence per step, and retires
+	  sequences as soon as they hit EOS, their token budget or their stop()
+	  check (e.g. a stop string).
+	- Every prompt is prefilled in full: there is no prefix or session KV reuse.
+	"""
+
+	def __init__(
+		self,
+		model,
+		pad_token_id: int = 0,
+		max_batch_size: int = 8,
+		max_wait_ms: int = 5,
+		do_sample: bool = False,
+		temperature: float = 1.0,
+		top_p: float = 1.0,
+	):
+		self.model = model
+		self.pad_token_id = int(pad_token_id or 0)
+		self.max_batch_size = max(1, int(max_batch_size))
+		self.max_wait = max(0, int(max_wait_ms)) / 1000.0
+		self.do_sample = bool(do_sample)
+		self.temperature = float(temperature or 1.0)
+		self.top_p = float(top_p or 1.0)
+		self.device = next(model.parameters()).device
+
+		self._queue: queue.Queue = queue.Queue()
+		self._stop = threading.Event()
+		self._thread: Optional[threading.Thread] = None
+		self._start_lock = threading.Lock()
+		self.stats = {"requests": 0, "generated_tokens": 0, "steps": 0, "prefills": 0, "max_batch": 0}
+
+	# ---------- public API ----------
+
+	def start(self) -> None:
+		with self._start_lock:
+			if self._thread is not None and self._thread.is_alive():
+				return
+			self._stop.clear()
+			self._thread = threading.Thread(target=self._loop, name="batch-scheduler", daemon=True)
+			self._thread.start()
+
+	def stop(self, timeout: Optional[float] = None) -> None:
+		self._stop.set()
+		self._queue.put(None)	# wake the worker if it is idle
+		if self._thread is not None:
+			self._thread.join(timeout)
+		self._thread = None
+
+	def submit(
+		self,
+		input_ids,
+		max_new_tokens: int = 500,
+		eos_token_id: Optional[int] = None,
+		streamer=None,
+		stop: Optional[Callable[[list], bool]] = None,
+	) -> GenerationRequest:
+		ids = torch.as_tensor(input_ids).reshape(-1).to(torch.long)
+		if ids.numel() == 0:
+			raise ValueError("Empty prompt.")
+		req = GenerationRequest(
+			input_ids=ids,
+			max_new_tokens=max(1, int(max_new_tokens)),
+			eos_token_id=eos_token_id,
+			streamer=streamer,
+			stop=stop,
+		)
+		self.start()
+		self._queue.put(req)
+		return req
+
+	def generate(self, input_ids, **kwargs) -> list[int]:
+		return self.submit(input_ids, **kwargs).result()
+
+	# ---------- worker ----------
+
+	def _loop(self) -> None:
+		active: list[GenerationRequest] = []
+		state: Optional[_BatchState] = None
+		while not self._stop.is_set():
+			admitted = self._take_pending(self.max_batch_size - len(active), block=not active)
+			joining = admitted		# not in `active` until prefilled and merged
+			try:
+				with torch.inference_mode():
+					if admitted:
+						new_state = self._prefill(admitted)
+						state = new_state if state is None else self._merge(state, new_state)
+						active.extend(admitted)
+						joining = []
+						self._emit(active[-len(admitted):], new_state.pending)
+						active, state = self._retire(active, state)
+					if active:
+						state = self._step(state)
+						self._emit(active, state.pending)
+						active, state = self._retire(active, state)
+			except Exception as e:
+				failed = active + joining
+				logger.exception("Batch decode failed; failing %d request(s): %s", len(failed), e)
+				for req in failed:
+					self._finish(req, error=e)
+				active, state = [], None
+
+		for req in active:
+			self._finish(req, error=RuntimeError("scheduler stopped"))
+
+	def _take_pending(self, room: int, block: bool) -> list[GenerationRequest]:
+		"""Collect up to `room` queued requests, waiting briefly so bursts share one prefill."""
+		if room <= 0:
+			return []
+		out: list[GenerationRequest] = []
+		try:
+			first = self._queue.get(timeout=0.1) if block else self._queue.get_nowait()
+		except queue.Empty:
+			return out
+		if first is None:
+			return out
+		out.append(first)
+		deadline = time.perf_counter() + self.max_wait
+		while len(out) < room:
+			remaining = deadline - time.perf_counter()
+			try:
+				item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+			except queue.Empty:
+				break
+			if item is None:
+				break
+			out.append(item)
+		return out
+
+	def _prefill(self, reqs: list[GenerationRequest]) -> _BatchState:
+		T = max(int(r.input_ids.numel()) for r in reqs)
+		ids = torch.full((len(reqs), T), self.pad_token_id, dtype=torch.long)
+		mask = torch.zeros((len(reqs), T), dtype=torch.long)
+		for i, r in enumerate(reqs):
+			n = int(r.input_ids.numel())
+			ids[i, T - n:] = r.input_ids
+			mask[i, T - n:] = 1
+			if r.streamer is not None:
+				r.streamer.put(r.input_ids.unsqueeze(0))	# consumed as the "prompt" by skip_prompt streamers
+		ids, mask = ids.to(self.device), mask.to(self.device)
+		position_ids = (mask.cumsum(-1) - 1).clamp(min=0)
+
+		out = self.model(input_ids=ids, attention_mask=mask, position_ids=position_ids, use_cache=True)
+		self.stats["prefills"] += 1
+		return _BatchState(
+			past=_layers(out.past_key_values),
+			mask=mask,
+			pending=self._sample(out.logits[:, -1, :]),
+		)
+
+	def _step(self, state: _BatchState) -> _BatchState:
+		position_ids = state.mask.sum(-1, keepdim=True)
+		mask = torch.cat([state.mask, torch.ones_like(state.mask[:, :1])], dim=-1)
+		out = self.model(
+			input_ids=state.pending.unsqueeze(-1),
+			attention_mask=mask,
+			position_ids=position_ids,
+			past_key_values=_from_layers(state.past),
+			use_cache=True,
+		)
+		self.stats["steps"] += 1
+		self.stats["max_batch"] = max(self.stats["max_batch"], int(mask.shape[0]))
+		return _BatchState(
+			past=_layers(out.past_key_values),
+			mask=mask,
+			pending=self._sample(out.logits[:, -1, :]),
+		)
+
+	def _merge(self, a: _BatchState, b: _BatchState) -> _BatchState:
+		"""Stack two batches; the shorter cache is left-padded with masked-out zeros."""
+		T = max(a.mask.shape[-1], b.mask.shape[-1])
+
+		def _pad_kv(t, n):
+			if n == 0:
+				return t
+			pad = t.new_zeros(t.shape[:2] + (n,) + t.shape[3:])
+			return torch.cat([pad, t], dim=2)
+
+		def _pad_mask(m, n):
+			return m if n == 0 else torch.cat([m.new_zeros((m.shape[0], n)), m], dim=-1)
+
+		na, nb = T - a.mask.shape[-1], T - b.mask.shape[-1]
+		past = tuple(
+			(torch.cat([_pad_kv(ka, na), _pad_kv(kb, nb)], dim=0),
+			 torch.cat([_pad_kv(va, na), _pad_kv(vb, nb)], dim=0))
+			for (ka, va), (kb, vb) in zip(a.past, b.past)
+		)
+		return _BatchState(
+			past=past,
+			mask=torch.cat([_pad_mask(a.mask, na), _pad_mask(b.mask, nb)], dim=0),
+			pending=torch.cat([a.pending, b.pending], dim=0),
+		)
+
+	def _emit(self, reqs: list[GenerationRequest], tokens: torch.Tensor) -> None:
+		now = time.perf_counter()
+		for req, tok in zip(reqs, tokens.tolist()):
+			if req.first_token is None:
+				req.first_token = now
+			req.output_ids.append(int(tok))
+			self.stats["generated_tokens"] += 1
+			if req.streamer is not None:
+				req.streamer.put(torch.tensor([int(tok)]))
+
+	def _retire(self, active: list[GenerationRequest], state: _BatchState):
+		keep = []
+		for i, req in enumerate(active):
+			last = req.output_ids[-1] if req.output_ids else None
+			if ((req.eos_token_id is not None and last == req.eos_token_id)
+					or len(req.output_ids) >= req.max_new_tokens
+					or (req.stop is not None and req.stop(req.output_ids))):
+				self._finish(req)
+			else:
+				keep.append(i)
+		if len(keep) == len(active):
+			return active, state
+		if not keep:
+			return [], None
+
+		idx = torch.tensor(keep, device=state.mask.device)
+		mask = state.mask.index_select(0, idx)
+		# drop leading columns that are padding for every remaining row
+		start = int((mask.sum(0) > 0).nonzero()[0].item())
+		past = tuple(
+			(k.index_select(0, idx)[:, :, start:], v.index_select(0, idx)[:, :, start:])
+			for k, v in state.past
+		)
+		return [active[i] for i in keep], _BatchState(
+			past=past,
+			mask=mask[:, start:],
+			pending=state.pending.index_select(0, idx),
+		)
+
+	def _finish(self, req: GenerationRequest, error: Optional[BaseException] = None) -> None:
+		req.error = error
+		req.finished = time.perf_counter()
+		if req.streamer is not None:
+			try:
+				req.streamer.end()
+			except Exception:
+				pass
+		self.stats["requests"] += 1
+		req.done.set()
+
+	def _sample(self, logits: torch.Tensor) -> torch.Tensor:
+		if not self.do_sample:
+			return logits.argmax(dim=-1)
+		probs = torch.softmax(logits.float() / max(self.temperature, 1e-5), dim=-1)
+		if self.top_p < 1.0:
+			sorted_probs, sorted_idx = probs.sort(dim=-1, descending=True)
+			cut = sorted_probs.cumsum(-1) - sorted_probs > self.top_p
+			sorted_probs = sorted_probs.masked_fill(cut, 0.0)
+			probs = torch.zeros_like(probs).scatter(-1, sorted_idx, sorted_probs)
+		return torch.multinomial(probs, num_samples=1).squeeze(-1)
+
+
+__all__ = ["BatchScheduler", "GenerationRequest"]
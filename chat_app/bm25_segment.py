@@ -0,0 +1,309 @@
+# chat_app/bm25_segment.py
+import json, mmap, os, shutil, sys, tempfile
+from array import array
+from typing import Iterable, Optional
+
+MAGIC = b"BM25SEG1"
+NO_SOURCE = 0xFFFFFFFF
+_U32 = "I" if array("I").itemsize == 4 else "L"
+_U64 = "Q"
+
+
+class Segment:
+	"""
+	Read-only, memory-mapped BM25 index segment written by write_segment().
+	Everything stays on disk as flat arrays; nothing is decoded up front:
+	- doc_len[d], doc_src[d]				(uint32 per document)
+	- ids / sources / terms					(utf-8 blobs + uint64 offsets)
+	- id_order								(doc numbers sorted by id, for id lookups)
+	- src_order								(source numbers sorted by path, for source lookups)
+	- src_doc_off[s] .. src_doc_off[s+1]	(slice of src_docs: doc numbers of source s)
+	- post_off[t] .. post_off[t+1]			(slice of post_docs / post_tfs for term t)
+	Terms, ids and sources are found by binary search.
+	"""
+
+	def __init__(self, path: str):
+		self.path = path
+		self._file = open(path, "rb")
+		self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		self._mv = memoryview(self._mm)
+		if bytes(self._mv[:8]) != MAGIC:
+			self.close()
+			raise ValueError(f"Not a BM25 segment: {path}")
+		meta_len = int.from_bytes(self._mv[8:16], "little")
+		meta = json.loads(bytes(self._mv[16:16 + meta_len]).decode("utf-8"))
+		if meta["byteorder"] != sys.byteorder:
+			self.close()
+			raise ValueError(f"BM25 segment {path} was written on a {meta['byteorder']}-endian machine")
+		base = _align(16 + meta_len)
+		self.meta = meta
+		self.n_docs = meta["n_docs"]
+		self.n_terms = meta["n_terms"]
+		self.total_len = meta["total_len"]
+		self._views = []
+		sec = {name: (base + off, n) for name, (off, n) in meta["sections"].items()}
+		self.doc_len = self._view(sec["doc_len"], _U32)
+		self.doc_src = self._view(sec["doc_src"], _U32)
+		self.id_order = self._view(sec["id_order"], _U32)
+		self._id_off = self._view(sec["id_off"], _U64)
+		self._id_blob = self._view(sec["id_blob"])
+		self._src_off = self._view(sec["src_off"], _U64)
+		self._src_blob = self._view(sec["src_blob"])
+		self._term_off = self._view(sec["term_off"], _U64)
+		self._term_blob = self._view(sec["term_blob"])
+		self.post_off = self._view(sec["post_off"], _U64)
+		self.post_docs = self._view(sec["post_docs"], _U32)
+		self.post_tfs = self._view(sec["post_tfs"], _U32)
+		self.n_sources = len(self._src_off) - 1
+		if "src_order" in sec:
+			self._src_order = self._view(sec["src_order"], _U32)
+			self._src_doc_off = self._view(sec["src_doc_off"], _U64)
+			self._src_docs = self._view(sec["src_docs"], _U32)
+		else:	# version 1 segment: build the source tables once, in memory
+			keys = [self.source(s).encode("utf-8") for s in range(self.n_sources)]
+			self._src_order = array(_U32, sorted(range(self.n_sources), key=keys.__getitem__))
+			self._src_doc_off, self._src_docs = _group_by_source(self.doc_src, self.n_sources)
+
+	# ---------- lookups ----------
+
+	def term_index(self, term: str) -> Optional[int]:
+		key = term.encode("utf-8")
+		lo, hi = 0, self.n_terms
+		off, blob = self._term_off, self._term_blob
+		while lo < hi:
+			mid = (lo + hi) // 2
+			cur = bytes(blob[off[mid]:off[mid + 1]])
+			if cur < key:
+				lo = mid + 1
+			elif cur > key:
+				hi = mid
+			else:
+				return mid
+		return None
+
+	def postings(self, t: int):
+		a, b = self.post_off[t], self.post_off[t + 1]
+		return self.post_docs[a:b], self.post_tfs[a:b]
+
+	def df(self, t: int) -> int:
+		return self.post_off[t + 1] - self.post_off[t]
+
+	def term(self, t: int) -> str:
+		return bytes(self._term_blob[self._term_off[t]:self._term_off[t + 1]]).decode("utf-8")
+
+	def doc_id(self, d: int) -> str:
+		return bytes(self._id_blob[self._id_off[d]:self._id_off[d + 1]]).decode("utf-8")
+
+	def find_doc(self, _id: str) -> Optional[int]:
+		key = _id.encode("utf-8")
+		lo, hi = 0, self.n_docs
+		order, off, blob = self.id_order, self._id_off, self._id_blob
+		while lo < hi:
+			mid = (lo + hi) // 2
+			d = order[mid]
+			cur = bytes(blob[off[d]:off[d + 1]])
+			if cur < key:
+				lo = mid + 1
+			elif cur > key:
+				hi = mid
+			else:
+				return d
+		return None
+
+	def source(self, s: int) -> str:
+		return bytes(self._src_blob[self._src_off[s]:self._src_off[s + 1]]).decode("utf-8")
+
+	def source_index(self, source: str) -> Optional[int]:
+		key = source.encode("utf-8")
+		lo, hi = 0, self.n_sources
+		order, off, blob = self._src_order, self._src_off, self._src_blob
+		while lo < hi:
+			mid = (lo + hi) // 2
+			s = order[mid]
+			cur = bytes(blob[off[s]:off[s + 1]])
+			if cur < key:
+				lo = mid + 1
+			elif cur > key:
+				hi = mid
+			else:
+				return s
+		return None
+
+	def source_docs(self, s: int):
+		"""Doc numbers (ascending) of the documents indexed with source s."""
+		return self._src_docs[self._src_doc_off[s]:self._src_doc_off[s + 1]]
+
+	def close(self) -> None:
+		for v in getattr(self, "_views", []):
+			v.release()
+		self._views = []
+		if getattr(self, "_mv", None) is not None:
+			self._mv.release()
+			self._mv = None
+		if getattr(self, "_mm", None) is not None:
+			self._mm.close()
+			self._mm = None
+		if getattr(self, "_file", None) is not None:
+			self._file.close()
+			self._file = None
+
+	def _view(self, section, code: Optional[str] = None):
+		start, n = section
+		v = self._mv[start:start + n]
+		if code is not None:
+			v = v.cast(code)
+		self._views.append(v)
+		return v
+
+
+def write_segment(
+	path: str,
+	docs: list[tuple[str, int, Optional[str]]],
+	terms: Iterable[tuple[str, list]],
+	total_len: int,
+	analyzer: str = "simple",
+) -> None:
+	"""
+	Write a segment atomically.
+	docs:  (id, length, source) per document, in doc-number order.
+	terms: (term, pieces) sorted by term's utf-8 bytes; pieces is a list of
+	       (doc_numbers, tfs) array pairs holding that term's postings in order.
+	"""
+	dirname = os.path.dirname(path) or "."
+	os.makedirs(dirname, exist_ok=True)
+	tmp_docs = tempfile.TemporaryFile(dir=dirname)
+	tmp_tfs = tempfile.TemporaryFile(dir=dirname)
+	try:
+		term_blob, term_off, post_off = bytearray(), array(_U64, [0]), array(_U64, [0])
+		n_post = 0
+		for term, pieces in terms:
+			count = 0
+			for d, tf in pieces:
+				tmp_docs.write(_as_u32(d))
+				tmp_tfs.write(_as_u32(tf))
+				count += len(d)
+			if not count:
+				continue
+			term_blob += term.encode("utf-8")
+			term_off.append(len(term_blob))
+			n_post += count
+			post_off.append(n_post)
+
+		id_blob, id_off = bytearray(), array(_U64, [0])
+		id_keys, src_keys = [], []
+		src_index, src_blob, src_off = {}, bytearray(), array(_U64, [0])
+		doc_len, doc_src = array(_U32), array(_U32)
+		for _id, dl, src in docs:
+			key = _id.encode("utf-8")
+			id_keys.append(key)
+			id_blob += key
+			id_off.append(len(id_blob))
+			doc_len.append(dl)
+			if src is None:
+				doc_src.append(NO_SOURCE)
+			else:
+				s = src_index.get(src)
+				if s is None:
+					s = src_index[src] = len(src_index)
+					src_keys.append(src.encode("utf-8"))
+					src_blob += src_keys[-1]
+					src_off.append(len(src_blob))
+				doc_src.append(s)
+		id_order = array(_U32, sorted(range(len(id_keys)), key=id_keys.__getitem__))
+		src_order = array(_U32, sorted(range(len(src_keys)), key=src_keys.__getitem__))
+		src_doc_off, src_docs = _group_by_source(doc_src, len(src_keys))
+
+		blobs = [
+			("doc_len", doc_len.tobytes()),
+			("doc_src", doc_src.tobytes()),
+			("id_order", id_order.tobytes()),
+			("id_off", id_off.tobytes()),
+			("id_blob", bytes(id_blob)),
+			("src_off", src_off.tobytes()),
+			("src_blob", bytes(src_blob)),
+			("src_order", src_order.tobytes()),
+			("src_doc_off", src_doc_off.tobytes()),
+			("src_docs", src_docs.tobytes()),
+			("term_off", term_off.tobytes()),
+			("term_blob", bytes(term_blob)),
+			("post_off", post_off.tobytes()),
+		]
+		sections, off = {}, 0
+		for name, data in blobs:
+			sections[name] = (off, len(data))
+			off = _align(off + len(data))
+		item = array(_U32).itemsize
+		for name in ("post_docs", "post_tfs"):
+			sections[name] = (off, n_post * item)
+			off = _align(off + n_post * item)
+		meta = json.dumps({
+			"version": 2,
+			"byteorder": sys.byteorder,
+			"n_docs": len(docs),
+			"n_terms": len(term_off) - 1,
+			"n_postings": n_post,
+			"total_len": int(total_len),
+			"analyzer": analyzer,
+			"sections": sections,
+		}).encode("utf-8")
+
+		tmp_path = path + ".tmp"
+		with open(tmp_path, "wb") as f:
+			f.write(MAGIC)
+			f.write(len(meta).to_bytes(8, "little"))
+			f.write(meta)
+			base = _align(16 + len(meta))
+			f.write(b"\0" * (base - 16 - len(meta)))
+			for name, data in blobs:
+				_pad_to(f, base + sections[name][0])
+				f.write(data)
+			for name, src in (("post_docs", tmp_docs), ("post_tfs", tmp_tfs)):
+				_pad_to(f, base + sections[name][0])
+				src.seek(0)
+				shutil.copyfileobj(src, f, 1 << 20)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmp_path, path)
+	finally:
+		tmp_docs.close()
+		tmp_tfs.close()
+
+
+def _group_by_source(doc_src, n_sources: int):
+	"""doc_src -> (offsets, doc numbers) with source s's docs at offsets[s]:offsets[s+1]."""
+	counts = [0] * (n_sources + 1)
+	for s in doc_src:
+		if s != NO_SOURCE:
+			counts[s + 1] += 1
+	for s in range(n_sources):
+		counts[s + 1] += counts[s]
+	offsets = array(_U64, counts)
+	docs = array(_U32, bytes(array(_U32).itemsize * counts[-1]))
+	fill = counts[:-1]
+	for d, s in enumerate(doc_src):
+		if s != NO_SOURCE:
+			docs[fill[s]] = d
+			fill[s] += 1
+	return offsets, docs
+
+
+def _as_u32(a):
+	"""Pass uint32 arrays / mmapped views through untouched; copy anything else."""
+	if isinstance(a, array) and a.typecode == _U32:
+		return a
+	if isinstance(a, memoryview) and a.format == _U32:
+		return a
+	return array(_U32, a)
+
+
+def _align(n: int, to: int = 8) -> int:
+	return (n + to - 1) // to * to
+
+
+def _pad_to(f, pos: int) -> None:
+	cur = f.tell()
+	if cur < pos:
+		f.write(b"\0" * (pos - cur))
+
+
+__all__ = ["Segment", "write_segment", "NO_SOURCE"]
@@ -1,6 +1,9 @@
 # chat_app.py
+import json
 import logging
-from flask import Flask, render_template, request, jsonify
+import time
+import uuid
+from flask import Flask, Response, after_this_request, render_template, request, jsonify, stream_with_context
 from user_agents import parse
 from typing import Optional
 try:
@@ -27,13 +30,16 @@ try:
     from .disk_cache import DiskCache
 except Exception:
     DiskCache = None
-from .settings import load_settings, save_settings, merge_settings
+from .settings import load_settings, save_settings, merge_settings, get_settings
+from .worker_pool import WorkerPool, Overloaded
 
 logger = logging.getLogger(__name__)
-cfg = load_settings
+cfg = get_settings
 
 
 class ChatApp:
+    SESSION_COOKIE = "chat_session"
+
     def __init__(self, model_id: Optional[str] = None):
         if not model_id:
             model_id = cfg().model.model_id
@@ -56,6 +62,17 @@ class ChatApp:
                 def add(self, *args, **kwargs):
                     return None
             self.cache = _DummyCache()
+        # Blocking model work runs on bounded pools; full pools answer 429
+        settings = load_settings()
+        app_cfg = settings.app
+        gen_workers = app_cfg.generation_workers
+        if settings.model.batching:
+            # the batch scheduler can only merge requests the pool lets through at once
+            gen_workers = max(gen_workers, settings.model.max_batch_size)
+        self.gen_pool = WorkerPool("generation", gen_workers,
+                                   app_cfg.generation_queue, app_cfg.pool_timeout_s)
+        self.retrieval_pool = WorkerPool("retrieval", app_cfg.retrieval_workers,
+                                         app_cfg.retrieval_queue, app_cfg.pool_timeout_s)
         logger.info("ChatApp initialized with model %s", model_id)
 
         self.app.add_url_rule('/', view_func=self.index, methods=['GET'])
@@ -65,6 +82,8 @@ class ChatApp:
         self.app.add_url_rule('/settings', view_func=self.settings, methods=['GET'])
         self.app.add_url_rule('/api/settings', view_func=self.get_settings_api, methods=['GET'])
         self.app.add_url_rule('/api/settings', view_func=self.post_settings_api, methods=['POST'])
+        self.app.add_url_rule('/api/metrics', view_func=self.get_metrics_api, methods=['GET'])
+        self.app.add_url_rule('/api/diagnostics', view_func=self.get_diagnostics_api, methods=['GET'])
 
     def index(self):
         try:
@@ -81,33 +100,59 @@ class ChatApp:
 
     def chat(self):
         try:
+            t0 = time.perf_counter()
             user_message = request.json['message']
+            stream = bool(request.json.get('stream', False))
+            session_id = self._session_id()
             logger.info("Chat message received: %s", user_message)
             key = self._cache_key(user_message, k=cfg().app.max_context)
-            cached = self.cache.get(key)
+            # replies depend on the session's earlier turns, so only opening turns share the cache
+            cacheable = not self.llm.has_history(session_id)
+            cached = self.cache.get(key) if cacheable else None
+            if cached:
+                self.llm.record_turn(user_message, cached, session_id)
+            if stream:
+                if cached:
+                    return self._stream_response(iter([cached]), lambda text: text, {'mode': 'llm'}, t0)
+
+                def _finalize(llm_response):
+                    if cacheable:
+                        self.cache.add(key, llm_response)
+                    return self.guard.post_processing(llm_response, False, False)
+                release = self.gen_pool.reserve()
+                return self._stream_response(
+                    self.llm.chat_next_stream(user_message, session_id=session_id), _finalize, {'mode': 'llm'}, t0,
+                    on_close=release)
+
+            stats = None
             if cached:
                 processed_response = cached
             else:
-                llm_response = self.llm.chat_next(user_message)
+                llm_response, stats = self._generate(self.llm.chat_next, user_message, session_id=session_id)
                 processed_response = self.guard.post_processing(llm_response, False, False)
-                self.cache.add(key, llm_response)
+                if cacheable:
+                    self.cache.add(key, llm_response)
             return jsonify({
                 'message': {
                     'format': 'markdown',
                     'content': processed_response,
                 },
-                'meta': {
+                'meta': self._with_generation_stats({
                     'mode': 'llm',
-                }
+                }, stats)
             }), 200
+        except Overloaded as e:
+            return self._overloaded(e)
         except Exception as e:
             logger.exception("Error in chat route: %s", e)
             return jsonify({'error': str(e)})
 
     def rag_chat(self):
         try:
+            t0 = time.perf_counter()
             processed_response = None
             user_message = request.json['message']
+            stream = bool(request.json.get('stream', False))
             logger.info("RAG chat message received: %s", user_message)
 
             if not self.guard.is_tech_science(user_message):
@@ -116,17 +161,41 @@ class ChatApp:
 
             rec = self.cache.get(key, get_extra=True)
             cached, cache_meta = rec if rec else (None, None)
-            result = self.rag.build_messages_hybrid(user_message)
+            result = self.retrieval_pool.run(self.rag.build_messages_hybrid, user_message)
             messages, sources, fmt_ids_new = (result["messages"], result["sources"], result["fmt_ids"])
             if cached and cache_meta and cache_meta["fmt_ids"]:
                 fmt_ids_old = cache_meta["fmt_ids"]
                 if self._is_similar_jaccard(fmt_ids_new, fmt_ids_old):
                     processed_response = cached
+
+            meta = {
+                'sources': sources,
+                'mode': 'rag',
+                'retrieval': result.get("timings", {}),
+            }
+            if stream:
+                if processed_response:
+                    return self._stream_response(iter([processed_response]), lambda text: text, meta, t0)
+                logger.info("Built RAG messages with %d sources", len(sources))
+
+                def _finalize(llm_response):
+                    processed = self.guard.post_processing(
+                                llm_response,
+                                is_sus=result["is_sus"],
+                                was_redacted=result["was_redacted"])
+                    self.cache.add(key, processed,
+                                   extra_meta={"fmt_ids": sorted(list(fmt_ids_new))})
+                    return processed
+                release = self.gen_pool.reserve()
+                return self._stream_response(
+                    self.llm.chat_messages_stream(messages, reset=True), _finalize, meta, t0, on_close=release)
+
+            stats = None
             if not processed_response:
                 logger.info("Built RAG messages with %d sources", len(sources))
 
                 # Stateless RAG turn: reset history so prior chit-chat doesn't leak
-                llm_response = self.llm.chat_messages(messages, reset=True)
+                llm_response, stats = self._generate(self.llm.chat_messages, messages, reset=True)
                 processed_response = self.guard.post_processing(
                             llm_response, 
                             is_sus=result["is_sus"], 
@@ -139,11 +208,10 @@ class ChatApp:
                     'format': 'markdown',
                     'content': processed_response,
                 },
-                'meta': {
-                    'sources': sources,
-                    'mode': 'rag',
-                }
+                'meta': self._with_generation_stats(meta, stats),
             }), 200
+        except Overloaded as e:
+            return self._overloaded(e)
         except Exception as e:
             logger.exception("Error in rag route: %s", e)
             return jsonify({'error': str(e)})
@@ -177,6 +245,33 @@ class ChatApp:
             logger.exception("Error in post_settings_api route: %s", e)
             return jsonify({'error': str(e)})
 
+    def get_metrics_api(self):
+        try:
+            metrics = {}
+            if self.llm is not None and hasattr(self.llm, "metrics"):
+                metrics["llm"] = self.llm.metrics()
+            metrics["pools"] = {
+                "generation": self.gen_pool.snapshot(),
+                "retrieval": self.retrieval_pool.snapshot(),
+            }
+            embedder = getattr(self.store, "embedder", None)
+            if embedder is not None and hasattr(embedder, "cache_stats"):
+                metrics["query_embeddings"] = embedder.cache_stats()
+            return jsonify(metrics), 200
+        except Exception as e:
+            logger.exception("Error in get_metrics_api route: %s", e)
+            return jsonify({'error': str(e)})
+
+    def get_diagnostics_api(self):
+        try:
+            from .ocr_env import get_ocr_env
+            refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+            cmd = getattr(self.store, "tesseract_cmd", None) or "tesseract"
+            return jsonify({'ocr': get_ocr_env(cmd, refresh=refresh).to_dict()}), 200
+        except Exception as e:
+            logger.exception("Error in get_diagnostics_api route: %s", e)
+            return jsonify({'error': str(e)})
+
     def ingest_folder(self):
         try:
             folders = load_settings().paths.data_dirs
@@ -184,12 +279,16 @@ class ChatApp:
             for cfg in folders:
                 files.extend(self.scanner.scan(
                     cfg.path, recursively=cfg.recursive))
-            added = self.store.ingest(files)
+            # incremental: unchanged files are skipped, changed/deleted ones replaced/removed
+            summary = self.store.sync(files)
+            added = summary.pop('added_ids')
             return jsonify({
                 'files_ingested': len(added),
+                'sync': summary,
                 'message': {
                     'format': 'text',
-                    'content': f'added {len(added)} ids'
+                    'content': f"added {len(added)} ids, removed {summary['chunks_removed']}; "
+                               f"{summary['unchanged']} unchanged files skipped"
                 }
             }), 200
         except Exception as e:
@@ -200,6 +299,32 @@ class ChatApp:
         logger.info("Starting ChatApp server with args: %s", kwargs)
         self.app.run(**kwargs)
 
+    def serve(self, host: Optional[str] = None, port: Optional[int] = None, server: Optional[str] = None):
+        """
+        Production serving: app.server = "waitress" (if installed) or "threaded"
+        (werkzeug's threaded WSGI server). Model work is bounded by the pools,
+        so the server's own thread count only limits open connections.
+        """
+        app_cfg = load_settings().app
+        host = host or app_cfg.host
+        port = port or app_cfg.port
+        server = server or app_cfg.server
+        if server == "waitress":
+            try:
+                from waitress import serve as waitress_serve
+            except ImportError:
+                logger.warning("waitress is not installed; falling back to the threaded server")
+            else:
+                logger.info("Serving on waitress at %s:%s (%d threads)", host, port, app_cfg.server_threads)
+                waitress_serve(self.app, host=host, port=port, threads=app_cfg.server_threads)
+                return
+        if server == "flask":
+            self.run(host=host, port=port, use_reloader=False)
+            return
+        from werkzeug.serving import make_server
+        logger.info("Serving on threaded WSGI at %s:%s", host, port)
+        make_server(host, port, self.app, threaded=True).serve_forever()
+
     def _is_chit_chat(self):
         return jsonify({
                 'message': {
@@ -212,6 +337,76 @@ class ChatApp:
                 }
             }), 200
 
+    def _session_id(self) -> str:
+        """Client session id from the request body or cookie; new clients get one set as a cookie."""
+        sid = (request.json or {}).get('session_id') or request.cookies.get(self.SESSION_COOKIE)
+        if not sid:
+            sid = uuid.uuid4().hex
+
+            @after_this_request
+            def _set_cookie(response):
+                response.set_cookie(self.SESSION_COOKIE, sid, httponly=True, samesite='Lax')
+                return response
+        return str(sid)
+
+    def _generate(self, fn, *args, **kwargs):
+        """Run a blocking LLM call on the generation pool; returns (reply, its decoding stats)."""
+        def _call():
+            return fn(*args, **kwargs), self._last_generation_stats()
+        return self.gen_pool.run(_call)
+
+    def _last_generation_stats(self):
+        # per-thread in the handler, so read it on the thread that generated
+        stats = getattr(self.llm, 'last_generation_stats', lambda: None)()
+        return stats if isinstance(stats, dict) else None
+
+    def _with_generation_stats(self, meta: dict, stats: Optional[dict]) -> dict:
+        """Attach per-request decoding stats (generated length, budget, speculative acceptance) when the LLM reports them."""
+        return dict(meta, generation=stats) if stats else meta
+
+    def _overloaded(self, e: Overloaded):
+        logger.warning("Rejecting request: %s", e)
+        response = jsonify({'error': 'Server is busy, please retry shortly.', 'pool': e.pool})
+        response.headers['Retry-After'] = str(e.retry_after_s)
+        return response, 429
+
+    def _stream_response(self, pieces, finalize, meta: dict, t0: float, on_close=None):
+        """
+        Stream generated text as JSON lines: one {"type": "token"} record per piece,
+        then a {"type": "done"} record carrying the post-processed message and meta.
+        `finalize(text)` runs once the stream is exhausted (cache write + post-processing).
+        `on_close()` runs when the stream ends or the client goes away (releases the pool slot).
+        """
+        def _lines():
+            ttft = None
+            parts = []
+            try:
+                for piece in pieces:
+                    if ttft is None:
+                        ttft = time.perf_counter() - t0
+                    parts.append(piece)
+                    yield json.dumps({'type': 'token', 'content': piece}, ensure_ascii=False) + "\n"
+                content = finalize("".join(parts))
+                total = time.perf_counter() - t0
+                yield json.dumps({
+                    'type': 'done',
+                    'message': {
+                        'format': 'markdown',
+                        'content': content,
+                    },
+                    'meta': dict(self._with_generation_stats(meta, self._last_generation_stats()),
+                                 ttft_ms=round((ttft if ttft is not None else total) * 1000, 1),
+                                 total_ms=round(total * 1000, 1)),
+                }, ensure_ascii=False) + "\n"
+            except Exception as e:
+                logger.exception("Error while streaming response: %s", e)
+                yield json.dumps({'type': 'error', 'error': str(e)}) + "\n"
+
+        response = Response(stream_with_context(_lines()), mimetype='application/x-ndjson')
+        if on_close is not None:
+            response.call_on_close(on_close)
+        return response
+
     def _is_similar_jaccard(self, a: set[str], b: set[str], tau: float = 0.8) -> bool:
         A, B = set(a or []), set(b or [])
         if not A and not B:
@@ -224,7 +419,7 @@ class ChatApp:
     def _cache_key(self, question: str, k: Optional[int] = None, model_id: Optional[str] = None, prompt_ver: str = "v1") -> str:
         BLOCK_PRIVATE = cfg().guardrails.BLOCK_PRIVATE
         ALLOW_ONLY_TECH = cfg().guardrails.ALLOW_ONLY_TECH
-        k = k if k else load_settings().app.max_context
+        k = k if k else cfg().app.max_context
         model_id = model_id or getattr(self.llm, "model_id", "unknown")
         return f"{prompt_ver}|{model_id}|k{k}|{question}|BP{BLOCK_PRIVATE}|AOT{ALLOW_ONLY_TECH}"
 
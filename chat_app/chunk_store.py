@@ -0,0 +1,75 @@
+# chat_app/chunk_store.py
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+
+class ChunkStore:
+	"""
+	In-memory chunk id -> (document, metadata) map that serves hydration without Chroma.
+	- Written through on ingest and dropped on delete, so it follows the collection.
+	- Read-through: RAGStore.hydrate() asks Chroma only for the ids missing here
+	  and put()s what comes back.
+	- Bounded: the least recently used chunks are evicted past `max_chunks`
+	  (0 = no limit).
+	"""
+
+	def __init__(self, max_chunks: int = 100_000):
+		self.max_chunks = max(0, int(max_chunks))
+		self._chunks: "OrderedDict[str, tuple]" = OrderedDict()
+		self._lock = threading.Lock()
+		self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+	def __len__(self) -> int:
+		return len(self._chunks)
+
+	def __contains__(self, _id: str) -> bool:
+		return _id in self._chunks
+
+	def get_many(self, ids: Iterable[str]) -> tuple[dict, dict, list]:
+		"""(id -> document, id -> metadata, missing ids) for the given ids."""
+		docs, metas, missing = {}, {}, []
+		with self._lock:
+			for _id in ids:
+				hit = self._chunks.get(_id)
+				if hit is None:
+					missing.append(_id)
+					continue
+				self._chunks.move_to_end(_id)
+				docs[_id], metas[_id] = hit
+			self.counters["hits"] += len(docs)
+			self.counters["misses"] += len(missing)
+		return docs, metas, missing
+
+	def put_many(self, ids: Iterable[str], documents: Iterable[str], metadatas: Optional[Iterable[dict]] = None) -> None:
+		ids = list(ids)
+		metadatas = metadatas if metadatas is not None else [None] * len(ids)
+		with self._lock:
+			for _id, doc, meta in zip(ids, documents, metadatas):
+				self._chunks[_id] = (doc, meta)
+				self._chunks.move_to_end(_id)
+			while self.max_chunks and len(self._chunks) > self.max_chunks:
+				self._chunks.popitem(last=False)
+				self.counters["evictions"] += 1
+
+	def delete(self, ids: Iterable[str]) -> None:
+		with self._lock:
+			for _id in ids:
+				self._chunks.pop(_id, None)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._chunks.clear()
+
+	def stats(self) -> dict:
+		with self._lock:
+			lookups = self.counters["hits"] + self.counters["misses"]
+			return dict(
+				self.counters,
+				chunks=len(self._chunks),
+				max_chunks=self.max_chunks,
+				hit_rate=round(self.counters["hits"] / lookups, 3) if lookups else 0.0,
+			)
+
+
+__all__ = ["ChunkStore"]
@@ -9,6 +9,9 @@ class DiskCache:
 	"""
 	Simple on-disk cache for responses.
 	- One file per entry: first line = JSON meta, remaining = payload.
+	- "npy" entries hold a float32 vector in .npy format after the meta line
+	  (add() takes any array-like, get() returns a list of floats). Their keys
+	  are hashed as given; text/json keys are whitespace- and case-folded.
 	- LRU-ish purge by mtime when size exceeds threshold.
 	"""
 	def __init__(self, type: str = "text", cache_folder_path: Optional[str] = None, max_size_Gb: int = 2):
@@ -54,7 +57,7 @@ class DiskCache:
 
 		self.max_bytes = int(max_size_Gb * 1024**3)
 
-	def add(self, key: str, value: str, *, ttl: float | None = None, extra_meta: dict | None = None) -> str:
+	def add(self, key: str, value: Union[str, list], *, ttl: float | None = None, extra_meta: dict | None = None) -> str:
 		"""
 		Add value under key. Returns the hashed key actually used for the filename.
 		"""
@@ -73,10 +76,18 @@ class DiskCache:
 			"extra_meta": extra_meta,
 		}
 
-		tmp = tempfile.NamedTemporaryFile("w", delete=False, dir=p.parent, encoding="utf-8")
+		if self.type_name == "npy":
+			tmp = tempfile.NamedTemporaryFile("wb", delete=False, dir=p.parent)
+		else:
+			tmp = tempfile.NamedTemporaryFile("w", delete=False, dir=p.parent, encoding="utf-8")
 		try:
-			tmp.write(json.dumps(meta) + "\n")
-			tmp.write(value)
+			if self.type_name == "npy":
+				import numpy as np
+				tmp.write((json.dumps(meta) + "\n").encode("utf-8"))
+				np.save(tmp, np.asarray(value, dtype=np.float32), allow_pickle=False)
+			else:
+				tmp.write(json.dumps(meta) + "\n")
+				tmp.write(value)
 			tmp.flush()
 			os.fsync(tmp.fileno())
 		finally:
@@ -103,6 +114,8 @@ class DiskCache:
 		p = self._path_for(hashed_key)
 		if not p.exists():
 			return None
+		if self.type_name == "npy":
+			return self._get_npy(p, get_extra)
 
 		with p.open("r", encoding="utf-8") as f:
 			header = f.readline()
@@ -160,7 +173,29 @@ class DiskCache:
 		self._approx_bytes = max(int(total), 0)
 
 	# ---------- helpers ----------
+	def _get_npy(self, p: Path, get_extra: bool):
+		import io
+		import numpy as np
+		with p.open("rb") as f:
+			header = f.readline()
+			if not header:
+				return None
+			meta = json.loads(header)
+			if meta.get("ttl") is not None and time.time() > meta["created"] + float(meta["ttl"]):
+				return None
+			vec = np.load(io.BytesIO(f.read()), allow_pickle=False).tolist()
+		# binary payload: record the access through mtime (what purge_size orders by)
+		try:
+			os.utime(p)
+		except Exception:
+			pass
+		if get_extra:
+			return (vec, meta.get("extra_meta"))
+		return vec
+
 	def _normalize_key(self, text: str) -> str:
+		if self.type_name == "npy":
+			return text or ""	# embedding keys: the caller decides what is equivalent (cased models)
 		return " ".join((text or "").strip().split()).lower()
 
 	def _count_bytes(self) -> int:
@@ -0,0 +1,246 @@
+# chat_app/doc_converter.py
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from docling.document_converter import DocumentConverter, PdfFormatOption
+from docling.datamodel.base_models import InputFormat
+from docling.datamodel.pipeline_options import (
+	ThreadedPdfPipelineOptions as PdfPipelineOptions,
+	TesseractCliOcrOptions,
+)
+
+from .ocr_env import get_ocr_env
+
+# pages with less text than this in the first pass are OCR'd if they hold an image
+MIN_PAGE_CHARS = 100
+# a text layer with this many characters and text on every page is never OCR'd
+DENSE_DOC_CHARS = 2000
+
+# process-wide DocumentConverter pool: pipeline options -> converter with its models loaded
+_POOL: dict[tuple, DocumentConverter] = {}
+_POOL_LOCK = threading.Lock()
+
+
+class DoclingConverter:
+	"""
+	Docling conversion with Tesseract OCR, split out of RAGStore so ingest worker
+	processes can run it without a Chroma client or an embedder.
+	Holds only the tesseract command and tessdata dir, so it is cheap to rebuild
+	in a child process from those two values.
+	DocumentConverters (and their layout / table / OCR models) come from a
+	process-wide pool keyed by pipeline options, built on first use and reused
+	across files, ingest runs and instances. `timings` keeps model load time
+	apart from conversion time.
+	"""
+
+	def __init__(self, tesseract_cmd: str = "tesseract", tessdata_dir: Optional[str | Path] = None,
+				 debug: Optional[Callable[[str], None]] = None):
+		self.tesseract_cmd = tesseract_cmd
+		self.tessdata_dir = Path(tessdata_dir) if tessdata_dir else None
+		self.converter: DocumentConverter | None = None
+		self._debug = debug or _print
+		self.timings = {"loads": 0, "load_s": 0.0, "conversions": 0, "convert_s": 0.0}
+
+	def convert_auto_ocr(self, abs_path: str):
+		"""
+		Text layer first, OCR only where it is missing:
+		1) Convert without OCR (fastest for text-native PDFs). A dense text
+		   layer (DENSE_DOC_CHARS in total, text on every page) is kept as is.
+		2) Pages with no text, or with fewer than MIN_PAGE_CHARS characters and
+		   an image, are converted again with OCR, one page range per run of
+		   such pages, and their items replace the first-pass ones in the
+		   first-pass document. Short pages without images (slides, forms)
+		   keep their text layer.
+		3) A document with no usable text layer on any page is OCR'd in one pass.
+		"""
+		res1 = self.convert(abs_path, ocr=False, do_picture_description=False)
+		doc1 = res1.document
+		chars = page_text_lengths(doc1)
+		if sum(chars.values()) >= DENSE_DOC_CHARS and all(chars.values()):
+			return res1
+		images = picture_pages(doc1)
+		sparse = [p for p in sorted(chars) if not chars[p] or (chars[p] < MIN_PAGE_CHARS and p in images)]
+		if not sparse:
+			return res1
+		if len(sparse) == len(chars):
+			return self.convert(abs_path, ocr=True, do_picture_description=False)
+
+		self._debug(f"[OCR] {len(sparse)}/{len(chars)} pages without a text layer: {sparse}")
+		try:
+			for start, end in _page_runs(sparse):
+				res = self.convert(abs_path, ocr=True, do_picture_description=False, page_range=(start, end))
+				_merge_pages(doc1, res.document, set(range(start, end + 1)))
+		except Exception as e:
+			self._debug(f"[OCR] Per-page OCR failed ({e}); OCR-ing the whole document")
+			return self.convert(abs_path, ocr=True, do_picture_description=False)
+		return res1
+
+	def convert(self, abs_path: str, *, ocr: bool, do_picture_description: bool = False,
+				page_range: Optional[tuple[int, int]] = None):
+		self.converter = self.get_converter(ocr=ocr, do_picture_description=do_picture_description)
+		t0 = time.perf_counter()
+		if page_range is None:
+			result = self.converter.convert(abs_path)
+		else:
+			result = self.converter.convert(abs_path, page_range=page_range)
+		took = time.perf_counter() - t0
+		self.timings["conversions"] += 1
+		self.timings["convert_s"] += took
+		pages = f" pages {page_range[0]}-{page_range[1]}" if page_range else ""
+		self._debug(f"[DOCLING] Converted {abs_path}{pages} (ocr={bool(ocr)}) in {took:.2f}s")
+		return result
+
+	def get_converter(self, *, ocr: bool, do_picture_description: bool = False) -> DocumentConverter:
+		"""Pooled converter for these options; the first call builds it and loads its models."""
+		langs = self._ocr_langs() if ocr else ()
+		key = (bool(ocr), bool(do_picture_description), self.tesseract_cmd, str(self.tessdata_dir or ""), langs)
+		with _POOL_LOCK:
+			converter = _POOL.get(key)
+			if converter is not None:
+				return converter
+			t0 = time.perf_counter()
+			converter = self._build_converter(ocr=ocr, do_picture_description=do_picture_description, langs=langs)
+			# load the PDF pipeline models now, so convert time is conversion only
+			init = getattr(converter, "initialize_pipeline", None)
+			if init is not None:
+				init(InputFormat.PDF)
+			took = time.perf_counter() - t0
+			_POOL[key] = converter
+		self.timings["loads"] += 1
+		self.timings["load_s"] += took
+		self._debug(f"[DOCLING] Loaded pipeline (ocr={bool(ocr)}, pictures={bool(do_picture_description)}) in {took:.2f}s")
+		return converter
+
+	def _build_converter(self, *, ocr: bool, do_picture_description: bool, langs: tuple) -> DocumentConverter:
+		popts = PdfPipelineOptions()
+		popts.do_picture_description = bool(do_picture_description)
+		popts.images_scale = 3.0
+		popts.ocr_batch_size = 1
+
+		popts.do_ocr = bool(ocr)
+		if popts.do_ocr:
+			tdir = str(self.tessdata_dir) if self.tessdata_dir else None
+			self._debug(f"[OCR] Using langs={list(langs)}, tessdata_dir={tdir}")
+
+			popts.ocr_options = TesseractCliOcrOptions(
+				tesseract_cmd=self.tesseract_cmd,
+				path=tdir,								# <- pass tessdata folder, not install root
+				lang=list(langs),
+				force_full_page_ocr=True,
+				bitmap_area_threshold=0.0,
+			)
+
+		return DocumentConverter(format_options={
+			InputFormat.PDF: PdfFormatOption(pipeline_options=popts)
+		})
+
+	def _ocr_langs(self) -> tuple:
+		desired_langs = ["eng","pol"]
+		installed = self.installed_tess_langs()
+		return tuple(l for l in desired_langs if l in installed) or ("eng",)
+
+	def installed_tess_langs(self) -> set[str]:
+		"""
+		Return set of installed Tesseract language codes, e.g. {'eng','pol'}
+		(from the process-wide, disk-cached OCR environment probe).
+		"""
+		env = get_ocr_env(self.tesseract_cmd)
+		if env.error:
+			self._debug(f"[OCR] Couldn't list Tesseract languages: {env.error}")
+		return set(env.langs)
+
+
+def page_text_lengths(doc) -> dict[int, int]:
+	"""page_no -> characters of text (incl. table cells) the document has on that page."""
+	chars = {int(p): 0 for p in (getattr(doc, "pages", None) or {})}
+	for item, _ in doc.iterate_items():
+		n = _item_chars(item)
+		if not n:
+			continue
+		for prov in getattr(item, "prov", None) or []:
+			chars[prov.page_no] = chars.get(prov.page_no, 0) + n
+	return chars
+
+
+def picture_pages(doc) -> set[int]:
+	"""Pages the document has a picture on (what a scanned page looks like without OCR)."""
+	return {prov.page_no for pic in getattr(doc, "pictures", None) or [] for prov in getattr(pic, "prov", None) or []}
+
+
+def _item_chars(item) -> int:
+	text = getattr(item, "text", None)
+	if text:
+		return len(text)
+	cells = getattr(getattr(item, "data", None), "table_cells", None) or []
+	return sum(len(getattr(c, "text", "") or "") for c in cells)
+
+
+def _on_pages(item, pages: set) -> bool:
+	return any(prov.page_no in pages for prov in getattr(item, "prov", None) or [])
+
+
+def _merge_pages(doc, ocr_doc, pages: set) -> None:
+	"""Replace the text and table items of `pages` in doc with those of ocr_doc."""
+	stale = [item for item, _ in doc.iterate_items() if _item_chars(item) and _on_pages(item, pages)]
+	if stale:
+		doc.delete_items(node_items=stale)
+	for item, _ in ocr_doc.iterate_items():
+		if not _on_pages(item, pages):
+			continue
+		if getattr(item, "data", None) is not None and hasattr(item.data, "table_cells"):
+			doc.add_table(data=item.data, prov=item.prov[0], label=item.label)
+		elif getattr(item, "text", None):
+			doc.add_text(label=item.label, text=item.text, prov=item.prov[0])
+	_sort_body_by_page(doc)
+
+
+def _sort_body_by_page(doc) -> None:
+	"""
+	add_text/add_table append to the end of the body; move the merged items
+	back to their pages. Stable, and a node without provenance keeps the page
+	of the node before it, so the untouched pages keep their reading order.
+	"""
+	keyed, page = [], 0
+	for i, ref in enumerate(doc.body.children):
+		first = _first_page(doc, ref.resolve(doc))
+		page = page if first is None else first
+		keyed.append((page, i, ref))
+	keyed.sort(key=lambda k: k[:2])
+	doc.body.children = [ref for _, _, ref in keyed]
+
+
+def _first_page(doc, node) -> Optional[int]:
+	for item, _ in doc.iterate_items(root=node, with_groups=True):
+		for prov in getattr(item, "prov", None) or []:
+			return prov.page_no
+	return None
+
+
+def _page_runs(pages: list[int]) -> list[tuple[int, int]]:
+	"""Sorted page numbers -> inclusive (start, end) runs of consecutive pages."""
+	runs = []
+	for p in pages:
+		if runs and p == runs[-1][1] + 1:
+			runs[-1] = (runs[-1][0], p)
+		else:
+			runs.append((p, p))
+	return runs
+
+
+def _print(msg: str) -> None:
+	try:
+		print(msg, flush=True)
+	except Exception:
+		pass
+
+
+def clear_converter_pool() -> None:
+	with _POOL_LOCK:
+		_POOL.clear()
+
+
+__all__ = ["DoclingConverter", "clear_converter_pool"]
@@ -1,18 +1,48 @@
 from transformers import AutoTokenizer, AutoModel
+from collections import OrderedDict
 from typing import Optional
+import logging
+import threading
+import time
 import torch
 from .settings import load_settings
 
+logger = logging.getLogger(__name__)
+
 class Embedder():
 	def __init__(self, model_id: Optional[str] = None):
+		cfg = load_settings()
 		if not model_id:
-			cfg = load_settings()
 			model_id = cfg.embeddings.model_id
+		self.model_id = model_id
 		self.tokenizer = AutoTokenizer.from_pretrained(model_id)
 		self.model = AutoModel.from_pretrained(model_id).eval()
 		self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 		self.model.to(self.device)
 
+		# query vectors: in-memory LRU in front of a persistent npy DiskCache
+		self.query_cache_size = max(0, int(cfg.embeddings.query_cache_size))
+		self._queries = OrderedDict()
+		self._lock = threading.Lock()
+		self._disk = None
+		if self.query_cache_size and cfg.embeddings.query_cache_disk:
+			try:
+				from .disk_cache import DiskCache
+				self._disk = DiskCache(type="npy")
+			except Exception as e:
+				logger.warning("Query embedding disk cache disabled: %s", e)
+		self._cache_stats = {"hits": 0, "disk_hits": 0, "misses": 0, "encode_s": 0.0, "disk_s": 0.0}
+
+		# chunk vectors by content (sha1(text) + model id), memory-mapped on disk
+		self.chunk_cache = None
+		if cfg.embeddings.chunk_cache:
+			try:
+				from .embedding_cache import EmbeddingCache
+				self.chunk_cache = EmbeddingCache(cfg.paths.cache_dir, model_id)
+			except Exception as e:
+				logger.warning("Chunk embedding cache disabled: %s", e)
+		self._doc_stats = {"encoded": 0, "encode_s": 0.0}
+
 	def embed(self, texts, batch_size: int = 32):
 		all_vecs = []
 		with torch.no_grad():
@@ -29,4 +59,108 @@ class Embedder():
 				all_vecs.extend(out.detach().cpu().numpy().tolist())
 		return all_vecs
 
+	def embed_documents(self, texts: list, batch_size: int = 32) -> list:
+		"""
+		embed(texts) for chunks being ingested: texts seen before (under any id,
+		path or metadata) come from the chunk cache; only the rest hit the encoder.
+		"""
+		texts = list(texts)
+		if self.chunk_cache is None:
+			return self.embed(texts, batch_size=batch_size)
+		vecs, missing = self.chunk_cache.get_many(texts)
+		if missing:
+			todo = [texts[i] for i in missing]
+			t0 = time.perf_counter()
+			fresh = self.embed(todo, batch_size=batch_size)
+			with self._lock:
+				self._doc_stats["encoded"] += len(todo)
+				self._doc_stats["encode_s"] += time.perf_counter() - t0
+			self.chunk_cache.put_many(todo, fresh)
+			for i, v in zip(missing, fresh):
+				vecs[i] = v
+		return vecs
+
+	def embed_query(self, text: str) -> list:
+		"""
+		embed([text])[0] through the query cache. Queries differing only in
+		whitespace (or case, for lowercasing tokenizers) share one entry.
+		"""
+		if not self.query_cache_size:
+			return self.embed([text])[0]
+		key = self._query_key(text)
+		with self._lock:
+			vec = self._queries.get(key)
+			if vec is not None:
+				self._queries.move_to_end(key)
+				self._cache_stats["hits"] += 1
+				return list(vec)
+
+		if self._disk is not None:
+			t0 = time.perf_counter()
+			try:
+				vec = self._disk.get(key)
+			except Exception as e:
+				logger.warning("Query embedding disk cache read failed: %s", e)
+				vec = None
+			with self._lock:
+				self._cache_stats["disk_s"] += time.perf_counter() - t0
+				if vec is not None:
+					self._cache_stats["disk_hits"] += 1
+			if vec is not None:
+				self._remember(key, vec)
+				return list(vec)
+
+		t0 = time.perf_counter()
+		vec = self.embed([text])[0]
+		with self._lock:
+			self._cache_stats["misses"] += 1
+			self._cache_stats["encode_s"] += time.perf_counter() - t0
+		self._remember(key, vec)
+		if self._disk is not None:
+			try:
+				self._disk.add(key, vec)
+			except Exception as e:
+				logger.warning("Query embedding disk cache write failed: %s", e)
+		return vec
+
+	def chunk_cache_stats(self) -> Optional[dict]:
+		if self.chunk_cache is None:
+			return None
+		out = self.chunk_cache.stats()
+		with self._lock:
+			d = dict(self._doc_stats)
+		per_encode = d["encode_s"] / d["encoded"] if d["encoded"] else 0.0
+		out["ms_per_encode"] = round(per_encode * 1000, 2)
+		out["est_saved_s"] = round(out["hits"] * per_encode, 3)
+		return out
+
+	def cache_stats(self) -> dict:
+		with self._lock:
+			s = dict(self._cache_stats)
+			size = len(self._queries)
+		lookups = s["hits"] + s["disk_hits"] + s["misses"]
+		per_encode = s["encode_s"] / s["misses"] if s["misses"] else 0.0
+		return {
+			"size": size,
+			"max_size": self.query_cache_size,
+			"hits": s["hits"],
+			"disk_hits": s["disk_hits"],
+			"misses": s["misses"],
+			"hit_rate": round((s["hits"] + s["disk_hits"]) / lookups, 3) if lookups else 0.0,
+			"ms_per_encode": round(per_encode * 1000, 2),
+			# cached lookups times the mean encoder call they replaced, minus disk reads
+			"est_saved_s": round(max(0.0, (s["hits"] + s["disk_hits"]) * per_encode - s["disk_s"]), 3),
+		}
+
+	def _query_key(self, text: str) -> str:
+		text = " ".join((text or "").split())
+		if getattr(self.tokenizer, "do_lower_case", False):
+			text = text.lower()
+		return f"{self.model_id}\n{text}"
 
+	def _remember(self, key: str, vec) -> None:
+		with self._lock:
+			self._queries[key] = tuple(vec)
+			self._queries.move_to_end(key)
+			while len(self._queries) > self.query_cache_size:
+				self._queries.popitem(last=False)
@@ -0,0 +1,126 @@
+# chat_app/embedding_cache.py
+import json, threading
+from hashlib import sha1
+from pathlib import Path
+
+import numpy as np
+
+
+class EmbeddingCache:
+	"""
+	Content-addressed chunk embeddings: sha1(text) -> float32 vector, one store per
+	embedding model (cache_dir/embeddings/<model hash>/).
+	- vectors.f32: rows of `dim` float32, append-only, read through np.memmap.
+	- keys.bin:    20-byte sha1 digest per row, in the same order.
+	- meta.json:   model id and dim.
+	Ids, paths and metadata play no part in the key, so moving or renaming a
+	document folder re-uses every vector. Rows are appended vectors-first, so a
+	torn write only loses the rows whose keys never made it to disk.
+	"""
+
+	def __init__(self, root: str, model_id: str):
+		self.model_id = model_id
+		self.dir = Path(root) / "embeddings" / sha1(model_id.encode("utf-8")).hexdigest()[:16]
+		self.dir.mkdir(parents=True, exist_ok=True)
+		self._vec_path = self.dir / "vectors.f32"
+		self._key_path = self.dir / "keys.bin"
+		self._meta_path = self.dir / "meta.json"
+		self._lock = threading.Lock()
+		self._rows = {}			# sha1 digest -> row
+		self._n = 0				# rows on disk
+		self._map = None		# np.memmap over the first _mapped rows
+		self._mapped = 0
+		self.dim = None
+		self.counters = {"hits": 0, "misses": 0}
+		self._load()
+
+	def __len__(self) -> int:
+		return len(self._rows)
+
+	def get_many(self, texts: list[str]) -> tuple[list, list[int]]:
+		"""(vector or None per text, indexes of the texts that missed)."""
+		keys = [_key(t) for t in texts]
+		with self._lock:
+			rows = [self._rows.get(k) for k in keys]
+			found = [r for r in rows if r is not None]
+			if found and max(found) >= self._mapped:
+				self._remap()
+			out = [self._map[r].tolist() if r is not None else None for r in rows]
+			missing = [i for i, r in enumerate(rows) if r is None]
+			self.counters["hits"] += len(texts) - len(missing)
+			self.counters["misses"] += len(missing)
+		return out, missing
+
+	def put_many(self, texts: list[str], vectors) -> None:
+		if not len(texts):
+			return
+		arr = np.asarray(vectors, dtype=np.float32)
+		if arr.ndim != 2 or arr.shape[0] != len(texts):
+			raise ValueError(f"expected {len(texts)} vectors, got shape {arr.shape}")
+		with self._lock:
+			if self.dim is None:
+				self.dim = int(arr.shape[1])
+				self._meta_path.write_text(json.dumps({"model_id": self.model_id, "dim": self.dim}), encoding="utf-8")
+			elif arr.shape[1] != self.dim:
+				raise ValueError(f"vector dim {arr.shape[1]} != cached dim {self.dim} for {self.model_id}")
+			new, keys, seen = [], [], set()
+			for i, t in enumerate(texts):
+				k = _key(t)
+				if k not in self._rows and k not in seen:
+					seen.add(k)
+					new.append(i)
+					keys.append(k)
+			if not new:
+				return
+			with self._vec_path.open("ab") as f:
+				f.write(arr[new].tobytes())
+			with self._key_path.open("ab") as f:
+				f.write(b"".join(keys))
+			for j, k in enumerate(keys):
+				self._rows[k] = self._n + j
+			self._n += len(keys)
+
+	def stats(self) -> dict:
+		with self._lock:
+			lookups = self.counters["hits"] + self.counters["misses"]
+			return dict(
+				self.counters,
+				vectors=len(self._rows),
+				dim=self.dim,
+				hit_rate=round(self.counters["hits"] / lookups, 3) if lookups else 0.0,
+			)
+
+	# ---------- helpers ----------
+
+	def _load(self) -> None:
+		if not self._meta_path.exists():
+			return
+		self.dim = int(json.loads(self._meta_path.read_text(encoding="utf-8"))["dim"])
+		keys = self._key_path.read_bytes() if self._key_path.exists() else b""
+		vec_rows = self._vec_path.stat().st_size // (4 * self.dim) if self._vec_path.exists() else 0
+		n = min(len(keys) // 20, vec_rows)
+		for r in range(n):
+			self._rows.setdefault(keys[r * 20:(r + 1) * 20], r)
+		self._n = n
+		if n * 20 != len(keys) or n != vec_rows:
+			self._truncate(n)
+		self._remap()
+
+	def _truncate(self, rows: int) -> None:
+		"""Drop a torn tail so keys and vectors line up again."""
+		with self._key_path.open("ab") as f:
+			f.truncate(rows * 20)
+		with self._vec_path.open("ab") as f:
+			f.truncate(rows * 4 * self.dim)
+
+	def _remap(self) -> None:
+		rows = self._n
+		self._map = np.memmap(self._vec_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+		self._mapped = rows
+
+
+def _key(text: str) -> bytes:
+	return sha1((text or "").encode("utf-8")).digest()
+
+
+__all__ = ["EmbeddingCache"]
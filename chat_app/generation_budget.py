@@ -0,0 +1,190 @@
+# chat_app/generation_budget.py
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+_HIST_BUCKETS = (32, 64, 128, 256, 512)
+
+
+@dataclass
+class GenerationPlan:
+	route: str = "chat"
+	max_new_tokens: int = 500
+	stop_strings: list = field(default_factory=list)
+
+
+class GenerationBudget:
+	"""
+	Per-route decode budgets.
+	- /chat gets a fixed `max_new_tokens`.
+	- /rag answers are asked to be concise, so their budget is predicted from
+	  the question and context size (linear in both), clamped to
+	  [rag_min_new_tokens, rag_max_new_tokens].
+	- Each route has stop strings that end generation early.
+	"""
+
+	def __init__(self, cfg, count_tokens: Callable[[str], int]):
+		self.cfg = cfg
+		self.count_tokens = count_tokens
+
+	def plan(self, route: str, messages: Optional[list[dict]] = None) -> GenerationPlan:
+		cap = max(1, int(self.cfg.max_new_tokens))
+		if route != "rag":
+			return GenerationPlan(route, cap, list(self.cfg.chat_stop_strings))
+		return GenerationPlan(route, min(cap, self.predict(messages or [])), list(self.cfg.rag_stop_strings))
+
+	def predict(self, messages: list[dict]) -> int:
+		hi = max(1, int(self.cfg.rag_max_new_tokens))
+		if not self.cfg.adaptive_budget:
+			return hi
+		lo = min(hi, max(1, int(self.cfg.rag_min_new_tokens)))
+		question, context = _split_rag_prompt(_last_user(messages))
+		est = (
+			self.cfg.budget_base_tokens
+			+ self.cfg.budget_per_question_token * self._count(question)
+			+ self.cfg.budget_per_context_token * self._count(context)
+		)
+		return int(min(hi, max(lo, est)))
+
+	def _count(self, text: str) -> int:
+		if not text:
+			return 0
+		try:
+			return int(self.count_tokens(text))
+		except Exception:
+			return len(text.split()) * 2
+
+
+class LengthStats:
+	"""
+	Distribution of generated lengths per route over the last `window` replies,
+	with why each one stopped (eos / stop_string / budget) and decode speed.
+	`max_saved_tokens` is an upper bound on decode steps avoided versus always
+	allowing `legacy_cap` tokens: replies cut by a stop string or a smaller budget
+	could at most have run to that cap.
+	"""
+
+	def __init__(self, window: int = 2048, legacy_cap: int = 500):
+		self.window = max(1, int(window))
+		self.legacy_cap = int(legacy_cap)
+		self._routes: dict[str, dict] = {}
+		self._lock = threading.Lock()
+
+	def record(self, route: str, new_tokens: int, budget: int, reason: str, decode_s: float) -> None:
+		saved = 0
+		if reason in ("stop_string", "budget"):
+			saved = max(0, self.legacy_cap - new_tokens)
+		with self._lock:
+			r = self._routes.get(route)
+			if r is None:
+				r = self._routes[route] = {
+					"lengths": deque(maxlen=self.window),
+					"requests": 0,
+					"tokens": 0,
+					"budget_sum": 0,
+					"decode_s": 0.0,
+					"max_saved_tokens": 0,
+					"stops": {"eos": 0, "stop_string": 0, "budget": 0},
+				}
+			r["lengths"].append(int(new_tokens))
+			r["requests"] += 1
+			r["tokens"] += int(new_tokens)
+			r["budget_sum"] += int(budget)
+			r["decode_s"] += float(decode_s)
+			r["max_saved_tokens"] += saved
+			r["stops"][reason] = r["stops"].get(reason, 0) + 1
+
+	def stats(self) -> dict:
+		out = {}
+		with self._lock:
+			for route, r in self._routes.items():
+				xs = sorted(r["lengths"])
+				hist = {f"<={b}": 0 for b in _HIST_BUCKETS}
+				hist[f">{_HIST_BUCKETS[-1]}"] = 0
+				for n in xs:
+					b = next((b for b in _HIST_BUCKETS if n <= b), None)
+					hist[f"<={b}" if b is not None else f">{_HIST_BUCKETS[-1]}"] += 1
+				s_per_token = r["decode_s"] / r["tokens"] if r["tokens"] else 0.0
+				out[route] = {
+					"requests": r["requests"],
+					"mean": round(sum(xs) / len(xs), 1) if xs else 0.0,
+					"p50": _percentile(xs, 50),
+					"p90": _percentile(xs, 90),
+					"p99": _percentile(xs, 99),
+					"max": xs[-1] if xs else 0,
+					"histogram": hist,
+					"mean_budget": round(r["budget_sum"] / r["requests"], 1) if r["requests"] else 0.0,
+					"stops": dict(r["stops"]),
+					"ms_per_token": round(s_per_token * 1000, 2),
+					"max_saved_tokens": r["max_saved_tokens"],
+					"est_max_decode_s_saved": round(r["max_saved_tokens"] * s_per_token, 2),
+				}
+		return out
+
+
+class StopTrimmer:
+	"""
+	Cuts streamed text at the first stop string. Holds back just enough
+	characters that a stop string split across pieces is never emitted.
+	"""
+
+	def __init__(self, stop_strings: list[str]):
+		self.stop_strings = [s for s in (stop_strings or []) if s]
+		self._hold = max((len(s) for s in self.stop_strings), default=1) - 1
+		self._buf = ""
+		self.stopped = False
+
+	def feed(self, piece: str) -> str:
+		if self.stopped:
+			return ""
+		self._buf += piece
+		cut = _find_stop(self._buf, self.stop_strings)
+		if cut is not None:
+			self.stopped = True
+			out, self._buf = self._buf[:cut], ""
+			return out
+		if len(self._buf) <= self._hold:
+			return ""
+		split = len(self._buf) - self._hold
+		out, self._buf = self._buf[:split], self._buf[split:]
+		return out
+
+	def flush(self) -> str:
+		out, self._buf = self._buf, ""
+		return "" if self.stopped else out
+
+
+def trim_at_stop(text: str, stop_strings: list[str]) -> str:
+	cut = _find_stop(text, stop_strings or [])
+	return text if cut is None else text[:cut]
+
+
+def _find_stop(text: str, stop_strings: list[str]) -> Optional[int]:
+	hits = [i for i in (text.find(s) for s in stop_strings if s) if i != -1]
+	return min(hits) if hits else None
+
+
+def _last_user(messages: list[dict]) -> str:
+	for m in reversed(messages):
+		if m.get("role") == "user":
+			return m.get("content") or ""
+	return ""
+
+
+def _split_rag_prompt(text: str) -> tuple[str, str]:
+	"""(question, context) of a prompt built by build_messages_hybrid; no <context> = all question."""
+	start = text.find("<context>")
+	if start == -1:
+		return text, ""
+	end = text.find("</context>", start)
+	end = len(text) if end == -1 else end
+	question = text[:start].replace("Question:", "", 1).strip()
+	return question, text[start + len("<context>"):end]
+
+
+def _percentile(xs: list, p: float) -> int:
+	return xs[min(len(xs) - 1, int(round(p / 100.0 * (len(xs) - 1))))] if xs else 0
+
+
+__all__ = ["GenerationBudget", "GenerationPlan", "LengthStats", "StopTrimmer", "trim_at_stop"]
@@ -1,7 +1,7 @@
 # chat_app/guardrails.py
 from typing import List, Dict, Tuple, Optional
 import math, os, re
-from .settings import load_settings
+from .settings import get_settings
 
 SUSPICIOUS_PATTERNS = (
     "ignore previous instructions",
@@ -25,7 +25,7 @@ _TECH_SCI_KEYWORDS = (
 	"embeddings","vector","cosine","semantic","retrieval","index","chroma","docling","ocr","tesseract","space"
 )
 
-cfg = load_settings
+cfg = get_settings
 
 _SECRET_REGEXES = (
 	re.compile(r"\b[A-Za-z0-9_]{16,}\.[A-Za-z0-9_\-]{20,}\.[A-Za-z0-9_\-]{20,}"),	# jwt-ish
@@ -0,0 +1,135 @@
+# chat_app/ingest_manifest.py
+import json
+import os
+import tempfile
+import threading
+from dataclasses import asdict, dataclass, field
+from hashlib import sha1
+from typing import Iterable, Optional
+
+
+@dataclass
+class ManifestEntry:
+	size: int
+	mtime_ns: int
+	sha1: str
+	pipeline: str
+	chunk_ids: list[str] = field(default_factory=list)
+
+
+@dataclass
+class IngestPlan:
+	new: list[str] = field(default_factory=list)
+	changed: list[str] = field(default_factory=list)		# content differs: ingest, then drop stale chunks
+	rebuild: list[str] = field(default_factory=list)		# pipeline version differs: drop chunks, then ingest
+	unchanged: list[str] = field(default_factory=list)
+	deleted: list[str] = field(default_factory=list)		# in the manifest, gone from disk
+	fingerprints: dict = field(default_factory=dict)		# path -> (size, mtime_ns, sha1) for the ones to ingest
+
+
+class IngestManifest:
+	"""
+	What was ingested from each file: path -> size, mtime, content sha1, the
+	pipeline version that produced its chunks, and their ids.
+	- plan() sorts scanned paths without running Docling: size + mtime equal
+	  means unchanged; otherwise the content hash decides (a touched file is
+	  still unchanged).
+	- Stored as one JSON file, rewritten atomically by save().
+	"""
+
+	def __init__(self, path: str, pipeline_version: str):
+		self.path = path
+		self.pipeline_version = pipeline_version
+		self._lock = threading.Lock()
+		self._entries: dict[str, ManifestEntry] = {}
+		self.load()
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def __contains__(self, path: str) -> bool:
+		return path in self._entries
+
+	def get(self, path: str) -> Optional[ManifestEntry]:
+		return self._entries.get(path)
+
+	def load(self) -> None:
+		if not os.path.exists(self.path):
+			return
+		try:
+			with open(self.path, "r", encoding="utf-8") as f:
+				blob = json.load(f)
+			self._entries = {p: ManifestEntry(**e) for p, e in (blob.get("files") or {}).items()}
+		except Exception:
+			self._entries = {}		# unreadable manifest: everything is re-checked against Chroma
+
+	def save(self) -> None:
+		with self._lock:
+			blob = {"version": 1, "files": {p: asdict(e) for p, e in self._entries.items()}}
+		os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+		fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+		with os.fdopen(fd, "w", encoding="utf-8") as f:
+			json.dump(blob, f, ensure_ascii=False)
+		os.replace(tmp, self.path)
+
+	def plan(self, abs_paths: Iterable[str]) -> IngestPlan:
+		plan = IngestPlan()
+		seen = set()
+		for path in abs_paths:
+			if path in seen:
+				continue
+			seen.add(path)
+			st = os.stat(path)
+			entry = self._entries.get(path)
+			current = entry is not None and entry.pipeline == self.pipeline_version
+			if current and (entry.size, entry.mtime_ns) == (st.st_size, st.st_mtime_ns):
+				plan.unchanged.append(path)
+				continue
+			digest = file_sha1(path)
+			if entry is None:
+				plan.new.append(path)
+			elif not current:
+				plan.rebuild.append(path)
+			elif entry.sha1 == digest:
+				with self._lock:
+					entry.size, entry.mtime_ns = st.st_size, st.st_mtime_ns
+				plan.unchanged.append(path)
+				continue
+			else:
+				plan.changed.append(path)
+			plan.fingerprints[path] = (st.st_size, st.st_mtime_ns, digest)
+		plan.deleted = [p for p in self._entries if p not in seen and not os.path.exists(p)]
+		return plan
+
+	def record(self, path: str, fingerprint: tuple, chunk_ids: list[str]) -> None:
+		size, mtime_ns, digest = fingerprint
+		with self._lock:
+			self._entries[path] = ManifestEntry(size, mtime_ns, digest, self.pipeline_version, list(chunk_ids))
+
+	def forget(self, path: str) -> Optional[ManifestEntry]:
+		with self._lock:
+			return self._entries.pop(path, None)
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {
+				"files": len(self._entries),
+				"chunks": sum(len(e.chunk_ids) for e in self._entries.values()),
+				"pipeline": self.pipeline_version,
+			}
+
+
+def file_sha1(path: str, block: int = 1 << 20) -> str:
+	h = sha1()
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(block), b""):
+			h.update(chunk)
+	return h.hexdigest()
+
+
+def fingerprint(path: str) -> tuple:
+	st = os.stat(path)
+	return st.st_size, st.st_mtime_ns, file_sha1(path)
+
+
+__all__ = ["IngestManifest", "IngestPlan", "ManifestEntry", "file_sha1", "fingerprint"]
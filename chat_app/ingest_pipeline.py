@@ -0,0 +1,271 @@
+# chat_app/ingest_pipeline.py
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from types import SimpleNamespace
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+_worker = None		# (DoclingConverter, HybridChunker) in each convert process
+
+
+def _init_worker(tesseract_cmd, tessdata_dir) -> None:
+	global _worker
+	from docling.chunking import HybridChunker
+	from .doc_converter import DoclingConverter
+	_worker = (DoclingConverter(tesseract_cmd, tessdata_dir), HybridChunker())
+
+
+def convert_and_chunk(abs_path: str):
+	"""
+	Convert stage, run in a worker process: Docling conversion + HybridChunker.
+	Returns (chunk records, timings); records are plain namespaces with
+	text/page/type, so they pickle back without Docling objects. timings splits
+	model load (first file per pooled converter), conversion and chunking.
+	"""
+	converter, chunker = _worker
+	before = dict(converter.timings)
+	doc = converter.convert_auto_ocr(abs_path).document
+	t1 = time.perf_counter()
+	records = []
+	for ch in chunker.chunk(dl_doc=doc):
+		page = getattr(ch, "page", None)
+		kind = getattr(ch, "type", None)
+		records.append(SimpleNamespace(
+			text=getattr(ch, "text", ""),
+			page=int(page) if page is not None else None,
+			type=str(kind) if kind is not None else None,
+		))
+	timings = {
+		"load_s": converter.timings["load_s"] - before["load_s"],
+		"convert_s": converter.timings["convert_s"] - before["convert_s"],
+		"chunk_s": time.perf_counter() - t1,
+	}
+	return records, timings
+
+
+class IngestPipeline:
+	"""
+	Staged ingest of document files for a RAGStore:
+	  convert -> (queue) -> embed -> (queue) -> write
+	- convert: a process pool (`workers`) runs Docling + HybridChunker per file.
+	- embed:   one thread builds chunk ids, drops those already in Chroma and
+	           batches chunks across files into Embedder.embed_documents.
+	- write:   the calling thread is the only one adding to Chroma / BM25 /
+	           ChunkStore, so those stay single-writer.
+	Both queues hold at most `queue_size` items, so a slow embedder or writer
+	stalls the converters instead of piling converted documents up in memory.
+	The pool is spawned on first use and reused across runs; close() stops it.
+	"""
+
+	def __init__(self, store, workers: int = 2, embed_batch: int = 64, queue_size: int = 8):
+		self.store = store
+		self.workers = max(1, int(workers))
+		self.embed_batch = max(1, int(embed_batch))
+		self.queue_size = max(1, int(queue_size))
+		self._pool = None
+		self.last_stats = None
+		self.last_failed: list[str] = []
+		self.last_source_ids: dict[str, list[str]] = {}
+
+	def run(self, abs_paths: list[str]) -> list[str]:
+		"""Ingest validated absolute paths; returns the chunk ids added."""
+		self.last_failed = []
+		self.last_source_ids = {}
+		converted = queue.Queue(maxsize=self.queue_size)
+		embedded = queue.Queue(maxsize=self.queue_size)
+		stats = {
+			"files": len(abs_paths),
+			"convert": {"files": 0, "failed": 0, "busy_s": 0.0, "load_s": 0.0, "chunk_s": 0.0},
+			"embed": {"chunks": 0, "batches": 0, "failed": 0, "busy_s": 0.0},
+			"write": {"chunks": 0, "batches": 0, "busy_s": 0.0},
+		}
+		t0 = time.perf_counter()
+		stages = [
+			threading.Thread(target=self._convert_stage, args=(abs_paths, converted, stats),
+							 name="ingest-convert", daemon=True),
+			threading.Thread(target=self._embed_stage, args=(converted, embedded, stats),
+							 name="ingest-embed", daemon=True),
+		]
+		for t in stages:
+			t.start()
+		added = self._write_stage(embedded, stats)
+		for t in stages:
+			t.join()
+
+		stats["wall_s"] = time.perf_counter() - t0
+		self.last_stats = self._summarize(stats)
+		self.store._debug(
+			f"[INGEST] {stats['files']} files ({self.last_stats['failed']} failed), {len(added)} chunks in "
+			f"{stats['wall_s']:.1f}s = {self.last_stats['files_per_min']:.1f} files/min | "
+			+ " | ".join(f"{k} {v['per_s']:.2f}/s" for k, v in self.last_stats["stages"].items())
+			+ f" | model load {self.last_stats['stages']['convert']['load_s']:.1f}s"
+		)
+		return added
+
+	def close(self) -> None:
+		if self._pool is not None:
+			self._pool.shutdown(wait=True, cancel_futures=True)
+			self._pool = None
+
+	# ---------- stages ----------
+
+	def _convert_stage(self, abs_paths, out_q, stats) -> None:
+		pending = {}
+		todo = deque(abs_paths)
+		try:
+			pool = self._get_pool()
+			window = self.workers + self.queue_size		# files in flight
+			while True:
+				while todo and len(pending) < window:
+					pending[pool.submit(convert_and_chunk, todo[0])] = todo[0]
+					todo.popleft()		# only once submitted: a failed submit leaves it in todo
+				if not pending:
+					break
+				done, _ = wait(pending, return_when=FIRST_COMPLETED)
+				for fut in done:
+					path = pending.pop(fut)
+					try:
+						records, timings = fut.result()
+					except Exception as e:
+						self.store._debug(f"[ERROR] Failed to ingest {path}: {e}")
+						stats["convert"]["failed"] += 1
+						self.last_failed.append(path)
+						continue
+					stats["convert"]["files"] += 1
+					# busy_s is conversion + chunking; model loads are reported apart
+					stats["convert"]["busy_s"] += timings["convert_s"] + timings["chunk_s"]
+					stats["convert"]["load_s"] += timings["load_s"]
+					stats["convert"]["chunk_s"] += timings["chunk_s"]
+					out_q.put((path, records))		# blocks while embed is behind
+		except Exception as e:
+			# e.g. BrokenProcessPool: nothing in flight or queued will be converted
+			logger.exception("Ingest convert stage failed: %s", e)
+			self._fail([*pending.values(), *todo], stats["convert"])
+			self._reset_pool()
+		finally:
+			out_q.put(_DONE)
+
+	def _embed_stage(self, in_q, out_q, stats) -> None:
+		store = self.store
+		ids, texts, metas, sources = [], [], [], []
+
+		def flush():
+			started = time.perf_counter()
+			vecs = store.embedder.embed_documents(texts)
+			stats["embed"]["busy_s"] += time.perf_counter() - started
+			stats["embed"]["chunks"] += len(texts)
+			stats["embed"]["batches"] += 1
+			out_q.put((list(ids), list(texts), list(metas), list(sources), vecs))
+			for buf in (ids, texts, metas, sources):
+				buf.clear()
+
+		done = False
+		try:
+			while True:
+				item = in_q.get()
+				if item is _DONE:
+					done = True
+					break
+				path, records = item
+				try:
+					built = store._build_text_chunks(path, records)
+					new = store._new_chunks(*built)
+				except Exception as e:
+					store._debug(f"[ERROR] Failed to ingest {path}: {e}")
+					stats["embed"]["failed"] += 1
+					self.last_failed.append(path)
+					continue
+				self.last_source_ids[path] = list(built[0])
+				ids.extend(new[0])
+				texts.extend(new[1])
+				metas.extend(new[2])
+				sources.extend([path] * len(new[0]))
+				if len(texts) >= self.embed_batch:
+					flush()
+			if texts:
+				flush()
+		except Exception as e:
+			logger.exception("Ingest embed stage failed: %s", e)
+			lost = list(dict.fromkeys(sources))		# buffered, maybe partly flushed already
+			while not done:							# unblock the converters
+				item = in_q.get()
+				if item is _DONE:
+					break
+				lost.append(item[0])
+			self._fail(lost, stats["embed"])
+		finally:
+			out_q.put(_DONE)
+
+	def _write_stage(self, in_q, stats) -> list[str]:
+		added = []
+		while True:
+			item = in_q.get()
+			if item is _DONE:
+				return added
+			ids, texts, metas, sources, vecs = item
+			started = time.perf_counter()
+			try:
+				self.store._write_chunks(ids, texts, metas, sources, vecs)
+			except Exception as e:
+				self.store._debug(f"[ERROR] Failed to write {len(ids)} chunks: {e}")
+				self.last_failed.extend(p for p in dict.fromkeys(sources) if p not in self.last_failed)
+				continue
+			finally:
+				stats["write"]["busy_s"] += time.perf_counter() - started
+			stats["write"]["chunks"] += len(ids)
+			stats["write"]["batches"] += 1
+			added.extend(ids)
+
+	# ---------- helpers ----------
+
+	def _fail(self, paths, stage_stats) -> None:
+		for path in paths:
+			if path not in self.last_failed:
+				self.last_failed.append(path)
+				stage_stats["failed"] += 1
+
+	def _reset_pool(self) -> None:
+		"""Drop a pool that failed, so the next run spawns a fresh one."""
+		pool, self._pool = self._pool, None
+		if pool is not None:
+			pool.shutdown(wait=False, cancel_futures=True)
+
+	def _get_pool(self) -> ProcessPoolExecutor:
+		if self._pool is None:
+			# spawn: the parent may hold CUDA / torch state that must not be forked
+			self._pool = ProcessPoolExecutor(
+				max_workers=self.workers,
+				mp_context=multiprocessing.get_context("spawn"),
+				initializer=_init_worker,
+				initargs=(self.store.tesseract_cmd, str(self.store.tessdata_dir) if self.store.tessdata_dir else None),
+			)
+		return self._pool
+
+	def _summarize(self, stats) -> dict:
+		wall = stats["wall_s"]
+		items = {"convert": stats["convert"]["files"], "embed": stats["embed"]["chunks"],
+				 "write": stats["write"]["chunks"]}
+		stages = {}
+		for name, n in items.items():
+			busy = stats[name]["busy_s"]
+			stages[name] = dict(stats[name], busy_s=round(busy, 3), per_s=n / busy if busy else 0.0)
+		stages["convert"]["chunk_s"] = round(stages["convert"]["chunk_s"], 3)
+		stages["convert"]["load_s"] = round(stages["convert"]["load_s"], 3)
+		stages["convert"]["workers"] = self.workers
+		return {
+			"files": stats["files"],
+			"failed": stats["convert"]["failed"] + stats["embed"]["failed"],
+			"chunks": stats["write"]["chunks"],
+			"wall_s": round(wall, 3),
+			"files_per_min": stats["convert"]["files"] * 60.0 / wall if wall else 0.0,
+			"stages": stages,
+		}
+
+
+__all__ = ["IngestPipeline", "convert_and_chunk"]
@@ -0,0 +1,248 @@
+# chat_app/kv_cache.py
+import copy
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+
+import torch
+
+try:
+	from transformers import DynamicCache
+except Exception:
+	DynamicCache = None
+
+
+@dataclass
+class _PrefixEntry:
+	ids: torch.Tensor				# 1-D prefix token ids
+	past: object = None				# past_key_values covering `ids`, built on first use
+
+
+class PrefixCache:
+	"""
+	Keeps past key/values for shared prompt prefixes (system messages).
+	- register() tokenizes a prefix once; its KV is prefilled the first time
+	  a prompt starting with it is generated, then reused by copying.
+	- lookup() returns a private copy of the cache for the longest registered
+	  prefix of `input_ids`, so generate() only prefills the suffix.
+	"""
+
+	def __init__(self, max_entries: int = 8):
+		self.max_entries = max(1, int(max_entries))
+		self._entries: "OrderedDict[str, _PrefixEntry]" = OrderedDict()
+		self._lock = threading.Lock()
+		self.lookups = 0
+		self.hits = 0
+		self.misses = 0
+		self.saved_prefill_tokens = 0
+		self.prompt_tokens = 0
+
+	def register(self, key: str, ids: torch.Tensor) -> None:
+		with self._lock:
+			if key in self._entries:
+				self._entries.move_to_end(key)
+				return
+			self._entries[key] = _PrefixEntry(ids=ids.reshape(-1))
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+
+	def known(self, key: str) -> bool:
+		return key in self._entries
+
+	def lookup(self, input_ids: torch.Tensor, prefill: Callable[[torch.Tensor], object]):
+		"""
+		Returns a fresh past_key_values for the longest registered prefix of
+		`input_ids` (shape [1, T]), or None. `prefill(ids)` builds the KV on a miss.
+		"""
+		ids = input_ids.reshape(-1)
+		with self._lock:
+			self.lookups += 1
+			self.prompt_tokens += int(ids.numel())
+			best_key, best = None, None
+			for key, entry in self._entries.items():
+				n = int(entry.ids.numel())
+				# keep at least one token for generate() to process
+				if n >= ids.numel() or (best is not None and n <= best.ids.numel()):
+					continue
+				if torch.equal(ids[:n], entry.ids.to(ids.device)):
+					best_key, best = key, entry
+			if best is None:
+				return None
+			self._entries.move_to_end(best_key)
+			past = best.past
+
+		if past is None:
+			past = prefill(best.ids.to(ids.device).unsqueeze(0))
+			with self._lock:
+				best.past = past
+				self.misses += 1
+		else:
+			with self._lock:
+				self.hits += 1
+				self.saved_prefill_tokens += int(best.ids.numel())
+		return copy.deepcopy(past)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._entries.clear()
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {
+				"entries": len(self._entries),
+				"lookups": self.lookups,
+				"hits": self.hits,
+				"misses": self.misses,
+				"hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+				"saved_prefill_tokens": self.saved_prefill_tokens,
+				"prompt_tokens": self.prompt_tokens,
+			}
+
+
+@dataclass
+class _SessionEntry:
+	ids: torch.Tensor		# 1-D token ids covered by `past`
+	past: object
+	nbytes: int
+
+
+class SessionKVCache:
+	"""
+	Past key/values of each /chat session, kept between turns.
+	- take() hands the session's cache to the next turn, cropped to the longest
+	  common prefix with the new prompt, so only the new tokens are prefilled.
+	- put() stores the cache after generation (prompt + reply tokens).
+	- Total size is bounded by `max_bytes`; the least recently used sessions go first.
+	"""
+
+	def __init__(self, max_bytes: int = 1024**3):
+		self.max_bytes = int(max_bytes)
+		self._entries: "OrderedDict[str, _SessionEntry]" = OrderedDict()
+		self._lock = threading.Lock()
+		self.total_bytes = 0
+		self.lookups = 0
+		self.hits = 0
+		self.reused_tokens = 0
+		self.prompt_tokens = 0
+		self.evictions = 0
+
+	def take(self, session_id: str, input_ids: torch.Tensor):
+		ids = input_ids.reshape(-1)
+		with self._lock:
+			self.lookups += 1
+			self.prompt_tokens += int(ids.numel())
+			entry = self._entries.pop(session_id, None)
+			if entry is not None:
+				self.total_bytes -= entry.nbytes
+		if entry is None:
+			return None
+
+		# keep at least one token for generate() to process
+		n = min(_common_prefix_len(entry.ids.to(ids.device), ids), int(ids.numel()) - 1)
+		if n <= 0:
+			return None
+		past = _crop(entry.past, n)
+		with self._lock:
+			self.hits += 1
+			self.reused_tokens += n
+		return past
+
+	def put(self, session_id: str, past, ids: torch.Tensor) -> None:
+		if past is None:
+			return
+		covered = _seq_length(past)
+		nbytes = _cache_nbytes(past)
+		if covered <= 0 or nbytes > self.max_bytes:
+			return
+		entry = _SessionEntry(ids=ids.reshape(-1)[:covered].detach(), past=past, nbytes=nbytes)
+		with self._lock:
+			old = self._entries.pop(session_id, None)
+			if old is not None:
+				self.total_bytes -= old.nbytes
+			self._entries[session_id] = entry
+			self.total_bytes += nbytes
+			while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+				_, evicted = self._entries.popitem(last=False)
+				self.total_bytes -= evicted.nbytes
+				self.evictions += 1
+
+	def drop(self, session_id: str) -> None:
+		with self._lock:
+			entry = self._entries.pop(session_id, None)
+			if entry is not None:
+				self.total_bytes -= entry.nbytes
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {
+				"sessions": len(self._entries),
+				"bytes": self.total_bytes,
+				"max_bytes": self.max_bytes,
+				"lookups": self.lookups,
+				"hits": self.hits,
+				"hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+				"reused_tokens": self.reused_tokens,
+				"prompt_tokens": self.prompt_tokens,
+				"evictions": self.evictions,
+			}
+
+
+def _common_prefix_len(a: torch.Tensor, b: torch.Tensor) -> int:
+	m = min(int(a.numel()), int(b.numel()))
+	if m == 0:
+		return 0
+	diff = (a[:m] != b[:m]).nonzero()
+	return int(diff[0].item()) if diff.numel() else m
+
+
+def _layers(past) -> tuple:
+	"""Per-layer (keys, values) of a cache object or of legacy tuples."""
+	if hasattr(past, "layers"):				# transformers >= 4.56 (Cache layer API)
+		return tuple((layer.keys, layer.values) for layer in past.layers)
+	if hasattr(past, "key_cache"):			# older DynamicCache
+		return tuple(zip(past.key_cache, past.value_cache))
+	return tuple((k, v) for k, v in past)
+
+
+def _from_layers(layers):
+	"""Cache object holding these per-layer (keys, values), for model(..., past_key_values=...)."""
+	if DynamicCache is None:
+		return tuple(layers)
+	cache = DynamicCache()
+	for i, (k, v) in enumerate(layers):
+		cache.update(k, v, i)
+	return cache
+
+
+def _seq_length(past) -> int:
+	if hasattr(past, "get_seq_length"):
+		return int(past.get_seq_length())
+	layers = _layers(past)
+	return int(layers[0][0].shape[-2]) if layers else 0
+
+
+def _crop(past, n: int):
+	if _seq_length(past) <= n:
+		return past
+	if hasattr(past, "crop"):
+		past.crop(n)
+		return past
+	return _from_layers((k[:, :, :n], v[:, :, :n]) for k, v in _layers(past))
+
+
+def _cache_nbytes(past) -> int:
+	return sum(
+		t.numel() * t.element_size()
+		for layer in _layers(past)
+		for t in layer
+		if t is not None
+	)
+
+
+def new_cache():
+	"""Empty cache object for model(..., past_key_values=...)."""
+	return DynamicCache() if DynamicCache is not None else None
+
+
+__all__ = ["PrefixCache", "SessionKVCache", "new_cache"]
@@ -1,21 +1,41 @@
 # llm_handler.py
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
+from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, TextIteratorStreamer
+from transformers import StoppingCriteria, StoppingCriteriaList
 from datetime import datetime
-import os, torch, json
+from threading import Event, Thread, Lock, local
+from typing import Optional
+import logging, os, time, torch, json
+from .batch_scheduler import BatchScheduler
+from .session_store import SessionStore
+from .kv_cache import PrefixCache, SessionKVCache, new_cache
+from .speculative import SpeculativeDecoder
+from .generation_budget import GenerationBudget, GenerationPlan, LengthStats, StopTrimmer, trim_at_stop
+from .settings import load_settings
 
-class LLMHandler():
-	def __init__(self, model_id="NousResearch/Hermes-3-Llama-3.1-8B"):
-		self.model_id = model_id
-		self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("auto", "cuda_bnb4", "cpu_fp32", "cpu_int8", "cpu_bf16")
+
+def load_model(model_id: str, backend: str = "auto"):
+	"""
+	Load the causal LM for one of BACKENDS:
+	- cuda_bnb4: 4-bit NF4 weights (bitsandbytes) on GPU 0
+	- cpu_fp32 / cpu_bf16: plain weights on CPU
+	- cpu_int8: fp32 weights with every nn.Linear dynamically quantized to int8
+	- auto: cuda_bnb4 when CUDA is available, otherwise cpu_fp32
+	"""
+	backend = (backend or "auto").lower()
+	if backend == "auto":
+		backend = "cuda_bnb4" if torch.cuda.is_available() else "cpu_fp32"
 
+	if backend == "cuda_bnb4":
 		bnb_cfg = BitsAndBytesConfig(
 			load_in_4bit=True,
 			bnb_4bit_use_double_quant=True,
 			bnb_4bit_quant_type="nf4",
 			bnb_4bit_compute_dtype=torch.bfloat16
 		)
-
-		self.model = AutoModelForCausalLM.from_pretrained(
+		return AutoModelForCausalLM.from_pretrained(
 			model_id,
 			device_map={"": 0},
 			torch_dtype=torch.float16,
@@ -24,17 +44,111 @@ class LLMHandler():
 			quantization_config=bnb_cfg,
 		).eval()
 
+	if backend in ("cpu_fp32", "cpu_int8", "cpu_bf16"):
+		model = AutoModelForCausalLM.from_pretrained(
+			model_id,
+			torch_dtype=torch.bfloat16 if backend == "cpu_bf16" else torch.float32,
+			low_cpu_mem_usage=True,
+			attn_implementation="sdpa",
+		).eval()
+		if backend == "cpu_int8":
+			model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+		return model
+
+	raise ValueError(f"Unknown LLM backend: {backend}. Try: {', '.join(BACKENDS)}")
+
+class _Cancelled(StoppingCriteria):
+	"""Stops generate() once `event` is set."""
+
+	def __init__(self, event: Event):
+		self.event = event
+
+	def __call__(self, input_ids, scores, **kwargs):
+		return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+def _cancelled(cancel: Optional[Event]) -> bool:
+	return cancel is not None and cancel.is_set()
+
+class LLMHandler():
+	def __init__(
+		self,
+		model_id="NousResearch/Hermes-3-Llama-3.1-8B",
+		batching: Optional[bool] = None,
+		backend: Optional[str] = None,
+	):
+		cfg = load_settings()
+		model_cfg = cfg.model
+		self.model_id = model_id
+		self.backend = backend or model_cfg.backend
+		if model_cfg.cpu_threads > 0:
+			torch.set_num_threads(model_cfg.cpu_threads)
+		self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+		self.model = load_model(model_id, self.backend)
+
 		if self.tokenizer.pad_token_id is None:
 			self.tokenizer.pad_token = self.tokenizer.eos_token
 		self.model.config.pad_token_id = self.tokenizer.pad_token_id
 
 		self.device = next(self.model.parameters()).device
+		self._lock = Lock()	# guards self.conversation; generation runs outside it
+
+		# Concurrent requests share one decode loop instead of calling generate one at a time
+		self.scheduler = None
+		if model_cfg.batching if batching is None else batching:
+			gen_cfg = getattr(self.model, "generation_config", None)
+			self.scheduler = BatchScheduler(
+				self.model,
+				pad_token_id=self.tokenizer.pad_token_id,
+				max_batch_size=model_cfg.max_batch_size,
+				max_wait_ms=model_cfg.batch_wait_ms,
+				do_sample=bool(getattr(gen_cfg, "do_sample", False)),
+				temperature=getattr(gen_cfg, "temperature", None) or 1.0,
+				top_p=getattr(gen_cfg, "top_p", None) or 1.0,
+			)
+
+		# Shared system prompts are prefilled once and their KV reused across requests;
+		# each /chat session keeps its KV between turns, within a memory budget.
+		# The batch scheduler prefills every prompt itself, so it uses neither.
+		batched = self.scheduler is not None
+		if batched and (model_cfg.prefix_cache or model_cfg.session_kv_cache):
+			logger.info("model.prefix_cache / model.session_kv_cache are off while model.batching is on")
+		self.prefix_cache = PrefixCache(model_cfg.prefix_cache_entries) if model_cfg.prefix_cache and not batched else None
+		self.session_kv = (SessionKVCache(model_cfg.session_kv_cache_mb * 1024**2)
+						   if model_cfg.session_kv_cache and not batched else None)
+
+		# Optional draft model: proposes tokens that the main model verifies in one pass
+		self.speculative = None
+		self._local = local()	# per-request generation stats
+		self._spec_totals = {"requests": 0, "new_tokens": 0, "proposed": 0, "accepted": 0}
+		if model_cfg.draft_model_id and self.scheduler is not None:
+			# the batched decode loop verifies one token per step; there is no draft pass to add
+			logger.warning("model.draft_model_id=%r is ignored: speculative decoding is off while model.batching is on",
+						   model_cfg.draft_model_id)
+		elif model_cfg.draft_model_id:
+			draft = load_model(model_cfg.draft_model_id, self.backend)
+			self.speculative = SpeculativeDecoder(self.model, draft, model_cfg.num_draft_tokens)
+
 		self.system_preamble = (
 			"You are a concise, helpful assistant. "
 			"Answer clearly, avoid speculation, and keep responses brief unless asked."
 		)
 		self.conversation = [{"role": "system", "content": self.system_preamble}]
 
+		count_tokens = lambda text: len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+		# Per-client /chat histories, bounded by a token budget and LRU eviction
+		self.sessions = SessionStore(
+			self.system_preamble,
+			count_tokens=count_tokens,
+			max_sessions=cfg.app.max_sessions,
+			idle_ttl_s=cfg.app.session_idle_s,
+			max_prompt_tokens=cfg.app.max_prompt_tokens,
+			on_evict=self.session_kv.drop if self.session_kv is not None else None,
+		)
+
+		# Per-route decode budgets and stop strings, plus the resulting length distribution
+		self.budget = GenerationBudget(cfg.generation, count_tokens)
+		self.lengths = LengthStats(cfg.generation.length_stats_window, legacy_cap=cfg.generation.max_new_tokens)
+
 		filename = f"conversation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
 		os.makedirs("conversation_logs", exist_ok=True)
 		path = os.path.join("conversation_logs", filename)
@@ -47,23 +161,43 @@ class LLMHandler():
 		self.conversation = [{"role": "system", "content": self.system_preamble}]
 
 
-	def add_message(self, role: str, content: str):
-		self.conversation.append({"role": role, "content": content})
-		if self.convo_log_file:
-			rec = {"role": role, "content": content}
-			self.convo_log_file.write(json.dumps(rec, ensure_ascii=False) + "\n")
-			self.convo_log_file.flush()
+	def add_message(self, role: str, content: str, session_id: Optional[str] = None):
+		if session_id is None:
+			self.conversation.append({"role": role, "content": content})
+		else:
+			self.sessions.append(session_id, role, content)
+		self._log({"role": role, "content": content}, session_id)
+
+	def add_user_message(self, message: str, session_id: Optional[str] = None):
+		self.add_message("user", message, session_id)
+
+	def add_assistant_message(self, message: str, session_id: Optional[str] = None):
+		self.add_message("assistant", message, session_id)
 
-	def add_user_message(self, message: str):
-		self.add_message("user", message)
+	def has_history(self, session_id: Optional[str] = None) -> bool:
+		"""Whether a reply now would depend on earlier turns."""
+		if session_id is None:
+			return len(self.conversation) > 1
+		return session_id in self.sessions
 
-	def add_assistant_message(self, message: str):
-		self.add_message("assistant", message)
+	def record_turn(self, prompt: str, reply: str, session_id: Optional[str] = None):
+		"""Store an exchange answered without generating (a response cache hit)."""
+		with self._lock:
+			self.add_user_message(prompt, session_id)
+			self.add_assistant_message(reply, session_id)
 
-	def prepare_inputs(self):
+	def _log(self, rec: dict, session_id: Optional[str] = None):
+		if not self.convo_log_file:
+			return
+		if session_id is not None:
+			rec = dict(rec, session=session_id)
+		self.convo_log_file.write(json.dumps(rec, ensure_ascii=False) + "\n")
+		self.convo_log_file.flush()
+
+	def prepare_inputs(self, conversation: Optional[list[dict]] = None):
 		# Build a single prompt string using the model's chat template
 		prompt = self.tokenizer.apply_chat_template(
-			self.conversation,
+			self.conversation if conversation is None else conversation,
 			add_generation_prompt=True,
 			tokenize=False,	# return a string, not tensors
 		)
@@ -78,44 +212,324 @@ class LLMHandler():
 		return {k: v.to(self.device) for k, v in enc.items()}
 
 
-	def generate_response(self, input_ids):
-		return self.model.generate(
+	def generate_response(self, input_ids, session_id: Optional[str] = None, plan: Optional[GenerationPlan] = None):
+		plan = plan or GenerationPlan()
+		t0 = time.perf_counter()
+		self._reset_stats()
+		prompt_len = input_ids["input_ids"].shape[-1]
+		if getattr(self, "scheduler", None) is not None:
+			prompt = input_ids["input_ids"][0]
+			new_ids = self.scheduler.generate(
+				prompt,
+				max_new_tokens=plan.max_new_tokens,
+				eos_token_id=self.tokenizer.eos_token_id,
+				stop=self._stop_check(plan.stop_strings),
+			)
+			# same shape as generate(): prompt followed by the new tokens
+			output = torch.cat([prompt.cpu(), torch.tensor(new_ids, dtype=prompt.dtype)]).unsqueeze(0)
+		else:
+			kwargs = self._generation_kwargs(input_ids, session_id, plan)
+			if getattr(self, "speculative", None) is not None:
+				output = self._speculative_generate(kwargs, session_id)
+			else:
+				output = self.model.generate(**kwargs)
+				self._remember_session_kv(session_id, kwargs, output)
+		self._record_length(plan, output[0][prompt_len:], t0)
+		return output
+
+	def _speculative_generate(self, kwargs: dict, session_id: Optional[str] = None, streamer=None,
+							  cancel: Optional[Event] = None):
+		output, stats, past = self.speculative.generate(
+			kwargs["input_ids"],
+			max_new_tokens=kwargs["max_new_tokens"],
+			eos_token_id=kwargs["eos_token_id"],
+			past_key_values=kwargs.get("past_key_values"),
+			streamer=streamer,
+			stop=cancel.is_set if cancel is not None else None,
+		)
+		self._remember_session_kv(session_id, dict(kwargs, past_key_values=past), output)
+		stats = stats.to_dict()
+		with self._lock:
+			self._spec_totals["requests"] += 1
+			for key in ("new_tokens", "proposed", "accepted"):
+				self._spec_totals[key] += stats[key]
+		self._note_stats(speculative=stats)
+		return output
+
+	def last_generation_stats(self) -> Optional[dict]:
+		"""Stats of the last generation finished on this thread (length/budget, speculative decoding)."""
+		stats = getattr(self._local, "stats", None) if hasattr(self, "_local") else None
+		self._reset_stats()
+		return stats
+
+	def _note_stats(self, **parts):
+		if hasattr(self, "_local"):
+			self._local.stats = dict(getattr(self._local, "stats", None) or {}, **parts)
+
+	def _reset_stats(self):
+		if hasattr(self, "_local"):
+			self._local.stats = None
+
+	def _record_length(self, plan: GenerationPlan, new_ids, t0: float):
+		new_ids = [int(t) for t in new_ids]
+		n = len(new_ids)
+		if new_ids and new_ids[-1] == self.tokenizer.eos_token_id:
+			reason = "eos"
+		elif n >= plan.max_new_tokens:
+			reason = "budget"
+		else:
+			reason = "stop_string" if plan.stop_strings else "eos"
+		if getattr(self, "lengths", None) is not None:
+			self.lengths.record(plan.route, n, plan.max_new_tokens, reason, time.perf_counter() - t0)
+		self._note_stats(length={"new_tokens": n, "max_new_tokens": plan.max_new_tokens, "stop": reason})
+
+	def generate_stream(self, input_ids, session_id: Optional[str] = None, plan: Optional[GenerationPlan] = None,
+						cancel: Optional[Event] = None):
+		# Run generate on a background thread; the streamer yields decoded text as tokens arrive.
+		# Returns (wait, streamer): call wait() once the streamer is exhausted.
+		# Setting `cancel` stops generation after the current token (the client went away).
+		plan = plan or GenerationPlan()
+		t0 = time.perf_counter()
+		self._reset_stats()
+		prompt_len = input_ids["input_ids"].shape[-1]
+		streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+		if getattr(self, "scheduler", None) is not None:
+			req = self.scheduler.submit(
+				input_ids["input_ids"][0],
+				max_new_tokens=plan.max_new_tokens,
+				eos_token_id=self.tokenizer.eos_token_id,
+				streamer=streamer,
+				stop=self._stop_check(plan.stop_strings, cancel),
+			)
+
+			def _wait_batched():
+				new_ids = req.result()
+				if not _cancelled(cancel):
+					self._record_length(plan, new_ids, t0)
+			return _wait_batched, streamer
+		kwargs = self._generation_kwargs(input_ids, session_id, plan)
+		if cancel is not None:
+			kwargs["stopping_criteria"] = StoppingCriteriaList([_Cancelled(cancel)])
+		result = {}
+
+		def _run():
+			try:
+				if getattr(self, "speculative", None) is not None:
+					result["output"] = self._speculative_generate(kwargs, session_id, streamer=streamer, cancel=cancel)
+					result["stats"] = self._local.stats
+					return
+				result["output"] = self.model.generate(**kwargs, streamer=streamer)
+				self._remember_session_kv(session_id, kwargs, result["output"])
+			except Exception:
+				streamer.end()	# unblock the consumer; the error is logged by the thread
+				raise
+
+		def _wait():
+			thread.join()
+			if "stats" in result:
+				self._note_stats(**result["stats"])	# hand stats to the consuming thread
+			if "output" in result and not _cancelled(cancel):	# a cut-off reply says nothing about lengths
+				self._record_length(plan, result["output"][0][prompt_len:], t0)
+
+		thread = Thread(target=_run, daemon=True)
+		thread.start()
+		return _wait, streamer
+
+	def _stop_check(self, stop_strings, cancel: Optional[Event] = None):
+		"""Stop check for the batch scheduler: True once the output contains a stop string or `cancel` is set."""
+		if not stop_strings:
+			return None if cancel is None else (lambda ids: cancel.is_set())
+		stops = list(stop_strings)
+		span = max(len(s) for s in stops) + 1	# a token decodes to at least one character
+
+		def _hit(ids) -> bool:
+			if _cancelled(cancel):
+				return True
+			tail = self.tokenizer.decode(ids[-span:], skip_special_tokens=True)
+			return any(s in tail for s in stops)
+		return _hit
+
+	def _generation_kwargs(self, input_ids, session_id: Optional[str] = None, plan: Optional[GenerationPlan] = None):
+		plan = plan or GenerationPlan()
+		kwargs = dict(
 			**input_ids,
-			max_new_tokens=500,
-			eos_token_id=self.tokenizer.eos_token_id
+			max_new_tokens=plan.max_new_tokens,
+			eos_token_id=self.tokenizer.eos_token_id,
 		)
+		if plan.stop_strings:
+			# generate() stops as soon as one of these is decoded
+			kwargs.update(stop_strings=list(plan.stop_strings), tokenizer=self.tokenizer)
+		past = None
+		session_kv = getattr(self, "session_kv", None)
+		if session_id is not None and session_kv is not None:
+			# previous turn's cache: only the new messages get prefilled
+			past = session_kv.take(session_id, input_ids["input_ids"])
+		if past is None and getattr(self, "prefix_cache", None) is not None:
+			past = self.prefix_cache.lookup(input_ids["input_ids"], self._prefill)
+		if past is None and session_id is not None and session_kv is not None:
+			past = new_cache()	# filled in place by generate(), kept for the next turn
+		if past is not None:
+			kwargs["past_key_values"] = past	# generate() then only prefills the suffix
+		return kwargs
+
+	def _remember_session_kv(self, session_id: Optional[str], kwargs: dict, output) -> None:
+		session_kv = getattr(self, "session_kv", None)
+		if session_id is None or session_kv is None or kwargs.get("past_key_values") is None:
+			return
+		# generate() extended the cache in place over prompt + reply (minus the last token)
+		session_kv.put(session_id, kwargs["past_key_values"], output[0])
+
+	def _prefill(self, ids):
+		with torch.inference_mode():
+			out = self.model(input_ids=ids, past_key_values=new_cache(), use_cache=True)
+		return out.past_key_values
+
+	def _register_prefix(self, messages: list[dict]):
+		# Remember the tokenized system message so its KV can be shared by later prompts
+		if getattr(self, "prefix_cache", None) is None or not messages or messages[0].get("role") != "system":
+			return
+		content = messages[0]["content"]
+		if self.prefix_cache.known(content):
+			return
+		try:
+			prompt = self.tokenizer.apply_chat_template(
+				[{"role": "system", "content": content}],
+				add_generation_prompt=False,
+				tokenize=False,
+			)
+			ids = self.tokenizer(prompt, return_tensors="pt")["input_ids"]
+		except Exception:
+			return	# template can't render a lone system turn; just skip caching
+		self.prefix_cache.register(content, ids)
+
+	def metrics(self) -> dict:
+		out = {"sessions": self.sessions.stats()}
+		if getattr(self, "prefix_cache", None) is not None:
+			out["prefix_cache"] = self.prefix_cache.stats()
+		if getattr(self, "session_kv", None) is not None:
+			out["session_kv"] = self.session_kv.stats()
+		if getattr(self, "scheduler", None) is not None:
+			out["scheduler"] = dict(self.scheduler.stats)
+		if getattr(self, "speculative", None) is not None:
+			totals = dict(self._spec_totals)
+			totals["acceptance_rate"] = round(totals["accepted"] / totals["proposed"], 4) if totals["proposed"] else 0.0
+			out["speculative"] = totals
+		if getattr(self, "lengths", None) is not None:
+			out["lengths"] = self.lengths.stats()
+		return out
 
-	def format_reply(self, input_ids, generated_response):
+	def stream_reply(self, input_ids, on_done=None, session_id: Optional[str] = None, plan: Optional[GenerationPlan] = None):
+		# on_done always gets the reply, partial if the client disconnected (GeneratorExit),
+		# so the user turn never stays in the history without its answer.
+		cancel = Event()
+		wait, streamer = self.generate_stream(input_ids, session_id, plan, cancel=cancel)
+		trimmer = StopTrimmer(plan.stop_strings if plan else [])
+		parts = []
+		finished = False
+		try:
+			for piece in streamer:
+				piece = trimmer.feed(piece) if piece else ""
+				if not piece:
+					continue
+				parts.append(piece)
+				yield piece
+			tail = trimmer.flush()
+			if tail:
+				parts.append(tail)
+				yield tail
+			finished = True
+		finally:
+			if not finished:
+				cancel.set()	# stop generating now instead of blocking until the budget runs out
+			try:
+				wait()
+			finally:
+				if on_done is not None:
+					on_done("".join(parts))
+
+	def format_reply(self, input_ids, generated_response, stop_strings: Optional[list[str]] = None):
 		reply = self.tokenizer.decode(generated_response[0][input_ids["input_ids"].shape[-1]:])
 		eos_pos = reply.find(self.tokenizer.eos_token)
 		if eos_pos != -1:
 			reply = reply[:eos_pos]
-		return reply
+		return trim_at_stop(reply, stop_strings)
 
 	def ensure_system(self):
 		# Make sure a system message exists (used by /chat route)
 		if not self.conversation or self.conversation[0].get("role") != "system":
 			self.conversation.insert(0, {"role": "system", "content": self.system_preamble})
 
-	def chat_next(self, prompt):
-		self.ensure_system()
-		self.add_user_message(prompt)
-		inputs = self.prepare_inputs()
-		response = self.generate_response(inputs)
-		reply = self.format_reply(inputs, response)
-		self.add_assistant_message(reply)
-		return reply
+	def _start_turn(self, prompt: str, session_id: Optional[str] = None):
+		"""Record the user turn and build inputs; returns (inputs, on_done) where on_done stores the reply."""
+		self._register_prefix([{"role": "system", "content": self.system_preamble}])
+		if session_id is None:
+			with self._lock:
+				self.ensure_system()
+				self.add_user_message(prompt)
+				inputs = self.prepare_inputs()
 
-	def chat_messages(self, messages: list[dict], reset: bool = True):
+			def _on_done(reply):
+				with self._lock:
+					self.add_assistant_message(reply)
+			return inputs, _on_done
+
+		self.add_user_message(prompt, session_id)
+		inputs = self.prepare_inputs(self.sessions.window(session_id))
+		return inputs, lambda reply: self.add_assistant_message(reply, session_id)
+
+	def _start_messages(self, messages: list[dict], reset: bool):
 		# For RAG: when reset=True you pass your own system+user,
-		# so do NOT inject the default preamble here.
+		# so do NOT inject the default preamble here. Such turns are stateless:
+		# the shared conversation is left alone, the exchange is only logged.
+		self._register_prefix(messages)
 		if reset:
-			self.convo_log_file.write(self.convo_log_file_reset_tag)
-			self.conversation = []	# start exactly with provided messages
-		for m in messages:
-			self.add_message(m["role"], m["content"])
-		inputs = self.prepare_inputs()
-		response = self.generate_response(inputs)
-		reply = self.format_reply(inputs, response)
-		self.add_assistant_message(reply)
+			with self._lock:
+				self.convo_log_file.write(self.convo_log_file_reset_tag)
+				for m in messages:
+					self._log({"role": m["role"], "content": m["content"]})
+			inputs = self.prepare_inputs([{"role": m["role"], "content": m["content"]} for m in messages])
+
+			def _on_done(reply):
+				with self._lock:
+					self._log({"role": "assistant", "content": reply})
+			return inputs, _on_done
+
+		with self._lock:
+			for m in messages:
+				self.add_message(m["role"], m["content"])
+			inputs = self.prepare_inputs()
+
+		def _on_done(reply):
+			with self._lock:
+				self.add_assistant_message(reply)
+		return inputs, _on_done
+
+	def _plan(self, route: str, messages: Optional[list[dict]] = None) -> GenerationPlan:
+		budget = getattr(self, "budget", None)
+		return budget.plan(route, messages) if budget is not None else GenerationPlan(route)
+
+	def chat_next(self, prompt, session_id: Optional[str] = None):
+		inputs, on_done = self._start_turn(prompt, session_id)
+		plan = self._plan("chat")
+		response = self.generate_response(inputs, session_id, plan)
+		reply = self.format_reply(inputs, response, plan.stop_strings)
+		on_done(reply)
+		return reply
+
+	def chat_messages(self, messages: list[dict], reset: bool = True):
+		# reset=True turns are the RAG route: concise answers with a predicted budget
+		inputs, on_done = self._start_messages(messages, reset)
+		plan = self._plan("rag" if reset else "chat", messages)
+		response = self.generate_response(inputs, plan=plan)
+		reply = self.format_reply(inputs, response, plan.stop_strings)
+		on_done(reply)
 		return reply
+
+	def chat_next_stream(self, prompt, session_id: Optional[str] = None):
+		# Same as chat_next, but yields text pieces; history is updated once the stream ends
+		inputs, on_done = self._start_turn(prompt, session_id)
+		yield from self.stream_reply(inputs, on_done, session_id, self._plan("chat"))
+
+	def chat_messages_stream(self, messages: list[dict], reset: bool = True):
+		inputs, on_done = self._start_messages(messages, reset)
+		yield from self.stream_reply(inputs, on_done, plan=self._plan("rag" if reset else "chat", messages))
@@ -0,0 +1,139 @@
+# chat_app/ocr_env.py
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+
+@dataclass
+class OcrEnv:
+	"""The Tesseract install OCR runs against: resolved binary, version, languages, tessdata dir."""
+	cmd: str
+	binary: Optional[str] = None
+	version: Optional[str] = None
+	langs: list[str] = field(default_factory=list)
+	tessdata_dir: Optional[str] = None
+	binary_mtime: Optional[float] = None
+	source: str = "probe"  # probe | disk
+	probe_ms: float = 0.0
+	error: Optional[str] = None
+
+	@property
+	def available(self) -> bool:
+		return self.binary is not None and self.error is None
+
+	def to_dict(self) -> dict:
+		d = asdict(self)
+		d["available"] = self.available
+		return d
+
+
+_ENVS: dict[str, OcrEnv] = {}
+_LOCK = threading.Lock()
+_TIMEOUT_S = 30
+
+
+def get_ocr_env(tesseract_cmd: str = "tesseract", cache_dir: Optional[str] = None, refresh: bool = False) -> OcrEnv:
+	"""
+	Process-wide OCR environment, probed lazily once per tesseract command.
+	- The binary is resolved through PATH (or taken as given when it is a path),
+	  then `--version` and `--list-langs` run once.
+	- Results are also kept in a json DiskCache under cache_dir (default
+	  paths.cache_dir), keyed by binary path, mtime, size and TESSDATA_PREFIX,
+	  so new processes skip the subprocesses and a replaced or upgraded binary
+	  is probed again.
+	- refresh=True re-probes and overwrites both caches.
+	"""
+	with _LOCK:
+		env = _ENVS.get(tesseract_cmd)
+		if env is None or refresh:
+			env = _load(tesseract_cmd, cache_dir, refresh)
+			_ENVS[tesseract_cmd] = env
+		return env
+
+
+def clear_ocr_env() -> None:
+	"""Forget the in-memory probes (the disk cache stays)."""
+	with _LOCK:
+		_ENVS.clear()
+
+
+# ---------- helpers ----------
+
+def _load(cmd: str, cache_dir: Optional[str], refresh: bool) -> OcrEnv:
+	t0 = time.perf_counter()
+	binary = shutil.which(cmd)
+	if not binary:
+		return OcrEnv(cmd=cmd, error=f"{cmd!r} not found on PATH")
+	binary = os.path.realpath(binary)
+	st = os.stat(binary)
+	key = f"tesseract|{binary}|{st.st_mtime_ns}|{st.st_size}|{os.environ.get('TESSDATA_PREFIX', '')}"
+
+	cache = _disk_cache(cache_dir)
+	if cache is not None and not refresh:
+		hit = cache.get(key)
+		if hit:
+			try:
+				env = OcrEnv(**json.loads(hit))
+				env.cmd, env.source = cmd, "disk"
+				env.probe_ms = round((time.perf_counter() - t0) * 1000, 2)
+				return env
+			except Exception:
+				pass
+
+	env = OcrEnv(cmd=cmd, binary=binary, binary_mtime=st.st_mtime)
+	try:
+		env.version = _version(_run(binary, "--version"))
+		env.tessdata_dir, env.langs = _langs(_run(binary, "--list-langs"))
+	except Exception as e:
+		env.error = f"{type(e).__name__}: {e}"
+	env.tessdata_dir = env.tessdata_dir or os.environ.get("TESSDATA_PREFIX") or None
+	env.probe_ms = round((time.perf_counter() - t0) * 1000, 2)
+
+	if cache is not None and env.error is None:
+		try:
+			cache.add(key, json.dumps(asdict(env)))
+		except Exception:
+			pass
+	return env
+
+
+def _run(binary: str, flag: str) -> str:
+	return subprocess.check_output([binary, flag], stderr=subprocess.STDOUT, text=True, timeout=_TIMEOUT_S)
+
+
+def _version(out: str) -> Optional[str]:
+	# "tesseract 5.3.0" (older builds: "tesseract v4.1.1...")
+	m = re.search(r"tesseract\s+v?(\S+)", out, re.I)
+	return m.group(1) if m else None
+
+
+def _langs(out: str) -> tuple[Optional[str], list[str]]:
+	# List of available languages in "/usr/share/tesseract-ocr/5/tessdata/" (3):
+	tessdata, langs = None, []
+	for ln in out.splitlines():
+		ln = ln.strip()
+		if not ln:
+			continue
+		if ln.lower().startswith("list of"):
+			m = re.search(r'"(.+?)"', ln)
+			tessdata = m.group(1) if m else None
+			continue
+		langs.append(ln)
+	return tessdata, sorted(langs)
+
+
+def _disk_cache(cache_dir: Optional[str]):
+	try:
+		from .disk_cache import DiskCache
+		return DiskCache("json", cache_dir)
+	except Exception:
+		return None
+
+
+__all__ = ["OcrEnv", "get_ocr_env", "clear_ocr_env"]
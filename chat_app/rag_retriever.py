@@ -1,44 +1,62 @@
 # rag_retriever.py
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from .rag_store import RAGStore
 from .guardrails import Guardrails
-from .settings import load_settings
+from .settings import get_settings
 
 logger = logging.getLogger(__name__)
-cfg = load_settings
+cfg = get_settings
 
 def _rrf(rank, k=60):
 	return 1.0 / (k + rank)
 
+def _ms(t0):
+	return round((time.perf_counter() - t0) * 1000, 2)
+
+def _timed(fn, *args, **kwargs):
+	t0 = time.perf_counter()
+	result = fn(*args, **kwargs)
+	return result, _ms(t0)
+
 class RAGRetriever:
 	def __init__(self, store: RAGStore):
 
 		self.store = store
 		self.gr = Guardrails(dense_metric="l2", alpha=0.5)
+		# sparse branch of hybrid_query; one per concurrent retrieval is enough
+		self._branches = ThreadPoolExecutor(max_workers=max(1, cfg().app.retrieval_workers),
+											thread_name_prefix="rag-sparse")
 
 	def hybrid_query(self, query_text: str, *, n_dense=20, n_sparse=50, top_k=3, rrf_k=60, include_ids: Optional[bool] = False):
+		"""
+		Dense (embed + Chroma) and sparse (BM25) branches run concurrently: sparse on
+		the branch pool, dense on the calling thread. Both return ids only; the fused
+		top_k are hydrated with one collection.get. out["timings"] has per-stage ms.
+		"""
 		logger.info("Hybrid query: %s", query_text)
+		t_start = time.perf_counter()
+		timings = {}
+
+		sparse_future = self._branches.submit(_timed, self.store.sparse_ids, query_text, n_results=n_sparse)
+		dense, timings["dense_ms"] = _timed(self.store.query, query_text, n_results=n_dense, include=("distances",))
+		s_hits, timings["sparse_ms"] = sparse_future.result()
 
 		# dense
-		dense = self.store.query(query_text, n_results=n_dense, include=("documents","metadatas","distances"))
 		d_ids = dense.get("ids", [[]])[0] if "ids" in dense else []
-		d_docs = dense.get("documents", [[]])[0]
-		d_meta = dense.get("metadatas", [[]])[0]
 		d_dists = dense.get("distances", [[]])[0]
 		d_ranks = {doc_id: i for i, doc_id in enumerate(d_ids)}
 		d_dist_map = {i: dist for i, dist in zip(d_ids, d_dists)}
 
 		# sparse
-		sparse = self.store.sparse_query(query_text, n_results=n_sparse)
-		s_ids = sparse.get("ids", [[]])[0]
-		s_docs = sparse.get("documents", [[]])[0]
-		s_meta = sparse.get("metadatas", [[]])[0]
-		s_scores = sparse.get("scores", [[]])[0]
+		s_ids = [i for i, _ in s_hits]
 		s_ranks = {doc_id: i for i, doc_id in enumerate(s_ids)}
-		s_score_map = {i: sc for i, sc in zip(s_ids, s_scores)}
+		s_score_map = dict(s_hits)
 
 		# RRF fuse over union of ids
+		t0 = time.perf_counter()
 		all_ids = list(dict.fromkeys(list(d_ids) + list(s_ids)))
 		scores = {}
 		for did in all_ids:
@@ -46,29 +64,26 @@ class RAGRetriever:
 				scores[did] = scores.get(did, 0.0) + _rrf(d_ranks[did], k=rrf_k)
 			if did in s_ranks:
 				scores[did] = scores.get(did, 0.0) + _rrf(s_ranks[did], k=rrf_k)
-
-		# take top_k and hydrate (prefer sparse/dense payloads we already have; if missing, fetch)
 		top = sorted(all_ids, key=lambda i: scores.get(i, 0.0), reverse=True)[:top_k]
-		id2doc = {i: d for i, d in zip(d_ids, d_docs)} | {i: d for i, d in zip(s_ids, s_docs)}
-		id2meta = {i: m for i, m in zip(d_ids, d_meta)} | {i: m for i, m in zip(s_ids, s_meta)}
+		timings["fuse_ms"] = _ms(t0)
 
-		missing = [i for i in top if i not in id2doc]
-		if missing:
-			got = self.store.collection.get(ids=missing, include=["documents","metadatas"])
-			for i, d, m in zip(got.get("ids",[]), got.get("documents",[]), got.get("metadatas",[])):
-				id2doc[i] = d; id2meta[i] = m
+		# hydrate only the fused top_k (ids BM25 still has but Chroma lost are dropped)
+		(id2doc, id2meta), timings["hydrate_ms"] = _timed(self.store.hydrate, top)
+		top = [i for i in top if i in id2doc]
 
 		_big = 1e6  # large distance → ~0 similarity after mapping
 		top_bm25 = [s_score_map.get(i, 0.0) for i in top]
 		top_dists = [d_dist_map.get(i, _big) for i in top]
 
 		top_norm = self.gr.normalized_scores(top_bm25, top_dists)
+		timings["total_ms"] = _ms(t_start)
 
 		out = {
 			"documents": [[id2doc[i] for i in top]],
 			"metadatas": [[id2meta[i] for i in top]],
 			"scores": [[scores[i] for i in top]],
 			"normalized_scores": [[v for v in top_norm]],
+			"timings": timings,
 		}
 
 		if include_ids:
@@ -86,6 +101,7 @@ class RAGRetriever:
 		metas_nested = results.get("metadatas", [[]])
 		scores_nested = results.get("scores", [[]])
 		normalized_scores_nested = results.get("normalized_scores", [[]])
+		timings = results.get("timings", {})
 
 		fmt_ids = set()
 		def _fmt_id(meta, idx):
@@ -142,4 +158,4 @@ class RAGRetriever:
 			})
 		return {"messages":messages, "sources":sources, 
 				"fmt_ids":fmt_ids, "is_sus":sus, 
-				"was_redacted":redacted}
+				"was_redacted":redacted, "timings":timings}
@@ -10,18 +10,19 @@ from typing import Iterable, List, Tuple, Optional
 
 from chromadb import PersistentClient
 from docling.chunking import HybridChunker
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import (
-	ThreadedPdfPipelineOptions as PdfPipelineOptions,
-	TesseractCliOcrOptions,
-)
 from PIL import Image
 
+from .chunk_store import ChunkStore
+from .doc_converter import DoclingConverter
 from .embedder import Embedder
-from .sparse_bm25 import BM25Index
+from .ingest_manifest import IngestManifest, fingerprint
+from .sparse_bm25 import AnalyzerMismatch, BM25Index
 from .settings import load_settings
 
+# bump when conversion / chunking changes which chunks a file yields;
+# files ingested under another version are rebuilt by sync()
+INGEST_PIPELINE_VERSION = 1
+
 
 class RAGStore:
 	"""
@@ -51,7 +52,6 @@ class RAGStore:
 		self.chunker = HybridChunker()
 
 		# --- conversion / OCR
-		self.converter: DocumentConverter | None = None
 		self._captioner = None  # lazy-load when needed
 
 		# Where is tesseract.exe? No PATH required.
@@ -62,13 +62,45 @@ class RAGStore:
 
 		self.tesseract_cmd = self._resolve_tesseract_cmd(self.tesseract_dir)
 		self._maybe_set_tessdata_prefix(self.tesseract_dir)
+		self.docling = DoclingConverter(self.tesseract_cmd, self.tessdata_dir, debug=self._debug)
+
+		# staged ingest (convert processes -> embed batches -> single writer)
+		self.ingest_workers = max(0, int(cfg.vectorstore.ingest_workers))
+		self._ingest_cfg = (cfg.vectorstore.ingest_embed_batch, cfg.vectorstore.ingest_queue)
+		self._pipeline = None
+		self.last_ingest_stats: Optional[dict] = None
+		self.last_failed_paths: List[str] = []
+		self.last_source_ids: dict[str, List[str]] = {}	# path -> every chunk id the last ingest produced for it
 
 		# supported image types (for VisionCaptioner)
 		self._image_exts = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tiff", ".tif"}
 
 		# load sparse BM25
-		self.bm25 = BM25Index(persist_path=os.path.join(chroma_dir, "bm25_corpus.jsonl"))
-		self.bm25.load()
+		bm25_cls = BM25Index
+		if cfg.vectorstore.bm25_backend == "csr":
+			from .sparse_csr import CSRBM25Index as bm25_cls
+		self.bm25 = bm25_cls(
+			persist_path=os.path.join(chroma_dir, "bm25_corpus.jsonl"),
+			analyzer=cfg.vectorstore.bm25_analyzer,
+		)
+		try:
+			self.bm25.load()
+		except AnalyzerMismatch as e:
+			self._debug(f"[WARN] {e}; rebuilding it from the collection")
+			self._rebuild_bm25()
+
+		# what each ingested file contributed, for incremental sync(); keyed on the
+		# converter and embedder only: an analyzer change is handled by _rebuild_bm25()
+		self.manifest = IngestManifest(
+			os.path.join(chroma_dir, "ingest_manifest.json"),
+			f"{INGEST_PIPELINE_VERSION}|{self.embedder.model_id}",
+		)
+
+		# id -> text/meta for hydration without a Chroma round trip
+		self.chunks = ChunkStore(cfg.vectorstore.chunk_store_max) if cfg.vectorstore.chunk_store_max > 0 else None
+		if self.chunks is not None and cfg.vectorstore.chunk_store_preload:
+			got = self.collection.get(include=["documents", "metadatas"], limit=self.chunks.max_chunks)
+			self.chunks.put_many(got.get("ids") or [], got.get("documents") or [], got.get("metadatas") or [])
 
 	# ---------------------------
 	# Public API
@@ -86,24 +118,102 @@ class RAGStore:
 		sorted_paths = self._sort_flag_paths(file_paths) # -> [(path, is_image)]
 
 		added_ids: List[str] = []
+		documents: List[str] = []
+		self.last_failed_paths = []
+		self.last_source_ids = {}
 		for fp, is_image in sorted_paths:
 			try:
 				abs_path = self._validate_and_abspath(fp)
 			except Exception as e:
 				self._debug(f"[WARN] Skipping {fp}: {e}")
+				self.last_failed_paths.append(str(fp))
 				continue
 
+			# documents go through the staged pipeline when it is enabled
+			if not is_image and self.ingest_workers:
+				documents.append(abs_path)
+				continue
 			try:
 				added_ids.extend(self._ingest_one(abs_path, use_vlm=use_vlm))
 			except Exception as e:
 				self._debug(f"[ERROR] Failed to ingest {abs_path}: {e}")
+				self.last_failed_paths.append(abs_path)
 
 		if self._captioner is not None:
 			self._captioner.unload()
 			self._captioner = None
 
+		if documents:
+			if self._pipeline is None:
+				from .ingest_pipeline import IngestPipeline
+				embed_batch, queue_size = self._ingest_cfg
+				self._pipeline = IngestPipeline(self, workers=self.ingest_workers,
+												embed_batch=embed_batch, queue_size=queue_size)
+			added_ids.extend(self._pipeline.run(documents))
+			self.last_ingest_stats = self._pipeline.last_stats
+			self.last_failed_paths.extend(self._pipeline.last_failed)
+			self.last_source_ids.update(self._pipeline.last_source_ids)
+
 		return added_ids
 
+	def sync(self, file_paths: Iterable[str], use_vlm: bool = True) -> dict:
+		"""
+		Incremental ingest of a full scan, driven by the ingest manifest:
+		- unchanged files (same size + mtime, or same content hash) are skipped
+		  before Docling runs;
+		- new files are ingested; changed files are ingested and then lose the
+		  chunks their new version no longer has;
+		- files ingested under another pipeline version are rebuilt;
+		- files in the manifest that are gone from disk lose their chunks.
+		Returns the added chunk ids and per-category file counts.
+		"""
+		abs_paths: List[str] = []
+		for fp in file_paths:
+			try:
+				abs_paths.append(self._validate_and_abspath(fp))
+			except Exception as e:
+				self._debug(f"[WARN] Skipping {fp}: {e}")
+		plan = self.manifest.plan(abs_paths)
+
+		removed = 0
+		for path in plan.deleted:
+			removed += self._drop_source(path, self.manifest.forget(path).chunk_ids)
+		for path in plan.rebuild:
+			removed += self._drop_source(path, self.manifest.get(path).chunk_ids)
+
+		todo = plan.new + plan.changed + plan.rebuild
+		added = self.ingest(todo, use_vlm=use_vlm) if todo else []
+		failed = set(self.last_failed_paths) if todo else set()
+		changed = set(plan.changed)
+		for path in todo:
+			if path in failed:
+				continue	# keep the old entry (and chunks): retried on the next sync
+			# ids this run produced for the file (Chroma still holds the old ones too)
+			ids = self.last_source_ids.get(path, [])
+			old = self.manifest.get(path)
+			if old is not None and path in changed:
+				stale = sorted(set(old.chunk_ids) - set(ids))
+				removed += self.delete_ids(stale)
+			self.manifest.record(path, plan.fingerprints[path], ids)
+		self.manifest.save()
+
+		summary = {
+			"added_ids": added,
+			"new": len(plan.new),
+			"changed": len(plan.changed),
+			"rebuilt": len(plan.rebuild),
+			"unchanged": len(plan.unchanged),
+			"deleted": len(plan.deleted),
+			"failed": len(failed),
+			"chunks_removed": removed,
+		}
+		self._debug(
+			f"[SYNC] {summary['new']} new, {summary['changed']} changed, {summary['rebuilt']} rebuilt, "
+			f"{summary['unchanged']} unchanged, {summary['deleted']} deleted, {summary['failed']} failed; "
+			f"+{len(added)} / -{removed} chunks"
+		)
+		return summary
+
 	def add_file_to_store(self, file_path: str) -> int:
 		"""
 		Backwards-compatible wrapper around ingest(); returns number of chunks added.
@@ -111,6 +221,63 @@ class RAGStore:
 		added_ids = self.ingest([file_path], use_vlm=False, ocr=True)
 		return len(added_ids)
 
+	def delete_ids(self, ids: List[str]) -> int:
+		"""
+		Remove chunks from Chroma and BM25 together; returns how many ids were given.
+		"""
+		ids = list(ids or [])
+		if not ids:
+			return 0
+		self.collection.delete(ids=ids)
+		self.bm25.delete(ids)
+		if self.chunks is not None:
+			self.chunks.delete(ids)
+		return len(ids)
+
+	def delete_source(self, file_path: str) -> int:
+		"""
+		Remove every chunk of one source file from Chroma and BM25; returns chunks deleted.
+		"""
+		paths = {str(file_path)}
+		try:
+			paths.add(str(Path(file_path).resolve()))
+		except Exception:
+			pass
+		deleted = 0
+		for p in paths:
+			entry = self.manifest.forget(p)
+			deleted += self._drop_source(p, entry.chunk_ids if entry is not None else [])
+		self.manifest.save()
+		return deleted
+
+	def reingest(self, file_path: str, use_vlm: bool = True) -> int:
+		"""
+		Replace a changed file: drop its old chunks, ingest it again; returns chunks added.
+		"""
+		self.delete_source(file_path)
+		added = self.ingest([file_path], use_vlm=use_vlm)
+		if not self.last_failed_paths:
+			abs_path = self._validate_and_abspath(file_path)
+			self.manifest.record(abs_path, fingerprint(abs_path), self.last_source_ids.get(abs_path, []))
+			self.manifest.save()
+		return len(added)
+
+	def stats(self) -> dict:
+		got = self.collection.get(include=["metadatas"])
+		sources = {(m or {}).get("source_file") for m in (got.get("metadatas") or [])}
+		sources.discard(None)
+		return {
+			"chunks": len(got.get("ids") or []),
+			"sources": len(sources),
+			"bm25": self.bm25.stats(),
+			"chunk_store": self.chunks.stats() if self.chunks is not None else None,
+			"query_embeddings": self.embedder.cache_stats() if hasattr(self.embedder, "cache_stats") else None,
+			"chunk_embeddings": self.embedder.chunk_cache_stats() if hasattr(self.embedder, "chunk_cache_stats") else None,
+			"docling": dict(self.docling.timings),
+			"ingest": self.last_ingest_stats,
+			"manifest": self.manifest.stats(),
+		}
+
 	def query(
 		self,
 		query_text: str,
@@ -123,7 +290,7 @@ class RAGStore:
 		- Only pass `where` when provided; empty dicts can error.
 		- Avoid including 'ids' in include for query() to keep it portable.
 		"""
-		q_emb = self.embedder.embed([query_text])[0]
+		q_emb = self.embedder.embed_query(query_text)
 		kwargs = {
 			"query_embeddings": [q_emb],
 			"n_results": int(n_results),
@@ -133,20 +300,52 @@ class RAGStore:
 			kwargs["where"] = where
 		return self.collection.query(**kwargs)
 
-	def sparse_query(self, query_text: str, n_results: int = 20):
-		hits = self.bm25.search(query_text, top_k=int(n_results))
-		if not hits:
-			return {"ids": [[]], "documents": [[]], "metadatas": [[]], "scores": [[]]}
-		ids = [h[0] for h in hits]
-		got = self.collection.get(ids=ids, include=["documents", "metadatas"])
-		# keep BM25 order
-		id_to_i = {i: k for k, i in enumerate(got.get("ids", []))}
-		ordered = [got["ids"][id_to_i[i]] for i in ids if i in id_to_i]
-		docs = [got["documents"][id_to_i[i]] for i in ordered]
-		metas = [got["metadatas"][id_to_i[i]] for i in ordered]
-		scores = [s for (_, s) in hits if _ in id_to_i]
-		return {"ids": [ordered], "documents": [docs], "metadatas": [metas], "scores": [scores]}
+	def sparse_query(self, query_text: str, n_results: int = 20, hydrate: bool = True):
+		return self.sparse_query_batch([query_text], n_results=n_results, hydrate=hydrate)
 
+	def sparse_query_batch(self, query_texts: List[str], n_results: int = 20, hydrate: bool = True):
+		"""
+		BM25 for many queries at once (evaluation runs); one result list per query,
+		Chroma-style. Chunk texts are fetched with a single hydrate() call; with
+		hydrate=False only ids and scores come back.
+		"""
+		all_hits = self.bm25.search_batch(list(query_texts), top_k=int(n_results))
+		if not hydrate:
+			return {"ids": [[i for i, _ in hits] for hits in all_hits],
+					"scores": [[s for _, s in hits] for hits in all_hits]}
+		out = {"ids": [], "documents": [], "metadatas": [], "scores": []}
+		id2doc, id2meta = self.hydrate(i for hits in all_hits for i, _ in hits)
+		for hits in all_hits:
+			# keep BM25 order
+			kept = [(i, s) for i, s in hits if i in id2doc]
+			out["ids"].append([i for i, _ in kept])
+			out["documents"].append([id2doc[i] for i, _ in kept])
+			out["metadatas"].append([id2meta[i] for i, _ in kept])
+			out["scores"].append([s for _, s in kept])
+		return out
+
+	def sparse_ids(self, query_text: str, n_results: int = 20) -> List[Tuple[str, float]]:
+		"""BM25 (id, score) hits only; hydrate() the ones you keep."""
+		return self.bm25.search(query_text, top_k=int(n_results))
+
+	def hydrate(self, ids: Iterable[str]) -> Tuple[dict, dict]:
+		"""
+		Documents and metadatas for chunk ids: from the in-memory chunk store, then
+		one collection.get for whatever it lacks. Unknown ids are left out.
+		"""
+		wanted = list(dict.fromkeys(ids))
+		if not wanted:
+			return {}, {}
+		id2doc, id2meta, missing = ({}, {}, wanted) if self.chunks is None else self.chunks.get_many(wanted)
+		if missing:
+			got = self.collection.get(ids=missing, include=["documents", "metadatas"])
+			got_ids = got.get("ids", [])
+			for i, d, m in zip(got_ids, got.get("documents", []), got.get("metadatas", [])):
+				id2doc[i] = d
+				id2meta[i] = m
+			if self.chunks is not None:
+				self.chunks.put_many(got_ids, got.get("documents", []), got.get("metadatas", []))
+		return id2doc, id2meta
 
 	def new_prompt(self, prompt: str, n_results: int = 5) -> str:
 		"""
@@ -194,6 +393,7 @@ class RAGStore:
 
 		# --- Pure image file → optional caption
 		if ext in self._image_exts:
+			self.last_source_ids[abs_path] = []
 			if use_vlm:
 				try:
 					if self._captioner is None:
@@ -206,21 +406,26 @@ class RAGStore:
 							{"source_file": abs_path, "chunk_index": -1, "page": -1, "type": "image_caption"},
 							caption,
 						)
+						self.last_source_ids[abs_path] = [ch_id]
 						# dedup
 						if self._ids_absent([ch_id])[0]:
 							# add to chroma
 							self.collection.add(
 								documents=[caption.strip()],
-								embeddings=self.embedder.embed([caption.strip()]),
+								embeddings=self.embedder.embed_documents([caption.strip()]),
 								metadatas=[{"source_file": abs_path, "chunk_index": -1, "page": -1, "type": "image_caption"}],
 								ids=[ch_id],
 							)
 							added_ids.append(ch_id)
 							# add to BM25
-							self.bm25.add([ch_id], [caption.strip()])
+							self.bm25.add([ch_id], [caption.strip()], sources=[abs_path])
+							if self.chunks is not None:
+								self.chunks.put_many([ch_id], [caption.strip()], [
+									{"source_file": abs_path, "chunk_index": -1, "page": -1, "type": "image_caption"}])
 				except Exception as e:
                     # don't fail ingestion on caption hiccups
 					self._debug(f"[WARN] VisionCaptioner failed: {e}")
+					self.last_failed_paths.append(abs_path)
 
 			# even if no caption, nothing else to do for images
 			return added_ids
@@ -232,28 +437,51 @@ class RAGStore:
 		# Build chunks from Docling
 		raw_chunks = list(self.chunker.chunk(dl_doc=doc))
 		candidate_ids, texts_to_add, metas_to_add = self._build_text_chunks(abs_path, raw_chunks)
+		self.last_source_ids[abs_path] = list(candidate_ids)
+		return added_ids + self._add_chunks(abs_path, candidate_ids, texts_to_add, metas_to_add)
 
-		# Filter out IDs that already exist in Chroma
+	def _add_chunks(self, abs_path: str, candidate_ids: List[str], texts_to_add: List[str],
+					metas_to_add: List[dict]) -> List[str]:
+		"""Dedup against Chroma, embed and write one file's chunks; returns ids added."""
+		ids_to_add, texts_final, metas_final = self._new_chunks(candidate_ids, texts_to_add, metas_to_add)
+		if not ids_to_add:
+			return []
+
+		embeddings = self.embedder.embed_documents(texts_final)
+		self._write_chunks(ids_to_add, texts_final, metas_final, [abs_path] * len(ids_to_add), embeddings)
+		return ids_to_add
+
+	def _new_chunks(self, candidate_ids: List[str], texts_to_add: List[str],
+					metas_to_add: List[dict]) -> Tuple[List[str], List[str], List[dict]]:
+		"""Filter out IDs that already exist in Chroma."""
 		mask_new = self._ids_absent(candidate_ids)
 		ids_to_add = [cid for cid, keep in zip(candidate_ids, mask_new) if keep]
 		texts_final = [t for t, keep in zip(texts_to_add, mask_new) if keep]
 		metas_final = [m for m, keep in zip(metas_to_add, mask_new) if keep]
-
-		if not ids_to_add:
-			return added_ids
-
-		embeddings = self.embedder.embed(texts_final)
+		return ids_to_add, texts_final, metas_final
+
+	def _rebuild_bm25(self) -> None:
+		"""Re-index every chunk text stored in Chroma with the configured BM25 analyzer."""
+		got = self.collection.get(include=["documents", "metadatas"])
+		ids = got.get("ids") or []
+		metas = got.get("metadatas") or [None] * len(ids)
+		self.bm25.rebuild(ids, got.get("documents") or [], [(m or {}).get("source_file") for m in metas])
+		self._debug(f"[BM25] rebuilt {len(ids)} chunks with analyzer {self.bm25.analyzer.name!r}")
+
+	def _write_chunks(self, ids: List[str], texts: List[str], metas: List[dict],
+					  sources: List[str], embeddings) -> None:
+		"""Add embedded chunks to Chroma, BM25 and the ChunkStore."""
 		# add to chroma
 		self.collection.add(
-			documents=texts_final,
+			documents=texts,
 			embeddings=embeddings,
-			metadatas=metas_final,
-			ids=ids_to_add,
+			metadatas=metas,
+			ids=ids,
 		)
 		# add to BM25
-		self.bm25.add(ids_to_add, texts_final)
-		added_ids.extend(ids_to_add)
-		return added_ids
+		self.bm25.add(ids, texts, sources=sources)
+		if self.chunks is not None:
+			self.chunks.put_many(ids, texts, metas)
 
 	def _build_text_chunks(self, abs_path: str, chunks) -> Tuple[List[str], List[str], List[dict]]:
 		candidate_ids: List[str] = []
@@ -290,48 +518,10 @@ class RAGStore:
 	# ---------------------------
 
 	def _convert_auto_ocr(self, abs_path: str):
-		"""
-		Two-pass strategy:
-		1) Try without OCR (fastest for text-native PDFs).
-		2) If extracted text is sparse, retry with OCR enabled.
-		"""
-		res1 = self._docling_convert(abs_path, ocr=False, do_picture_description=False)
-		doc1 = res1.document
-		total_len = sum(len(getattr(p, "text", "") or "") for p in getattr(doc1, "pages", []))
-
-		# Heuristic: enough text → keep no-OCR result
-		if total_len >= 2000 or any(len(getattr(p, "text", "") or "") > 200 for p in getattr(doc1, "pages", [])):
-			return res1
-
-		# Otherwise OCR (page-selective; not full-page)
-		return self._docling_convert(abs_path, ocr=True, do_picture_description=False)
+		return self.docling.convert_auto_ocr(abs_path)
 
 	def _docling_convert(self, abs_path: str, *, ocr: bool, do_picture_description: bool = False):
-		popts = PdfPipelineOptions()
-		popts.do_picture_description = bool(do_picture_description)
-		popts.images_scale = 3.0
-		popts.ocr_batch_size = 1
-
-		popts.do_ocr = bool(ocr)
-		if popts.do_ocr:
-			tdir = str(self.tessdata_dir) if self.tessdata_dir else None
-			desired_langs = ["eng","pol"]
-			use_langs = [l for l in desired_langs if l in self._installed_tess_langs()] or ["eng"]
-			self._debug(f"[OCR] Using langs={use_langs}, tessdata_dir={tdir}")
-
-			popts.ocr_options = TesseractCliOcrOptions(
-				tesseract_cmd=self.tesseract_cmd,
-				path=tdir,								# <- pass tessdata folder, not install root
-				lang=use_langs,
-				force_full_page_ocr=True,
-				bitmap_area_threshold=0.0,
-			)
-
-		self.converter = DocumentConverter(format_options={
-			InputFormat.PDF: PdfFormatOption(pipeline_options=popts)
-		})
-		return self.converter.convert(abs_path)
-
+		return self.docling.convert(abs_path, ocr=ocr, do_picture_description=do_picture_description)
 
 	# ---------------------------
 	# Utilities
@@ -361,6 +551,18 @@ class RAGStore:
 		return images + docs
 
 
+	def _source_ids(self, abs_path: str) -> List[str]:
+		"""Ids of every chunk in Chroma that came from this file."""
+		got = self.collection.get(where={"source_file": abs_path}, include=[])
+		return list(got.get("ids") or [])
+
+	def _drop_source(self, abs_path: str, known_ids: Iterable[str] = ()) -> int:
+		"""Delete a file's chunks (Chroma lookup + ids the manifest knew); returns how many."""
+		ids = sorted(set(self._source_ids(abs_path)) | set(known_ids))
+		deleted = self.delete_ids(ids)
+		self.bm25.delete_source(abs_path)	# also drops BM25-only leftovers
+		return deleted
+
 	def _ids_absent(self, ids: List[str]) -> List[bool]:
 		"""
 		Returns a boolean mask: True where id is NOT present in the collection.
@@ -478,19 +680,7 @@ class RAGStore:
 			os.environ.setdefault("TESSDATA_PREFIX", str(td) + os.sep)
 
 	def _installed_tess_langs(self) -> set[str]:
-		"""
-		Return set of installed Tesseract language codes, e.g. {'eng','pol'}.
-		"""
-		try:
-			import subprocess, shlex
-			cmd = f"\"{self.tesseract_cmd}\" --list-langs"
-			out = subprocess.check_output(shlex.split(cmd), stderr=subprocess.STDOUT, text=True)
-			langs = {ln.strip() for ln in out.splitlines() if ln.strip() and not ln.lower().startswith("list of")}
-			return langs
-		except Exception as e:
-			self._debug(f"[OCR] Couldn't list Tesseract languages: {e}")
-			return set()
-
+		return self.docling.installed_tess_langs()
 
 	def _debug(self, msg: str) -> None:
 		try:
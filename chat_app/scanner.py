@@ -8,7 +8,7 @@
 # PNG, JPEG, TIFF, BMP, WEBP	
 # scanner.py
 from pathlib import Path
-from .settings import load_settings
+from .settings import get_settings, subscribe_settings
 import os
 
 class Scanner:
@@ -34,7 +34,11 @@ class Scanner:
 				]
 			)
 		)
-		self.SKIP_DIRS = set(load_settings().paths.secret_dirs or [])
+		if skip_dirs is not None:
+			self.SKIP_DIRS = set(skip_dirs)
+		else:
+			self.SKIP_DIRS = set(get_settings().paths.secret_dirs or [])
+			subscribe_settings(self._on_settings)
 		self.follow_symlinks = bool(follow_symlinks)
 
 	def scan(
@@ -118,7 +122,10 @@ class Scanner:
 	def _should_skip_dir(self, p: Path) -> bool:
 		# If any path component matches a configured skip dir (exact match), skip
 		parts = set(p.resolve().parts)
-		return any(skip in parts for skip in cfg().paths.secret_dirs)
+		return any(skip in parts for skip in self.SKIP_DIRS)
+
+	def _on_settings(self, settings) -> None:
+		self.SKIP_DIRS = set(settings.paths.secret_dirs or [])
 
 	def _is_hidden(self, root: Path, p: Path) -> bool:
 		# A path is considered hidden if any relative component starts with a dot.
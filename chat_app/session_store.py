@@ -0,0 +1,154 @@
+# chat_app/session_store.py
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+
+@dataclass
+class Session:
+	messages: list = field(default_factory=list)		# [{"role", "content"}], system excluded
+	token_counts: list = field(default_factory=list)	# aligned with messages, counted once on append
+	last_used: float = field(default_factory=time.time)
+	turns: int = 0
+
+
+class SessionStore:
+	"""
+	Per-client conversation history for /chat.
+	- Sessions are keyed by a client session id and kept in LRU order;
+	  the least recently used ones are evicted past `max_sessions`,
+	  and sessions idle for longer than `idle_ttl_s` are dropped.
+	- window() returns the system preamble plus the newest messages that fit
+	  in `max_prompt_tokens`, so prompt length stays bounded per request.
+	"""
+
+	# rough per-message overhead of chat templates (role header + separators)
+	_TEMPLATE_OVERHEAD = 8
+
+	def __init__(
+		self,
+		system_preamble: str,
+		count_tokens: Callable[[str], int],
+		max_sessions: int = 256,
+		idle_ttl_s: int = 3600,
+		max_prompt_tokens: int = 3072,
+		on_evict: Optional[Callable[[str], None]] = None,
+	):
+		self.system_preamble = system_preamble
+		self.count_tokens = count_tokens
+		self.max_sessions = max(1, int(max_sessions))
+		self.idle_ttl_s = int(idle_ttl_s)
+		self.max_prompt_tokens = int(max_prompt_tokens)
+		self.on_evict = on_evict	# called with the id of every evicted/dropped session
+
+		self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+		self._lock = threading.Lock()
+		self._system_tokens = self._count(system_preamble)
+		self._last_sweep = time.time()
+		self.evicted = 0
+
+	# ---------- public API ----------
+
+	def append(self, session_id: str, role: str, content: str) -> None:
+		n = self._count(content)
+		with self._lock:
+			s = self._touch(session_id)
+			s.messages.append({"role": role, "content": content})
+			s.token_counts.append(n)
+			if role == "user":
+				s.turns += 1
+
+	def window(self, session_id: str) -> list[dict]:
+		"""System preamble + newest messages within the token budget (always keeps the last one)."""
+		with self._lock:
+			s = self._touch(session_id)
+			budget = self.max_prompt_tokens - self._system_tokens
+			start = len(s.messages)
+			used = 0
+			while start > 0:
+				n = s.token_counts[start - 1]
+				if used + n > budget and start < len(s.messages):
+					break
+				used += n
+				start -= 1
+			# never open the window on an assistant reply
+			while start < len(s.messages) - 1 and s.messages[start]["role"] != "user":
+				start += 1
+			# forget what can never be sent again so history stays bounded too
+			if start > 0:
+				del s.messages[:start]
+				del s.token_counts[:start]
+			return [{"role": "system", "content": self.system_preamble}] + [dict(m) for m in s.messages]
+
+	def history(self, session_id: str) -> list[dict]:
+		with self._lock:
+			s = self._sessions.get(session_id)
+			return [dict(m) for m in s.messages] if s else []
+
+	def drop(self, session_id: str) -> None:
+		with self._lock:
+			self._sessions.pop(session_id, None)
+		self._notify_evicted(session_id)
+
+	def __len__(self) -> int:
+		return len(self._sessions)
+
+	def __contains__(self, session_id: str) -> bool:
+		return session_id in self._sessions
+
+	def stats(self) -> dict:
+		with self._lock:
+			return {
+				"sessions": len(self._sessions),
+				"evicted": self.evicted,
+				"max_sessions": self.max_sessions,
+			}
+
+	# ---------- helpers ----------
+
+	def _touch(self, session_id: str) -> Session:
+		now = time.time()
+		if now - self._last_sweep > 60:
+			self._evict_idle(now)
+		s = self._sessions.get(session_id)
+		if s is None:
+			s = self._sessions[session_id] = Session()
+			while len(self._sessions) > self.max_sessions:
+				sid, _ = self._sessions.popitem(last=False)
+				self.evicted += 1
+				self._notify_evicted(sid)
+		else:
+			self._sessions.move_to_end(session_id)
+		s.last_used = now
+		return s
+
+	def _evict_idle(self, now: float) -> None:
+		self._last_sweep = now
+		if self.idle_ttl_s <= 0:
+			return
+		while self._sessions:
+			sid, s = next(iter(self._sessions.items()))
+			if now - s.last_used <= self.idle_ttl_s:
+				break
+			self._sessions.popitem(last=False)
+			self.evicted += 1
+			self._notify_evicted(sid)
+
+	def _notify_evicted(self, session_id: str) -> None:
+		if self.on_evict is None:
+			return
+		try:
+			self.on_evict(session_id)
+		except Exception:
+			pass
+
+	def _count(self, text: str) -> int:
+		try:
+			return int(self.count_tokens(text or "")) + self._TEMPLATE_OVERHEAD
+		except Exception:
+			return len((text or "").split()) * 2 + self._TEMPLATE_OVERHEAD
+
+
+__all__ = ["SessionStore", "Session"]
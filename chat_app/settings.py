@@ -3,8 +3,10 @@ from __future__ import annotations
 
 import os
 import json
+import logging
+import threading
 from dataclasses import dataclass, asdict, field
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 
 try:
     import tomllib as toml  # py311+
@@ -20,12 +22,25 @@ except Exception:
 _DEFAULT_PATH = os.path.join("config", "settings.toml")
 _ENV_PREFIX = "VOBA"  # change if you like
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class ModelCfg:
     model_id: str = "NousResearch/Hermes-3-Llama-3.1-8B"
     provider: str = "NousResearch"
     model_name: str = "Hermes-3-Llama-3.1-8B"
+    backend: str = "auto"  # auto | cuda_bnb4 | cpu_fp32 | cpu_int8 | cpu_bf16
+    cpu_threads: int = 0  # 0 = torch default
+    batching: bool = False  # continuous-batching scheduler for concurrent requests
+    max_batch_size: int = 8
+    batch_wait_ms: int = 5
+    prefix_cache: bool = True  # reuse KV of shared system prompts (not with batching)
+    prefix_cache_entries: int = 8
+    session_kv_cache: bool = True  # keep each /chat session's KV between turns (not with batching)
+    session_kv_cache_mb: int = 1024
+    draft_model_id: str = ""  # small model for speculative decoding; empty = off (ignored when batching)
+    num_draft_tokens: int = 5
 
 
 @dataclass
@@ -33,12 +48,24 @@ class EmbeddingsCfg:
     model_id: str = "sentence-transformers/all-MiniLM-L6-v2"
     provider: str = "sentence-transformers"
     model_name: str = "all-MiniLM-L6-v2"
+    query_cache_size: int = 1024  # query vectors kept in memory (LRU); 0 = off
+    query_cache_disk: bool = True  # persist them under paths.cache_dir/npy
+    chunk_cache: bool = True  # reuse chunk vectors by sha1(text) under paths.cache_dir/embeddings
 
 
 @dataclass
 class VectorStoreCfg:
     persist_dir: str = "./chroma_db"
     collection: str = "documents"
+    bm25_backend: str = "inverted"  # or "csr" (numpy + scipy sparse matrices)
+    # BM25 analyzer filters, e.g. ["stopwords_en", "stopwords_pl", "stem_en", "stem_pl", "fold"];
+    # empty = plain lowercase words. Changing it rebuilds the BM25 index from the stored chunks.
+    bm25_analyzer: list[str] = field(default_factory=list)
+    chunk_store_max: int = 100000  # chunk texts kept in memory for hydration; 0 = off
+    chunk_store_preload: bool = False  # fill it from the collection at startup
+    ingest_workers: int = 2  # Docling convert+chunk processes; 0 = old one-file-at-a-time ingest
+    ingest_embed_batch: int = 64  # chunks per embed call, gathered across files
+    ingest_queue: int = 8  # converted files / embedded batches waiting between stages
 
 
 @dataclass
@@ -51,8 +78,7 @@ class DataDirCfg:
 class PathsCfg:
 
     cache_dir: str = "cache"
-    secret_dirs: list[str] = field(default_factory=lambda: [
-                                   "private", "private", "secrets", "secrets", ".ssh", ".ssh"])
+    secret_dirs: list[str] = field(default_factory=lambda: ["private", "secrets", ".ssh"])
     data_dirs: list[DataDirCfg] = field(
         default_factory=lambda: [DataDirCfg(path="./data", recursive=False)])
 
@@ -63,6 +89,31 @@ class AppCfg:
     port: int = 8000
     host: str = "127.0.0.1"
     max_context: int = 3
+    max_sessions: int = 256  # /chat histories kept in memory (LRU)
+    session_idle_s: int = 3600
+    max_prompt_tokens: int = 3072  # history budget per /chat prompt
+    server: str = "threaded"  # serve(): threaded | waitress | flask (dev server)
+    server_threads: int = 32
+    generation_workers: int = 1  # concurrent generate calls (raised to model.max_batch_size when batching)
+    generation_queue: int = 16  # waiting generate calls before 429
+    retrieval_workers: int = 4  # embedding / Chroma / BM25 calls
+    retrieval_queue: int = 64
+    pool_timeout_s: float = 300.0
+
+
+@dataclass
+class GenerationCfg:
+    max_new_tokens: int = 500  # /chat budget and hard cap for every route
+    rag_max_new_tokens: int = 384
+    rag_min_new_tokens: int = 96
+    adaptive_budget: bool = True  # predict the RAG budget from question/context size
+    budget_base_tokens: int = 128
+    budget_per_question_token: float = 1.5
+    budget_per_context_token: float = 0.1
+    chat_stop_strings: list[str] = field(default_factory=list)
+    rag_stop_strings: list[str] = field(default_factory=lambda: [
+                                        "\nQuestion:", "<context>", "</context>"])
+    length_stats_window: int = 2048  # recent replies kept for the length distribution
 
 
 @dataclass
@@ -80,6 +131,7 @@ class Settings:
     embeddings: EmbeddingsCfg = field(default_factory=EmbeddingsCfg)
     vectorstore: VectorStoreCfg = field(default_factory=VectorStoreCfg)
     guardrails: GuardrailsCfg = field(default_factory=GuardrailsCfg)
+    generation: GenerationCfg = field(default_factory=GenerationCfg)
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -89,6 +141,7 @@ class Settings:
             "embeddings": asdict(self.embeddings),
             "vectorstore": asdict(self.vectorstore),
             "guardrails": asdict(self.guardrails),
+            "generation": asdict(self.generation),
         }
 
 
@@ -112,6 +165,8 @@ def _dict_to_settings(d: Dict[str, Any]) -> Settings:
                 norm_dirs.append(DataDirCfg(
                     path=path, recursive=bool(item.get("recursive", False))))
     paths_dict["data_dirs"] = norm_dirs
+    # keep order, drop repeats (older saves doubled the defaults)
+    paths_dict["secret_dirs"] = list(dict.fromkeys(paths_dict.get("secret_dirs") or []))
 
     return Settings(
         app=AppCfg(**get("app", asdict(AppCfg()))),
@@ -120,7 +175,8 @@ def _dict_to_settings(d: Dict[str, Any]) -> Settings:
         embeddings=EmbeddingsCfg(**get("embeddings", asdict(EmbeddingsCfg()))),
         vectorstore=VectorStoreCfg(
             **get("vectorstore", asdict(VectorStoreCfg()))),
-        guardrails=GuardrailsCfg(**get("guardrails", asdict(GuardrailsCfg())))
+        guardrails=GuardrailsCfg(**get("guardrails", asdict(GuardrailsCfg()))),
+        generation=GenerationCfg(**get("generation", asdict(GenerationCfg()))),
     )
 
 
@@ -182,6 +238,91 @@ def save_settings(s: Settings|dict, path: Optional[str] = None) -> None:
 		json_path = os.path.splitext(path)[0] + ".json"
 		with open(json_path, "w", encoding="utf-8") as f:
 			json.dump(data, f, indent=2)
+	_provider.invalidate()
+
+
+class _SettingsProvider:
+	"""
+	Process-wide cached Settings.
+	- get() returns the same Settings object until the config file's mtime
+	  changes or save_settings() is called; then it is reloaded once.
+	- subscribe(fn) registers fn(new_settings), called after every reload.
+	Env overrides are applied at load time; changing env vars needs invalidate().
+	"""
+
+	def __init__(self):
+		self._lock = threading.RLock()  # load_settings() may call save_settings() -> invalidate()
+		self._path: Optional[str] = None
+		self._stamp = None
+		self._settings: Optional[Settings] = None
+		self._subscribers: list[Callable[[Settings], None]] = []
+		self.loads = 0
+
+	def get(self, path: Optional[str] = None) -> Settings:
+		if path is None:
+			path = os.environ.get(f"{_ENV_PREFIX}_CONFIG") or _DEFAULT_PATH
+		stamp = _file_stamp(path)
+		current = self._settings
+		if current is not None and path == self._path and stamp == self._stamp:
+			return current
+		with self._lock:
+			if self._settings is not None and path == self._path and _file_stamp(path) == self._stamp:
+				return self._settings
+			reloaded = self._settings is not None
+			settings = load_settings(path)
+			self._path, self._stamp, self._settings = path, _file_stamp(path), settings
+			self.loads += 1
+			subscribers = list(self._subscribers)
+		if reloaded:
+			for fn in subscribers:
+				try:
+					fn(settings)
+				except Exception:
+					logger.exception("Settings subscriber %r failed", fn)
+		return settings
+
+	def invalidate(self) -> None:
+		with self._lock:
+			self._stamp = None
+
+	def subscribe(self, fn: Callable[[Settings], None]) -> Callable[[], None]:
+		with self._lock:
+			self._subscribers.append(fn)
+
+		def _unsubscribe():
+			with self._lock:
+				if fn in self._subscribers:
+					self._subscribers.remove(fn)
+		return _unsubscribe
+
+
+def _file_stamp(path: str):
+	# (mtime_ns, size) of the file load_settings() would read; None if neither exists
+	json_path = os.path.splitext(path)[0] + ".json"
+	for p in (path, json_path):
+		try:
+			st = os.stat(p)
+		except OSError:
+			continue
+		return (p, st.st_mtime_ns, st.st_size)
+	return None
+
+
+_provider = _SettingsProvider()
+
+
+def get_settings(path: Optional[str] = None) -> Settings:
+	"""
+	Cached load_settings(): cheap enough to call on every request.
+	The returned object is shared, so treat it as read-only; use
+	merge_settings() + save_settings() to change settings.
+	"""
+	return _provider.get(path)
+
+
+def subscribe_settings(fn: Callable[[Settings], None]) -> Callable[[], None]:
+	"""Call fn(new_settings) whenever cached settings are reloaded; returns an unsubscribe function."""
+	return _provider.subscribe(fn)
 
 
 # for later maybe
@@ -204,6 +345,8 @@ def _env_override(d: Dict[str, Any]) -> Dict[str, Any]:
                         "1", "true", "yes", "on")
                 elif isinstance(val, int):
                     out[section][key] = int(raw)
+                elif isinstance(val, float):
+                    out[section][key] = float(raw)
                 else:
                     out[section][key] = raw
     return out
@@ -1,43 +1,473 @@
 # chat_app/sparse_bm25.py
-import json, os, re
-from rank_bm25 import BM25Okapi
+import heapq, json, math, operator, os, threading
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+from .analyzers import Analyzer
+from .bm25_segment import NO_SOURCE, Segment, write_segment
+
+
+class AnalyzerMismatch(RuntimeError):
+	"""The index on disk was tokenized by another analyzer chain; rebuild() it from the chunk texts."""
+
+	def __init__(self, path: str, built_with: str, configured: str):
+		super().__init__(f"BM25 index {path} was built with analyzer {built_with!r}, configured is {configured!r}")
+		self.built_with = built_with
+		self.configured = configured
+
+
+class _RWLock:
+	"""
+	Many readers or one writer. A waiting writer blocks new readers, so
+	searches cannot starve compaction. The writing thread may re-enter (add()
+	compacts, load() migrates) and read while it writes.
+	"""
+
+	def __init__(self):
+		self._cond = threading.Condition(threading.Lock())
+		self._readers = 0
+		self._writer = None			# owning thread ident
+		self._depth = 0
+		self._waiting = 0
+
+	@contextmanager
+	def read(self):
+		me = threading.get_ident()
+		if self._writer == me:
+			yield
+			return
+		with self._cond:
+			while self._writer is not None or self._waiting:
+				self._cond.wait()
+			self._readers += 1
+		try:
+			yield
+		finally:
+			with self._cond:
+				self._readers -= 1
+				if not self._readers:
+					self._cond.notify_all()
+
+	@contextmanager
+	def write(self):
+		me = threading.get_ident()
+		with self._cond:
+			if self._writer != me:
+				self._waiting += 1
+				while self._writer is not None or self._readers:
+					self._cond.wait()
+				self._waiting -= 1
+				self._writer = me
+			self._depth += 1
+		try:
+			yield
+		finally:
+			with self._cond:
+				self._depth -= 1
+				if not self._depth:
+					self._writer = None
+					self._cond.notify_all()
+
 
 class BM25Index:
-	def __init__(self, persist_path: str):
+	"""
+	Okapi BM25 over an inverted index (same scores as rank_bm25.BM25Okapi).
+	- Postings: term -> (doc numbers, term frequencies) in compact arrays.
+	- A query only touches the postings of its own terms; top-k comes from a heap.
+	- add() only appends postings and updates term/length statistics. IDF is
+	  derived from document frequencies at query time; the only corpus-wide
+	  value (BM25Okapi's epsilon floor for negative IDF) is refreshed lazily
+	  on the first query after a batch of adds.
+	- On disk the index is a memory-mapped binary segment (`<name>.seg`, see
+	  bm25_segment.py) plus a JSON-lines journal (`persist_path`) of the changes
+	  made since: {"id", "tokens", "source"} per add, {"op": "delete", "id"} per
+	  delete. Documents 0..N-1 live in the segment, later ones in memory.
+	- delete() tombstones documents: they stop being returned at once but keep
+	  counting in N/df until compact() writes a new segment without them, which
+	  happens automatically once `compact_ratio` of the documents are dead or
+	  the journal holds `merge_docs` documents.
+	- A legacy JSONL-only corpus is migrated to a segment on its first load().
+	- Text is turned into terms by an Analyzer built from `analyzer` (a filter
+	  chain, see analyzers.py); the segment and the journal record which chain
+	  produced them, and load() raises AnalyzerMismatch rather than mixing
+	  terms of two chains.
+	- Thread-safe: searches share a reader/writer lock, changes (and the
+	  segment swap in compact()) take it exclusively, so no search ever sees a
+	  closed segment.
+	"""
+
+	def __init__(
+		self,
+		persist_path: str,
+		k1: float = 1.5,
+		b: float = 0.75,
+		epsilon: float = 0.25,
+		compact_ratio: float = 0.25,
+		merge_docs: int = 20000,
+		analyzer: Optional[list[str]] = None,
+	):
 		self.persist_path = persist_path
-		self.docs = []		# token lists
-		self.ids = []		# aligned with docs
-		self._bm = None
+		self.analyzer = analyzer if isinstance(analyzer, Analyzer) else Analyzer(analyzer)
+		self.segment_path = os.path.splitext(persist_path)[0] + ".seg"
+		self.k1, self.b, self.epsilon = k1, b, epsilon
+		self.compact_ratio = compact_ratio
+		self.merge_docs = merge_docs
+		self._lock = _RWLock()
+		self._reset()
+
+	def _reset(self) -> None:
+		self._seg = None			# Segment holding doc numbers 0.._base-1
+		self._base = 0
+		self.ids = []				# journal doc number - _base -> chunk id
+		self._doc_of = {}			# live journal chunk id -> doc number
+		self._dead = set()			# tombstoned doc numbers (segment or journal)
+		self._source_docs = {}		# source file -> journal doc numbers
+		self.doc_len = array("I")	# journal doc number - _base -> token count
+		self._postings = {}			# term -> (array docs, array tfs, segment term index or None)
+		self._total_len = 0
+		self._n_terms = 0			# distinct terms across segment and journal
+		self._df_hist = Counter()	# document frequency -> number of terms with it
+		self._idf_floor = 0.0
+		self._stale = False			# _idf_floor needs a refresh after add()
 
 	def _tok(self, text: str):
-		return re.findall(r"\w+", (text or "").lower())
+		return self.analyzer(text)
+
+	def __len__(self) -> int:
+		with self._lock.read():
+			return self._base + len(self.ids) - len(self._dead)
 
-	def add(self, ids: list[str], texts: list[str]) -> None:
+	def __contains__(self, _id: str) -> bool:
+		with self._lock.read():
+			return self._find(_id) is not None
+
+	def add(self, ids: list[str], texts: list[str], sources: Optional[list[str]] = None) -> None:
+		"""Index chunks; an id that is already present is replaced."""
 		toks = [self._tok(t) for t in texts]
-		self.ids.extend(ids)
-		self.docs.extend(toks)
-		self._bm = BM25Okapi(self.docs)
-		os.makedirs(os.path.dirname(self.persist_path), exist_ok=True)
-		with open(self.persist_path, "a", encoding="utf-8") as f:
-			for _id, tok in zip(ids, toks):
-				f.write(json.dumps({"id": _id, "tokens": tok}, ensure_ascii=False) + "\n")
+		sources = sources or [None] * len(ids)
+		recs = []
+		for _id, tok, src in zip(ids, toks, sources):
+			rec = {"id": _id, "tokens": tok}
+			if src is not None:
+				rec["source"] = src
+			recs.append(rec)
+		with self._lock.write():
+			self._index(ids, toks, sources)
+			self._append(recs)
+			self._maybe_compact()	# replaced ids leave tombstones too
+
+	def delete(self, ids: list[str]) -> int:
+		"""Tombstone chunks by id; returns how many were live."""
+		with self._lock.write():
+			gone = [_id for _id in ids if self._tombstone(_id)]
+			if gone:
+				self._append({"op": "delete", "id": _id} for _id in gone)
+				self._maybe_compact()
+			return len(gone)
+
+	def delete_source(self, source: str) -> int:
+		"""Tombstone every chunk indexed with this source file."""
+		with self._lock.write():
+			docs = [d for d in self._source_docs.get(source) or [] if d not in self._dead]
+			if self._seg is not None:
+				s = self._seg.source_index(source)
+				if s is not None:
+					docs += [d for d in self._seg.source_docs(s) if d not in self._dead]
+			return self.delete([self._id(d) for d in docs])
+
+	def compact(self) -> None:
+		"""Write live documents to a new segment, empty the journal and reload."""
+		with self._lock.write():
+			if self._seg is None and not self.ids:
+				return
+			new_seg = self.segment_path + ".new"
+			try:
+				write_segment(new_seg, self._live_docs(), self._merged_terms(), self._live_total_len(),
+							  analyzer=self.analyzer.name)
+			except BaseException:
+				if os.path.exists(new_seg):
+					os.remove(new_seg)
+				raise
+			self.close()
+			os.replace(new_seg, self.segment_path)
+			open(self.persist_path, "w", encoding="utf-8").close()
+			self.load()
 
 	def load(self) -> None:
-		if not os.path.exists(self.persist_path):
+		with self._lock.write():
+			self._load()
+
+	def rebuild(self, ids: list[str], texts: list[str], sources: Optional[list[str]] = None) -> None:
+		"""Replace the whole index with these chunks, tokenized by the configured analyzer."""
+		toks = [self._tok(t) for t in texts]
+		with self._lock.write():
+			self.close()
+			self._reset()
+			self._index(ids, toks, sources)
+			if self.ids:
+				self.compact()		# new segment + empty journal, swapped in atomically
+				return
+			for path in (self.segment_path, self.persist_path):
+				if os.path.exists(path):
+					os.remove(path)
+
+	def _load(self) -> None:
+		has_seg = os.path.exists(self.segment_path)
+		if not has_seg and not os.path.exists(self.persist_path):
 			return
-		self.docs, self.ids = [], []
-		with open(self.persist_path, "r", encoding="utf-8") as f:
-			for line in f:
-				rec = json.loads(line)
-				self.ids.append(rec["id"])
-				self.docs.append(rec["tokens"])
-		if self.docs:
-			self._bm = BM25Okapi(self.docs)
+		self.close()
+		self._reset()
+		if has_seg:
+			self._open_segment()
+		if os.path.exists(self.persist_path):
+			journal_analyzer = None
+			for rec in self._records():
+				op = rec.get("op")
+				if op == "analyzer":
+					journal_analyzer = rec["name"]
+					self._check_analyzer(journal_analyzer)
+				elif op == "delete":
+					self._tombstone(rec["id"])
+				else:
+					self._index([rec["id"]], [rec["tokens"]], [rec.get("source")])
+			if not has_seg and self.ids and journal_analyzer is None:
+				self._check_analyzer("simple")		# legacy journal, from before analyzers
+		if not has_seg and self.ids:
+			self.compact()		# migrate a JSONL-only corpus to the binary format
+
+	def close(self) -> None:
+		"""Unmap the segment (needed before it can be replaced on Windows)."""
+		with self._lock.write():
+			if self._seg is not None:
+				self._seg.close()
+				self._seg = None
+
+	def stats(self) -> dict:
+		with self._lock.read():
+			return self._stats()
+
+	def _stats(self) -> dict:
+		sources = {s for s, docs in self._source_docs.items() if any(d not in self._dead for d in docs)}
+		if self._seg is not None:
+			seg = self._seg
+			sources.update(seg.source(s) for s in range(seg.n_sources)
+						   if any(d not in self._dead for d in seg.source_docs(s)))
+		return {
+			"docs": self._base + len(self.ids) - len(self._dead),	# not len(self): the read lock is not re-entrant
+			"deleted": len(self._dead),
+			"terms": self._n_terms,
+			"sources": len(sources),
+			"segment_docs": self._base,
+			"journal_docs": len(self.ids),
+			"postings": sum(len(p[0]) for p in self._postings.values())
+						+ (self._seg.meta["n_postings"] if self._seg is not None else 0),
+			"analyzer": self.analyzer.name,
+		}
 
 	def search(self, query: str, top_k: int = 20) -> list[tuple[str, float]]:
-		if not self._bm:
+		with self._lock.read():
+			return self._search(query, top_k)
+
+	def search_batch(self, queries: list[str], top_k: int = 20) -> list[list[tuple[str, float]]]:
+		with self._lock.read():
+			return self._search_batch(queries, top_k)
+
+	def _search(self, query: str, top_k: int) -> list[tuple[str, float]]:
+		n = self._base + len(self.ids)
+		if not n or top_k <= 0:
 			return []
-		q = self._tok(query)
-		scores = self._bm.get_scores(q)
-		ranked = sorted(zip(self.ids, scores), key=lambda x: x[1], reverse=True)
-		return ranked[:top_k]
+		if self._stale:
+			self._refresh_idf_floor()
+		acc = {}
+		# k1 * (1 - b + b * dl / avgdl) = c0 + c1 * dl, from the current average length
+		avgdl = self._total_len / n or 1.0
+		c0, c1 = self.k1 * (1 - self.b), self.k1 * self.b / avgdl
+		seg, base = self._seg, self._base
+		for term, qtf in Counter(self._tok(query)).items():
+			posting = self._postings.get(term)
+			t = posting[2] if posting is not None else (seg.term_index(term) if seg is not None else None)
+			df = (seg.df(t) if t is not None else 0) + (len(posting[0]) if posting is not None else 0)
+			if not df:
+				continue
+			w = self._idf(df) * qtf * (self.k1 + 1)
+			if t is not None:
+				docs, tfs = seg.postings(t)
+				dl = seg.doc_len
+				for d, tf in zip(docs, tfs):
+					acc[d] = acc.get(d, 0.0) + w * tf / (tf + c0 + c1 * dl[d])
+			if posting is not None:
+				docs, tfs, _ = posting
+				dl = self.doc_len
+				for d, tf in zip(docs, tfs):
+					acc[d] = acc.get(d, 0.0) + w * tf / (tf + c0 + c1 * dl[d - base])
+		dead = self._dead
+		live = ((d, s) for d, s in acc.items() if d not in dead) if dead else acc.items()
+		best = heapq.nlargest(top_k, live, key=lambda kv: kv[1])
+		return [(self._id(d), s) for d, s in best]
+
+	def _search_batch(self, queries: list[str], top_k: int) -> list[list[tuple[str, float]]]:
+		return [self._search(q, top_k) for q in queries]
+
+	# ---------- helpers ----------
+
+	def _records(self):
+		with open(self.persist_path, "r", encoding="utf-8") as f:
+			for line in f:
+				if line.strip():
+					yield json.loads(line)
+
+	def _append(self, recs) -> None:
+		os.makedirs(os.path.dirname(self.persist_path), exist_ok=True)
+		with open(self.persist_path, "a", encoding="utf-8") as f:
+			if not f.tell():		# a fresh journal says which analyzer made its tokens
+				f.write(json.dumps({"op": "analyzer", "name": self.analyzer.name}) + "\n")
+			for rec in recs:
+				f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+	def _check_analyzer(self, built_with: str) -> None:
+		if built_with != self.analyzer.name:
+			self.close()
+			self._reset()
+			raise AnalyzerMismatch(self.persist_path, built_with, self.analyzer.name)
+
+	def _open_segment(self) -> None:
+		seg = self._seg = Segment(self.segment_path)
+		self._check_analyzer(seg.meta.get("analyzer", "simple"))
+		self._base = seg.n_docs
+		self._total_len = seg.total_len
+		self._n_terms = seg.n_terms
+		off = seg.post_off
+		self._df_hist = Counter(map(operator.sub, off[1:], off[:-1]))
+		self._stale = True
+
+	def _id(self, d: int) -> str:
+		return self._seg.doc_id(d) if d < self._base else self.ids[d - self._base]
+
+	def _find(self, _id: str) -> Optional[int]:
+		"""Live doc number of a chunk id, journal first."""
+		d = self._doc_of.get(_id)
+		if d is None and self._seg is not None:
+			d = self._seg.find_doc(_id)
+		return None if d is None or d in self._dead else d
+
+	def _tombstone(self, _id: str) -> bool:
+		d = self._find(_id)
+		if d is None:
+			return False
+		self._doc_of.pop(_id, None)
+		self._dead.add(d)
+		return True
+
+	def _maybe_compact(self) -> None:
+		n = self._base + len(self.ids)
+		if self.compact_ratio and len(self._dead) >= max(1, self.compact_ratio * n):
+			self.compact()
+		elif self.merge_docs and len(self.ids) >= self.merge_docs:
+			self.compact()
+
+	def _index(self, ids: list[str], toks: list[list[str]], sources: Optional[list] = None) -> None:
+		seg = self._seg
+		for _id, tok, src in zip(ids, toks, sources or [None] * len(ids)):
+			self._tombstone(_id)
+			d = self._base + len(self.ids)
+			self.ids.append(_id)
+			self._doc_of[_id] = d
+			if src is not None:
+				self._source_docs.setdefault(src, []).append(d)
+			self.doc_len.append(len(tok))
+			self._total_len += len(tok)
+			for term, tf in Counter(tok).items():
+				posting = self._postings.get(term)
+				if posting is None:
+					t = seg.term_index(term) if seg is not None else None
+					posting = self._postings[term] = (array("I"), array("I"), t)
+					old = seg.df(t) if t is not None else 0
+					if not old:
+						self._n_terms += 1
+				else:
+					old = len(posting[0]) + (seg.df(posting[2]) if posting[2] is not None else 0)
+				if old:
+					self._df_hist[old] -= 1
+					if not self._df_hist[old]:
+						del self._df_hist[old]
+				self._df_hist[old + 1] += 1
+				posting[0].append(d)
+				posting[1].append(tf)
+		self._stale = True
+
+	def _live_docs(self) -> list[tuple[str, int, Optional[str]]]:
+		out, dead, seg = [], self._dead, self._seg
+		if seg is not None:
+			names = {}
+			for d in range(self._base):
+				if d in dead:
+					continue
+				s = seg.doc_src[d]
+				if s != NO_SOURCE and s not in names:
+					names[s] = seg.source(s)
+				out.append((seg.doc_id(d), seg.doc_len[d], names.get(s)))
+		src_of = {d: s for s, docs in self._source_docs.items() for d in docs}
+		for i, _id in enumerate(self.ids):
+			d = self._base + i
+			if d not in dead:
+				out.append((_id, self.doc_len[i], src_of.get(d)))
+		return out
+
+	def _live_total_len(self) -> int:
+		dead_len = sum(self.doc_len[d - self._base] if d >= self._base else self._seg.doc_len[d] for d in self._dead)
+		return self._total_len - dead_len
+
+	def _merged_terms(self):
+		"""(term, postings pieces) for compact(), in segment (utf-8 byte) order, renumbered past the dead."""
+		seg, dead = self._seg, self._dead
+		remap = None
+		if dead:
+			remap, new = array("I"), 0
+			for d in range(self._base + len(self.ids)):
+				if d in dead:
+					remap.append(0xFFFFFFFF)
+				else:
+					remap.append(new)
+					new += 1
+
+		def pieces(docs, tfs):
+			if remap is None:
+				return docs, tfs
+			keep = [i for i, d in enumerate(docs) if remap[d] != 0xFFFFFFFF]
+			return array("I", (remap[docs[i]] for i in keep)), array("I", (tfs[i] for i in keep))
+
+		journal = sorted(self._postings, key=lambda t: t.encode("utf-8"))
+		j, n_seg = 0, seg.n_terms if seg is not None else 0
+		for t in range(n_seg):
+			term = seg.term(t)
+			key = term.encode("utf-8")
+			while j < len(journal) and journal[j].encode("utf-8") < key:
+				docs, tfs, _ = self._postings[journal[j]]
+				yield journal[j], [pieces(docs, tfs)]
+				j += 1
+			out = [pieces(*seg.postings(t))]
+			if j < len(journal) and journal[j] == term:
+				docs, tfs, _ = self._postings[term]
+				out.append(pieces(docs, tfs))
+				j += 1
+			yield term, out
+		for term in journal[j:]:
+			docs, tfs, _ = self._postings[term]
+			yield term, [pieces(docs, tfs)]
+
+	def _raw_idf(self, df: int) -> float:
+		n = self._base + len(self.ids)
+		return math.log(n - df + 0.5) - math.log(df + 0.5)
+
+	def _idf(self, df: int) -> float:
+		v = self._raw_idf(df)
+		return v if v >= 0 else self._idf_floor
+
+	def _refresh_idf_floor(self) -> None:
+		"""BM25Okapi replaces negative IDF with epsilon * mean IDF over the vocabulary."""
+		# terms sharing a document frequency share an IDF, so sum per distinct df
+		total = sum(self._raw_idf(df) * count for df, count in self._df_hist.items())
+		self._idf_floor = self.epsilon * total / self._n_terms if self._n_terms else 0.0
+		self._stale = False
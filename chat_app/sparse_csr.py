@@ -0,0 +1,141 @@
+# chat_app/sparse_csr.py
+import threading
+from collections import Counter
+from typing import Optional
+
+try:
+	import numpy as np
+	from scipy import sparse
+except ImportError:		# optional: only this backend needs them
+	np = sparse = None
+
+from .sparse_bm25 import BM25Index
+
+class CSRBM25Index(BM25Index):
+	"""
+	BM25Index that scores with sparse linear algebra (numpy + scipy).
+	- The docs x terms matrix holds each posting's BM25 term weight
+	  tf / (tf + k1 * (1 - b + b * dl / avgdl)); a query is a terms vector of
+	  idf * qtf * (k1 + 1), so scores are one sparse matrix-vector product.
+	- search_batch() stacks many queries into one sparse matrix-matrix product
+	  (evaluation runs); top-k per query comes from argpartition.
+	- Storage, journal, deletes and compaction are BM25Index's. The matrix is
+	  built lazily from the segment + journal postings and rebuilt after add(),
+	  so this suits read-mostly, mid-sized corpora.
+	"""
+
+	def __init__(self, persist_path: str, *args, **kwargs):
+		if np is None:
+			raise ImportError("the csr BM25 backend needs numpy and scipy (pip install numpy scipy)")
+		self._matrix = None			# csr_matrix docs x columns, built on demand
+		self._extra_cols = {}		# journal-only term -> column (after the segment's terms)
+		self._dead_mask = None
+		self._build_lock = threading.Lock()		# concurrent searches build the matrix once
+		super().__init__(persist_path, *args, **kwargs)
+
+	def close(self) -> None:
+		with self._lock.write():
+			self._matrix = None
+			super().close()
+
+	def _search(self, query: str, top_k: int) -> list[tuple[str, float]]:
+		return self._search_batch([query], top_k)[0]
+
+	def _search_batch(self, queries: list[str], top_k: int) -> list[list[tuple[str, float]]]:
+		n = self._base + len(self.ids)
+		if not n or top_k <= 0:
+			return [[] for _ in queries]
+		if self._stale:
+			self._refresh_idf_floor()
+		with self._build_lock:
+			m = self._build_matrix()
+			if self._dead_mask is None:
+				dead_mask = np.zeros(n, dtype=bool)
+				if self._dead:
+					dead_mask[np.fromiter(self._dead, dtype=np.int64, count=len(self._dead))] = True
+				self._dead_mask = dead_mask
+
+		rows, cols, vals = [], [], []
+		for j, query in enumerate(queries):
+			for term, qtf in Counter(self._tok(query)).items():
+				col, df = self._column(term)
+				if col is None:
+					continue
+				rows.append(col)
+				cols.append(j)
+				vals.append(self._idf(df) * qtf * (self.k1 + 1))
+		q = sparse.csc_matrix((vals, (rows, cols)), shape=(m.shape[1], len(queries)))
+		scores = (m @ q).tocsc()
+
+		out = []
+		for j in range(len(queries)):
+			lo, hi = scores.indptr[j], scores.indptr[j + 1]
+			docs, s = scores.indices[lo:hi], scores.data[lo:hi]
+			if self._dead:
+				keep = ~self._dead_mask[docs]
+				docs, s = docs[keep], s[keep]
+			if len(s) > top_k:
+				part = np.argpartition(-s, top_k - 1)[:top_k]
+				docs, s = docs[part], s[part]
+			order = np.argsort(-s, kind="stable")
+			out.append([(self._id(int(docs[i])), float(s[i])) for i in order])
+		return out
+
+	# ---------- helpers ----------
+
+	def _index(self, ids: list[str], toks: list[list[str]], sources: Optional[list] = None) -> None:
+		super()._index(ids, toks, sources)
+		self._matrix = None
+		self._dead_mask = None
+
+	def _tombstone(self, _id: str) -> bool:
+		gone = super()._tombstone(_id)
+		if gone:
+			self._dead_mask = None
+		return gone
+
+	def _column(self, term: str):
+		"""(matrix column, document frequency) of a term, or (None, 0)."""
+		seg = self._seg
+		posting = self._postings.get(term)
+		t = posting[2] if posting is not None else (seg.term_index(term) if seg is not None else None)
+		df = (seg.df(t) if t is not None else 0) + (len(posting[0]) if posting is not None else 0)
+		if not df:
+			return None, 0
+		return (t if t is not None else self._extra_cols[term]), df
+
+	def _build_matrix(self):
+		if self._matrix is not None:
+			return self._matrix
+		seg, n = self._seg, self._base + len(self.ids)
+		n_seg_terms = seg.n_terms if seg is not None else 0
+		rows, cols, tfs = [], [], []
+		if seg is not None and seg.n_terms:
+			off = np.frombuffer(seg.post_off, dtype=np.uint64).astype(np.int64)
+			rows.append(np.frombuffer(seg.post_docs, dtype=np.uint32).astype(np.int64))
+			cols.append(np.repeat(np.arange(n_seg_terms, dtype=np.int64), np.diff(off)))
+			tfs.append(np.frombuffer(seg.post_tfs, dtype=np.uint32).astype(np.float64))
+			del off
+		extra = {}
+		for term, (docs, term_tfs, t) in self._postings.items():
+			if t is None:
+				t = extra[term] = n_seg_terms + len(extra)
+			rows.append(np.frombuffer(docs, dtype=np.uint32).astype(np.int64))
+			cols.append(np.full(len(docs), t, dtype=np.int64))
+			tfs.append(np.frombuffer(term_tfs, dtype=np.uint32).astype(np.float64))
+		dl = np.frombuffer(self.doc_len, dtype=np.uint32).astype(np.float64)
+		if seg is not None:
+			dl = np.concatenate([np.frombuffer(seg.doc_len, dtype=np.uint32).astype(np.float64), dl])
+		r = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+		c = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+		tf = np.concatenate(tfs) if tfs else np.zeros(0)
+		# same c0 + c1 * dl form as BM25Index.search, so scores agree to the last bits
+		avgdl = self._total_len / n or 1.0
+		c0, c1 = self.k1 * (1 - self.b), self.k1 * self.b / avgdl
+		w = tf / (tf + c0 + c1 * dl[r])
+		self._extra_cols = extra
+		self._matrix = sparse.csr_matrix((w, (r, c)), shape=(n, n_seg_terms + len(extra)))
+		return self._matrix
+
+
+__all__ = ["CSRBM25Index"]
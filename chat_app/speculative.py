@@ -0,0 +1,147 @@
+# chat_app/speculative.py
+import time
+from dataclasses import dataclass, asdict
+from typing import Callable, Optional
+
+import torch
+
+from .kv_cache import new_cache, _crop, _seq_length
+
+
+@dataclass
+class SpeculativeStats:
+	new_tokens: int = 0
+	proposed: int = 0
+	accepted: int = 0
+	target_passes: int = 0
+	draft_passes: int = 0
+	target_s: float = 0.0
+	draft_s: float = 0.0
+	elapsed_s: float = 0.0
+
+	@property
+	def acceptance_rate(self) -> float:
+		return self.accepted / self.proposed if self.proposed else 0.0
+
+	@property
+	def est_speedup(self) -> float:
+		# Plain decoding would need one target pass per token; a verify pass over
+		# k+1 tokens costs about the same as a 1-token decode step.
+		if not self.target_passes or not self.elapsed_s:
+			return 0.0
+		per_pass = self.target_s / self.target_passes
+		return (self.new_tokens * per_pass) / self.elapsed_s
+
+	def to_dict(self) -> dict:
+		out = asdict(self)
+		out.update(
+			acceptance_rate=round(self.acceptance_rate, 4),
+			tokens_per_target_pass=round(self.new_tokens / self.target_passes, 3) if self.target_passes else 0.0,
+			est_speedup=round(self.est_speedup, 3),
+			tokens_per_s=round(self.new_tokens / self.elapsed_s, 2) if self.elapsed_s else 0.0,
+		)
+		for k in ("target_s", "draft_s", "elapsed_s"):
+			out[k] = round(out[k], 4)
+		return out
+
+
+class SpeculativeDecoder:
+	"""
+	Greedy speculative decoding for a single sequence.
+	- The draft model proposes `num_draft_tokens` tokens one by one.
+	- The target model scores all of them in one forward pass; the longest
+	  prefix that matches its own greedy choice is kept, plus the target's
+	  token at the first mismatch (or a bonus token when all are accepted).
+	- Both KV caches are cropped back to the accepted sequence, so the
+	  output is identical to plain greedy decoding with the target model.
+	"""
+
+	def __init__(self, target, draft, num_draft_tokens: int = 5):
+		self.target = target
+		self.draft = draft
+		self.num_draft_tokens = max(1, int(num_draft_tokens))
+
+	@torch.inference_mode()
+	def generate(
+		self,
+		input_ids: torch.Tensor,
+		max_new_tokens: int = 500,
+		eos_token_id: Optional[int] = None,
+		past_key_values=None,
+		streamer=None,
+		stop: Optional[Callable[[], bool]] = None,
+	):
+		"""
+		input_ids: [1, T] prompt. `past_key_values` may already cover a prefix of it
+		(prefix/session caches); it is extended in place. `stop()` is checked before
+		each draft/verify round; True ends generation early.
+		Returns (sequences, stats, past).
+		"""
+		t_start = time.perf_counter()
+		stats = SpeculativeStats()
+		seq = input_ids
+		t_cache = past_key_values if past_key_values is not None else new_cache()
+		d_cache = new_cache()
+		if streamer is not None:
+			streamer.put(input_ids.cpu())
+
+		while stats.new_tokens < max_new_tokens and not (stop is not None and stop()):
+			k = min(self.num_draft_tokens, max_new_tokens - stats.new_tokens)
+			base_len = seq.shape[-1]
+
+			# 1) draft proposes k tokens greedily
+			t0 = time.perf_counter()
+			proposals = []
+			inp = seq[:, _seq_length(d_cache):]
+			for _ in range(k):
+				out = self.draft(input_ids=inp, past_key_values=d_cache, use_cache=True)
+				d_cache = out.past_key_values
+				tok = out.logits[:, -1, :].argmax(dim=-1, keepdim=True)
+				proposals.append(tok)
+				inp = tok
+			stats.draft_passes += k
+			stats.draft_s += time.perf_counter() - t0
+			proposed = torch.cat(proposals, dim=-1)
+
+			# 2) target verifies the uncached tail + all proposals in one pass
+			t0 = time.perf_counter()
+			verify = torch.cat([seq[:, _seq_length(t_cache):], proposed], dim=-1)
+			out = self.target(input_ids=verify, past_key_values=t_cache, use_cache=True)
+			t_cache = out.past_key_values
+			stats.target_passes += 1
+			stats.target_s += time.perf_counter() - t0
+			first = verify.shape[-1] - k - 1
+			choice = out.logits[0, first:, :].argmax(dim=-1)	# k+1 greedy picks
+
+			accepted = 0
+			while accepted < k and int(proposed[0, accepted]) == int(choice[accepted]):
+				accepted += 1
+			new = torch.cat([proposed[0, :accepted], choice[accepted:accepted + 1]])
+			stats.proposed += k
+			stats.accepted += accepted
+
+			# 3) stop at EOS / budget, extend the sequence, drop rejected KV
+			finished = False
+			if eos_token_id is not None:
+				hits = (new == eos_token_id).nonzero()
+				if hits.numel():
+					new = new[: int(hits[0].item()) + 1]
+					finished = True
+			new = new[: max_new_tokens - stats.new_tokens]
+			seq = torch.cat([seq, new.unsqueeze(0).to(seq.device)], dim=-1)
+			stats.new_tokens += int(new.numel())
+			if streamer is not None:
+				streamer.put(new.cpu())
+
+			t_cache = _crop(t_cache, seq.shape[-1] - 1)
+			d_cache = _crop(d_cache, min(base_len + min(accepted, k - 1), seq.shape[-1] - 1))
+			if finished:
+				break
+
+		if streamer is not None:
+			streamer.end()
+		stats.elapsed_s = time.perf_counter() - t_start
+		return seq, stats, t_cache
+
+
+__all__ = ["SpeculativeDecoder", "SpeculativeStats"]
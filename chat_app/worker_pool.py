@@ -0,0 +1,113 @@
+# chat_app/worker_pool.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+
+class Overloaded(RuntimeError):
+	"""Raised when a pool has no free worker or queue slot; routes answer 429."""
+
+	def __init__(self, pool: str, retry_after_s: int = 1):
+		super().__init__(f"{pool} pool is at capacity")
+		self.pool = pool
+		self.retry_after_s = retry_after_s
+
+
+class WorkerPool:
+	"""
+	Bounded executor for blocking model work (embedding, Chroma, BM25, generation).
+	- At most `max_workers` calls run at once; up to `max_queue` more may wait.
+	- Anything beyond that is rejected immediately with Overloaded instead of
+	  piling up request threads, so clients get back-pressure (429) early.
+	- reserve() holds a slot without using the executor, for work that already
+	  runs on its own thread (streamed generation).
+	"""
+
+	def __init__(self, name: str, max_workers: int = 1, max_queue: int = 8, timeout_s: float = 120.0):
+		self.name = name
+		self.max_workers = max(1, int(max_workers))
+		self.max_queue = max(0, int(max_queue))
+		self.timeout_s = float(timeout_s) if timeout_s else None
+		self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{name}-pool")
+		self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+		self._lock = threading.Lock()
+		self._running = 0
+		self._in_flight = 0
+		self.stats = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "timeouts": 0,
+					  "max_in_flight": 0, "queue_wait_s": 0.0, "run_s": 0.0}
+
+	def run(self, fn, *args, **kwargs):
+		"""Run fn on the pool and wait for its result (raises Overloaded when full)."""
+		self._acquire()
+		submitted = time.perf_counter()
+
+		def _call():
+			started = time.perf_counter()
+			with self._lock:
+				self._running += 1
+				self.stats["queue_wait_s"] += started - submitted
+			try:
+				return fn(*args, **kwargs)
+			finally:
+				with self._lock:
+					self._running -= 1
+					self.stats["run_s"] += time.perf_counter() - started
+
+		try:
+			future = self._executor.submit(_call)
+		except Exception:
+			self._release(ok=False)
+			raise
+		future.add_done_callback(lambda f: self._release(ok=f.exception() is None))
+		try:
+			return future.result(timeout=self.timeout_s)
+		except FutureTimeout:
+			with self._lock:
+				self.stats["timeouts"] += 1
+			raise TimeoutError(f"{self.name} pool call timed out after {self.timeout_s}s")
+
+	def reserve(self):
+		"""
+		Take one slot now (raises Overloaded when full) and return a release()
+		callable; for work that runs on its own thread, e.g. streamed generation.
+		"""
+		self._acquire()
+		released = threading.Event()
+
+		def release(ok: bool = True):
+			if not released.is_set():
+				released.set()
+				self._release(ok=ok)
+		return release
+
+	def snapshot(self) -> dict:
+		with self._lock:
+			return dict(
+				self.stats,
+				in_flight=self._in_flight,
+				running=self._running,
+				max_workers=self.max_workers,
+				max_queue=self.max_queue,
+			)
+
+	def shutdown(self, wait: bool = True) -> None:
+		self._executor.shutdown(wait=wait)
+
+	def _acquire(self) -> None:
+		if not self._slots.acquire(blocking=False):
+			with self._lock:
+				self.stats["rejected"] += 1
+			raise Overloaded(self.name)
+		with self._lock:
+			self._in_flight += 1
+			self.stats["submitted"] += 1
+			self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+
+	def _release(self, ok: bool) -> None:
+		with self._lock:
+			self._in_flight -= 1
+			self.stats["completed" if ok else "failed"] += 1
+		self._slots.release()
+
+
+__all__ = ["WorkerPool", "Overloaded"]
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+from chat_app.analyzers import Analyzer, fold_ascii, stem_en, stem_pl
+from chat_app.sparse_bm25 import AnalyzerMismatch, BM25Index
+
+
+class TestAnalyzer(unittest.TestCase):
+	def test_empty_chain_is_plain_tokenizer(self):
+		self.assertEqual(Analyzer()("The Linux kernel, v6!"), ["the", "linux", "kernel", "v6"])
+
+	def test_stopwords(self):
+		a = Analyzer(["stopwords_en", "stopwords_pl"])
+		self.assertEqual(a("what is the kernel"), ["kernel"])
+		self.assertEqual(a("to jest jądro systemu"), ["jądro", "systemu"])
+
+	def test_english_stemming_conflates_inflections(self):
+		for words in (("license", "licensed", "licenses"), ("program", "programs"),
+					  ("run", "running"), ("study", "studies"), ("box", "boxes")):
+			self.assertEqual(len({stem_en(w) for w in words}), 1, words)
+		self.assertEqual(stem_en("class"), "class")
+		self.assertEqual(stem_en("is"), "is")
+
+	def test_polish_stemming_and_folding(self):
+		self.assertEqual(len({stem_pl(w) for w in ("uczelnia", "uczelni", "uczelnią", "uczelniami")}), 1)
+		self.assertEqual(fold_ascii("zażółć gęślą jaźń"), "zazolc gesla jazn")
+		a = Analyzer(["stem_pl", "fold"])
+		self.assertEqual(a("Poznaniu"), a("poznania"))
+		self.assertEqual(a("Łódź"), ["lodz"])
+
+	def test_both_stemmers_pick_by_language(self):
+		a = Analyzer(["stem_en", "stem_pl"])
+		self.assertEqual(a("computers politycznym"), ["computer", "polityczn"])
+
+	def test_char_ngrams(self):
+		self.assertEqual(Analyzer(["ngram3"])("linux ab"), ["^li", "lin", "inu", "nux", "ux$", "ab"])
+
+	def test_unknown_filter_raises(self):
+		with self.assertRaises(ValueError):
+			Analyzer(["stem_de"])
+
+
+class TestBM25WithAnalyzer(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="bm25_analyzer_test_")
+		self.path = os.path.join(self.tmp, "bm25_corpus.jsonl")
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def test_inflected_query_matches_and_postings_shrink(self):
+		texts = ["The kernel is licensed under the GPL", "Polskie uczelnie techniczne w Poznaniu"]
+		plain = BM25Index(self.path)
+		plain.add(["a", "b"], texts)
+		chain = ["stopwords_en", "stopwords_pl", "stem_en", "stem_pl", "fold"]
+		stemmed = BM25Index(os.path.join(self.tmp, "stemmed.jsonl"), analyzer=chain)
+		stemmed.add(["a", "b"], texts)
+		self.assertEqual(plain.search("licenses", top_k=1), [])
+		self.assertEqual(stemmed.search("licenses", top_k=1)[0][0], "a")
+		self.assertEqual(stemmed.search("uczelnia poznan", top_k=1)[0][0], "b")
+		self.assertLess(stemmed.stats()["postings"], plain.stats()["postings"])
+
+	def test_segment_records_analyzer(self):
+		index = BM25Index(self.path, analyzer=["stem_en"])
+		index.add(["a"], ["running programs"])
+		index.compact()
+		self.assertEqual(index._seg.meta["analyzer"], "stem_en")
+		reloaded = BM25Index(self.path, analyzer=["stem_en"])
+		reloaded.load()
+		self.assertEqual(reloaded.search("program run", top_k=1)[0][0], "a")
+		index.close()
+		reloaded.close()
+
+	def test_other_analyzer_refuses_segment_until_rebuilt(self):
+		index = BM25Index(self.path, analyzer=["stem_en"])
+		index.add(["a"], ["running programs"], sources=["a.md"])
+		index.compact()
+		index.add(["b"], ["compiled kernels"])
+		index.close()
+		plain = BM25Index(self.path)
+		with self.assertRaises(AnalyzerMismatch) as ctx:
+			plain.load()
+		self.assertEqual((ctx.exception.built_with, ctx.exception.configured), ("stem_en", "simple"))
+		self.assertEqual(len(plain), 0)
+
+		plain.rebuild(["a", "b"], ["running programs", "compiled kernels"], sources=["a.md", None])
+		self.assertEqual(plain.search("running", top_k=1)[0][0], "a")
+		reloaded = BM25Index(self.path)
+		reloaded.load()
+		self.assertEqual(reloaded._seg.meta["analyzer"], "simple")
+		self.assertEqual(reloaded.stats()["sources"], 1)
+		plain.close()
+		reloaded.close()
+
+	def test_journal_records_its_analyzer(self):
+		index = BM25Index(self.path, analyzer=["stem_en"])
+		index.add(["a"], ["running programs"])
+		with self.assertRaises(AnalyzerMismatch):
+			BM25Index(self.path).load()
+		same = BM25Index(self.path, analyzer=["stem_en"])
+		same.load()
+		self.assertEqual(same.search("run", top_k=1)[0][0], "a")
+		same.close()
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,76 @@
+import threading
+import unittest
+from unittest import mock
+import torch
+from transformers import LlamaConfig, LlamaForCausalLM
+from chat_app.batch_scheduler import BatchScheduler
+
+
+def _tiny_model():
+	torch.manual_seed(0)
+	config = LlamaConfig(
+		vocab_size=128, hidden_size=32, intermediate_size=64,
+		num_hidden_layers=2, num_attention_heads=2, num_key_value_heads=2,
+		pad_token_id=0, eos_token_id=None,
+	)
+	return LlamaForCausalLM(config).eval()
+
+
+class TestBatchScheduler(unittest.TestCase):
+	def setUp(self):
+		self.model = _tiny_model()
+		self.scheduler = BatchScheduler(self.model, pad_token_id=0, max_batch_size=4, max_wait_ms=20)
+
+	def tearDown(self):
+		self.scheduler.stop()
+
+	def test_single_request_matches_greedy_generate(self):
+		prompt = torch.tensor([5, 6, 7, 8, 9])
+		expected = self.model.generate(
+			input_ids=prompt.unsqueeze(0),
+			attention_mask=torch.ones(1, 5, dtype=torch.long),
+			max_new_tokens=6, do_sample=False, pad_token_id=0,
+		)[0, 5:].tolist()
+
+		out = self.scheduler.generate(prompt, max_new_tokens=6, eos_token_id=None)
+		self.assertEqual(out, expected)
+
+	def test_concurrent_requests_get_their_own_results(self):
+		prompts = [torch.arange(3, 3 + n) for n in (3, 7, 12, 5, 9, 4)]
+		budgets = [4, 9, 2, 6, 3, 5]
+		results = [None] * len(prompts)
+
+		def _call(i):
+			results[i] = self.scheduler.generate(prompts[i], max_new_tokens=budgets[i], eos_token_id=None)
+
+		threads = [threading.Thread(target=_call, args=(i,)) for i in range(len(prompts))]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join(timeout=60)
+
+		self.assertEqual([len(r) for r in results], budgets)
+		self.assertLessEqual(self.scheduler.stats["max_batch"], 4)
+		self.assertEqual(self.scheduler.stats["requests"], len(prompts))
+
+	def test_eos_retires_sequence(self):
+		prompt = torch.tensor([5, 6, 7])
+		first = self.scheduler.generate(prompt, max_new_tokens=1, eos_token_id=None)[0]
+		out = self.scheduler.generate(prompt, max_new_tokens=10, eos_token_id=first)
+		self.assertEqual(out, [first])
+
+	def test_failed_prefill_fails_the_admitted_requests(self):
+		with mock.patch.object(self.scheduler, "_prefill", side_effect=RuntimeError("prefill broke")):
+			req = self.scheduler.submit(torch.tensor([5, 6, 7]), max_new_tokens=4)
+			with self.assertRaises(RuntimeError):
+				req.result(timeout=10)		# fails instead of blocking forever
+
+	def test_stop_check_retires_sequence(self):
+		prompt = torch.tensor([5, 6, 7])
+		full = self.scheduler.generate(prompt, max_new_tokens=8, eos_token_id=None)
+		out = self.scheduler.generate(prompt, max_new_tokens=8, eos_token_id=None, stop=lambda ids: len(ids) >= 3)
+		self.assertEqual(out, full[:3])
+
+
+if __name__ == "__main__":
+	unittest.main()
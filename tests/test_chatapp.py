@@ -1,7 +1,8 @@
-from unittest.mock import patch
+from unittest.mock import patch, ANY
 import unittest
 from flask import json
 from chat_app.chat_app import ChatApp
+from chat_app.worker_pool import WorkerPool
 from chat_app.settings import (
     Settings,
     PathsCfg,
@@ -44,6 +45,10 @@ class TestChatApp(unittest.TestCase):
         mock_rag_instance.build_messages_hybrid.return_value = (["Mocked message"], ["Mocked sources"], {"fmt1"})
         self.MockScanner.return_value.scan.return_value = ["file1", "file2"]
         self.MockRAGStore.return_value.ingest.return_value = ["id1", "id2"]
+        self.MockRAGStore.return_value.sync.return_value = {
+            "added_ids": ["id1", "id2"], "new": 1, "changed": 1, "rebuilt": 0,
+            "unchanged": 3, "deleted": 0, "failed": 0, "chunks_removed": 1,
+        }
 
         cfg = Settings(
             app=AppCfg(),
@@ -85,7 +90,56 @@ class TestChatApp(unittest.TestCase):
         self.assertTrue(data['message']['content'].startswith("Mocked response"))
         self.assertEqual(data['message']['format'], "markdown")
 
-        self.MockLLMHandler.return_value.chat_next.assert_called_once_with("Hello")
+        self.MockLLMHandler.return_value.chat_next.assert_called_once_with("Hello", session_id=ANY)
+
+    def test_chat_route_stream(self):
+        self.MockLLMHandler.return_value.chat_next_stream.return_value = iter(["Mocked", " stream"])
+        response = self.client.post('/chat', json={"message": "Hello stream", "stream": True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+
+        records = [json.loads(line) for line in response.data.decode("utf-8").splitlines() if line]
+        tokens = [r["content"] for r in records if r["type"] == "token"]
+        self.assertEqual(tokens, ["Mocked", " stream"])
+        done = records[-1]
+        self.assertEqual(done["type"], "done")
+        self.assertTrue(done["message"]["content"].startswith("Mocked stream"))
+        self.assertIn("ttft_ms", done["meta"])
+        self.MockLLMHandler.return_value.chat_next_stream.assert_called_once_with("Hello stream", session_id=ANY)
+
+    def test_chat_route_session_id(self):
+        self.client.post('/chat', json={"message": "Hello session", "session_id": "abc"})
+        self.MockLLMHandler.return_value.chat_next.assert_called_once_with("Hello session", session_id="abc")
+
+    def _dict_cache(self):
+        store = {}
+        self.chat_app.cache = type("DictCache", (), {
+            "get": lambda _, key, **kw: store.get(key),
+            "add": lambda _, key, value, **kw: store.__setitem__(key, value),
+        })()
+        return store
+
+    def test_chat_cache_serves_opening_turns_and_records_them(self):
+        self._dict_cache()
+        llm = self.MockLLMHandler.return_value
+        llm.has_history.return_value = False
+        self.client.post('/chat', json={"message": "Hello", "session_id": "a"})
+        response = self.client.post('/chat', json={"message": "Hello", "session_id": "b"})
+
+        self.assertTrue(json.loads(response.data)['message']['content'].startswith("Mocked response"))
+        llm.chat_next.assert_called_once_with("Hello", session_id="a")
+        llm.record_turn.assert_called_once_with("Hello", "Mocked response", "b")
+
+    def test_chat_cache_is_skipped_for_sessions_with_history(self):
+        store = self._dict_cache()
+        llm = self.MockLLMHandler.return_value
+        llm.has_history.return_value = True
+        self.client.post('/chat', json={"message": "And then?", "session_id": "a"})
+        self.client.post('/chat', json={"message": "And then?", "session_id": "b"})
+
+        self.assertEqual(llm.chat_next.call_count, 2)
+        self.assertEqual(store, {})
+        llm.record_turn.assert_not_called()
 
     def test_rag_route(self):
         response = self.client.post('/rag', json={"message": "Hello"})
@@ -98,14 +152,43 @@ class TestChatApp(unittest.TestCase):
         self.MockRAGRetriever.return_value.build_messages_hybrid.assert_called_once_with("Hello")
         self.MockLLMHandler.return_value.chat_messages.assert_called_once_with(["Mocked message"], reset=True)
 
+    def test_chat_route_returns_429_when_generation_pool_is_full(self):
+        self.chat_app.gen_pool = WorkerPool("generation", max_workers=1, max_queue=0)
+        release = self.chat_app.gen_pool.reserve()
+        response = self.client.post('/chat', json={"message": "Busy?"})
+        release()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+        self.MockLLMHandler.return_value.chat_next.assert_not_called()
+
+    def test_generation_pool_admits_a_full_batch_when_batching(self):
+        self.assertEqual(self.chat_app.gen_pool.max_workers, 1)
+        self.MockLoadSettings.return_value.model = ModelCfg(batching=True, max_batch_size=6)
+        self.assertEqual(ChatApp("dummy-model-id").gen_pool.max_workers, 6)
+
     def test_ingest_route(self):
         response = self.client.post('/ingest')
         data = json.loads(response.data)
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(data['files_ingested'], 2)
+        self.assertEqual(data['sync']['unchanged'], 3)
         self.MockScanner.return_value.scan.assert_called_once_with("/tmp", recursively=True)
-        self.MockRAGStore.return_value.ingest.assert_called_once_with(["file1", "file2"])
+        self.MockRAGStore.return_value.sync.assert_called_once_with(["file1", "file2"])
+
+    def test_diagnostics_route_reports_ocr_env(self):
+        from chat_app.ocr_env import OcrEnv
+        self.MockRAGStore.return_value.tesseract_cmd = "tesseract"
+        env = OcrEnv(cmd="tesseract", binary="/usr/bin/tesseract", version="5.3.4", langs=["eng", "pol"])
+        with patch('chat_app.ocr_env.get_ocr_env', return_value=env) as probe:
+            response = self.client.get('/api/diagnostics?refresh=1')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['ocr']['available'])
+        self.assertEqual(data['ocr']['langs'], ["eng", "pol"])
+        probe.assert_called_once_with("tesseract", refresh=True)
 
     def test_post_settings_saves_data_dirs(self):
         payload = {
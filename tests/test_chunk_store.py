@@ -0,0 +1,34 @@
+import unittest
+from chat_app.chunk_store import ChunkStore
+
+
+class TestChunkStore(unittest.TestCase):
+	def test_get_many_splits_hits_and_misses(self):
+		store = ChunkStore()
+		store.put_many(["a", "b"], ["text a", "text b"], [{"i": 0}, {"i": 1}])
+		docs, metas, missing = store.get_many(["a", "x", "b"])
+		self.assertEqual(docs, {"a": "text a", "b": "text b"})
+		self.assertEqual(metas["b"], {"i": 1})
+		self.assertEqual(missing, ["x"])
+		stats = store.stats()
+		self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+	def test_evicts_least_recently_used(self):
+		store = ChunkStore(max_chunks=2)
+		store.put_many(["a", "b"], ["1", "2"])
+		store.get_many(["a"])			# b is now the oldest
+		store.put_many(["c"], ["3"])
+		self.assertIn("a", store)
+		self.assertNotIn("b", store)
+		self.assertEqual(store.stats()["evictions"], 1)
+
+	def test_delete(self):
+		store = ChunkStore()
+		store.put_many(["a", "b"], ["1", "2"])
+		store.delete(["a", "missing"])
+		self.assertEqual(len(store), 1)
+		self.assertEqual(store.get_many(["a"])[2], ["a"])
+
+
+if __name__ == "__main__":
+	unittest.main()
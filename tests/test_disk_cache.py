@@ -0,0 +1,45 @@
+import shutil
+import tempfile
+import unittest
+from chat_app.disk_cache import DiskCache
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+class TestDiskCache(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="disk_cache_test_")
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def test_text_round_trip_with_extra_meta(self):
+		cache = DiskCache(type="text", cache_folder_path=self.tmp)
+		cache.add("Some  Question", "answer", extra_meta={"fmt_ids": ["a#1"]})
+		self.assertEqual(cache.get("some question"), "answer")
+		self.assertEqual(cache.get("some question", get_extra=True), ("answer", {"fmt_ids": ["a#1"]}))
+		self.assertIsNone(cache.get("other"))
+
+	@unittest.skipIf(numpy is None, "numpy not installed")
+	def test_npy_round_trip(self):
+		cache = DiskCache(type="npy", cache_folder_path=self.tmp)
+		vec = [0.5, -1.25, 3.0]
+		cache.add("model\nquery", vec)
+		self.assertEqual(cache.get("model\nquery"), vec)
+		self.assertIsNone(cache.get("model\nother"))
+
+	@unittest.skipIf(numpy is None, "numpy not installed")
+	def test_npy_keys_are_case_sensitive(self):
+		cache = DiskCache(type="npy", cache_folder_path=self.tmp)
+		cache.add("cased-model\nApple", [1.0])
+		cache.add("cased-model\napple", [2.0])
+		self.assertEqual(cache.get("cased-model\nApple"), [1.0])
+		self.assertEqual(cache.get("cased-model\napple"), [2.0])
+		self.assertIsNone(cache.get("cased-model\nAPPLE"))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+from types import SimpleNamespace
+from chat_app.doc_converter import DoclingConverter, _page_runs, page_text_lengths
+
+
+def _item(text, page):
+	return SimpleNamespace(text=text, label="text", prov=[SimpleNamespace(page_no=page)])
+
+
+class _Ref:
+	def __init__(self, item):
+		self.item = item
+
+	def resolve(self, doc):
+		return self.item
+
+
+class _FakeDoc:
+	"""A flat body: every item is a direct child, in reading order."""
+
+	def __init__(self, pages, items, pictures=()):
+		self.pages = {p: None for p in pages}
+		self.pictures = [SimpleNamespace(label="picture", prov=[SimpleNamespace(page_no=p)]) for p in pictures]
+		self.body = SimpleNamespace(children=[_Ref(i) for i in items])
+
+	@property
+	def items(self):
+		return [ref.item for ref in self.body.children]
+
+	def iterate_items(self, root=None, with_groups=False):
+		return [(item, 0) for item in ([root] if root is not None else self.items)]
+
+	def delete_items(self, node_items):
+		self.body.children = [r for r in self.body.children if r.item not in node_items]
+
+	def add_text(self, label, text, prov):
+		self.body.children.append(_Ref(SimpleNamespace(text=text, label=label, prov=[prov])))
+
+	def add_table(self, data, prov, label):
+		self.body.children.append(_Ref(SimpleNamespace(data=data, label=label, prov=[prov])))
+
+
+class _FakeConverter(DoclingConverter):
+	"""Pages 1, 2 and 5 have a text layer; 3-4 and 6 are scans."""
+
+	def __init__(self, native_pages=(1, 2, 5), native_text="native text of page {p} " * 10):
+		super().__init__(debug=lambda msg: None)
+		self.native_pages = native_pages
+		self.native_text = native_text
+		self.calls = []
+
+	def convert(self, abs_path, *, ocr, do_picture_description=False, page_range=None):
+		self.calls.append((ocr, page_range))
+		pages = range(page_range[0], page_range[1] + 1) if page_range else range(1, 7)
+		if ocr:
+			return SimpleNamespace(document=_FakeDoc(pages, [_item(f"ocr text of page {p} " * 10, p) for p in pages]))
+		items = [_item(self.native_text.format(p=p), p) for p in pages if p in self.native_pages]
+		items.append(_item("x", 3))		# stray glyph on a scanned page
+		scans = [p for p in pages if p not in self.native_pages]
+		return SimpleNamespace(document=_FakeDoc(pages, items, pictures=scans))
+
+
+class TestPerPageOCR(unittest.TestCase):
+	def test_page_runs(self):
+		self.assertEqual(_page_runs([3, 4, 6, 8, 9, 10]), [(3, 4), (6, 6), (8, 10)])
+
+	def test_only_sparse_pages_are_ocrd_and_merged(self):
+		conv = _FakeConverter()
+		doc = conv.convert_auto_ocr("mixed.pdf").document
+		self.assertEqual(conv.calls, [(False, None), (True, (3, 4)), (True, (6, 6))])
+		texts = {i.prov[0].page_no: i.text for i in doc.items}
+		self.assertTrue(texts[1].startswith("native"))
+		self.assertTrue(texts[3].startswith("ocr"))
+		self.assertTrue(texts[6].startswith("ocr"))
+		self.assertNotIn("x", [i.text for i in doc.items])
+		self.assertEqual([i.prov[0].page_no for i in doc.items], [1, 2, 3, 4, 5, 6])		# reading order kept
+		self.assertTrue(all(n >= 100 for n in page_text_lengths(doc).values()))
+
+	def test_native_document_skips_ocr(self):
+		conv = _FakeConverter(native_pages=range(1, 7))
+		conv.convert_auto_ocr("native.pdf")
+		self.assertEqual(conv.calls, [(False, None)])
+
+	def test_short_text_pages_without_images_skip_ocr(self):
+		conv = _FakeConverter(native_pages=range(1, 7), native_text="Slide {p}: quarterly results")
+		conv.convert_auto_ocr("slides.pdf")
+		self.assertEqual(conv.calls, [(False, None)])
+
+	def test_dense_text_layer_skips_ocr(self):
+		# a short caption under a figure on page 6, but the document is text-native
+		conv = _FakeConverter(native_pages=range(1, 7), native_text="native text of page {p} " * 20)
+		real_convert = conv.convert
+
+		def convert(abs_path, **kw):
+			res = real_convert(abs_path, **kw)
+			res.document.body.children[5].item.text = "Figure 1"
+			res.document.pictures.append(SimpleNamespace(prov=[SimpleNamespace(page_no=6)]))
+			return res
+
+		conv.convert = convert
+		conv.convert_auto_ocr("paper.pdf")
+		self.assertEqual(conv.calls, [(False, None)])
+
+	def test_scanned_document_is_ocrd_in_one_pass(self):
+		conv = _FakeConverter(native_pages=())
+		conv.convert_auto_ocr("scan.pdf")
+		self.assertEqual(conv.calls, [(False, None), (True, None)])
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -20,5 +20,18 @@ class TestEmbedderMock(unittest.TestCase):
 			self.assertEqual(result, [[0.1, 0.2, 0.3]])
 			mock_embed.assert_called_once_with(["Hello", "World"])
 
+	@patch('chat_app.embedder.AutoTokenizer')
+	@patch('chat_app.embedder.AutoModel')
+	def test_embed_query_is_cached(self, mock_model_cls, mock_tokenizer_cls):
+		mock_tokenizer_cls.from_pretrained.return_value = MagicMock(do_lower_case=True)
+		embedder = Embedder()
+		embedder._disk = None
+		with patch.object(embedder, 'embed', return_value=[[0.1, 0.2]]) as mock_embed:
+			self.assertEqual(embedder.embed_query("What is  Linux?"), [0.1, 0.2])
+			self.assertEqual(embedder.embed_query("what is linux?"), [0.1, 0.2])
+			mock_embed.assert_called_once_with(["What is  Linux?"])
+		stats = embedder.cache_stats()
+		self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
 if __name__ == "__main__":
 	unittest.main()
@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+from chat_app.embedding_cache import EmbeddingCache
+
+
+class TestEmbeddingCache(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="embedding_cache_test_")
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def test_round_trip_and_misses(self):
+		cache = EmbeddingCache(self.tmp, "model-a")
+		cache.put_many(["alpha", "beta"], [[1.0, 2.0], [3.0, 4.0]])
+		vecs, missing = cache.get_many(["beta", "gamma", "alpha"])
+		self.assertEqual(vecs, [[3.0, 4.0], None, [1.0, 2.0]])
+		self.assertEqual(missing, [1])
+		stats = cache.stats()
+		self.assertEqual((stats["hits"], stats["misses"], stats["vectors"]), (2, 1, 2))
+
+	def test_persists_and_dedups(self):
+		cache = EmbeddingCache(self.tmp, "model-a")
+		cache.put_many(["same", "same", "other"], [[1.0], [1.0], [2.0]])
+		cache.put_many(["same"], [[9.0]])
+		reopened = EmbeddingCache(self.tmp, "model-a")
+		self.assertEqual(len(reopened), 2)
+		self.assertEqual(reopened.get_many(["same", "other"])[0], [[1.0], [2.0]])
+
+	def test_keyed_by_model(self):
+		EmbeddingCache(self.tmp, "model-a").put_many(["text"], [[1.0]])
+		self.assertEqual(EmbeddingCache(self.tmp, "model-b").get_many(["text"])[1], [0])
+
+	def test_torn_tail_is_dropped(self):
+		cache = EmbeddingCache(self.tmp, "model-a")
+		cache.put_many(["a", "b"], [[1.0, 1.0], [2.0, 2.0]])
+		with open(cache._key_path, "r+b") as f:
+			f.truncate(30)			# second key half-written
+		reopened = EmbeddingCache(self.tmp, "model-a")
+		self.assertEqual(reopened.get_many(["a", "b"]), ([[1.0, 1.0], None], [1]))
+		self.assertEqual(os.path.getsize(reopened._vec_path), 8)
+		reopened.put_many(["b"], [[3.0, 3.0]])
+		self.assertEqual(EmbeddingCache(self.tmp, "model-a").get_many(["b"])[0], [[3.0, 3.0]])
+
+	def test_dim_mismatch_raises(self):
+		cache = EmbeddingCache(self.tmp, "model-a")
+		cache.put_many(["a"], [[1.0, 2.0]])
+		with self.assertRaises(ValueError):
+			cache.put_many(["b"], [[1.0]])
+
+
+if __name__ == "__main__":
+	unittest.main()
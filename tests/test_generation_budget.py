@@ -0,0 +1,92 @@
+import unittest
+from chat_app.settings import GenerationCfg
+from chat_app.generation_budget import GenerationBudget, LengthStats, StopTrimmer, trim_at_stop
+
+
+def _count(text):
+	return len(text.split())
+
+
+def _rag_messages(question, context):
+	return [
+		{"role": "system", "content": "You are a helpful RAG assistant."},
+		{"role": "user", "content": f"Question: {question}\n\n<context>\n{context}\n</context>\n\nAnswer concisely."},
+	]
+
+
+class TestGenerationBudget(unittest.TestCase):
+	def setUp(self):
+		self.cfg = GenerationCfg(
+			max_new_tokens=500, rag_max_new_tokens=300, rag_min_new_tokens=50,
+			budget_base_tokens=40, budget_per_question_token=2.0, budget_per_context_token=0.5,
+		)
+		self.budget = GenerationBudget(self.cfg, _count)
+
+	def test_chat_route_uses_fixed_budget(self):
+		plan = self.budget.plan("chat")
+		self.assertEqual(plan.max_new_tokens, 500)
+		self.assertEqual(plan.stop_strings, [])
+
+	def test_rag_budget_grows_with_question_and_context(self):
+		small = self.budget.plan("rag", _rag_messages("what is bm25", "word " * 20))
+		large = self.budget.plan("rag", _rag_messages("what is bm25", "word " * 1000))
+		self.assertEqual(small.max_new_tokens, 40 + 2 * 3 + 10)
+		self.assertEqual(large.max_new_tokens, 300)	# clamped to rag_max_new_tokens
+		self.assertIn("</context>", small.stop_strings)
+
+	def test_rag_budget_has_a_floor(self):
+		plan = self.budget.plan("rag", _rag_messages("hi", ""))
+		self.assertEqual(plan.max_new_tokens, 50)
+
+	def test_adaptive_off_uses_rag_max(self):
+		self.cfg.adaptive_budget = False
+		plan = self.budget.plan("rag", _rag_messages("hi", ""))
+		self.assertEqual(plan.max_new_tokens, 300)
+
+
+class TestStopStrings(unittest.TestCase):
+	def test_trim_at_first_stop(self):
+		self.assertEqual(trim_at_stop("answer [a#1]\nQuestion: next", ["\nQuestion:", "<context>"]), "answer [a#1]")
+		self.assertEqual(trim_at_stop("answer", ["\nQuestion:"]), "answer")
+		self.assertEqual(trim_at_stop("answer", None), "answer")
+
+	def test_trimmer_handles_stop_split_across_pieces(self):
+		trimmer = StopTrimmer(["\nQuestion:"])
+		pieces = ["The answer", " is 42.\nQue", "stion: and more", " text"]
+		out = "".join(trimmer.feed(p) for p in pieces) + trimmer.flush()
+		self.assertEqual(out, "The answer is 42.")
+		self.assertTrue(trimmer.stopped)
+
+	def test_trimmer_without_stop_passes_everything(self):
+		trimmer = StopTrimmer(["</context>"])
+		pieces = ["a", "bc", "</cont", "ext-free"]
+		out = "".join(trimmer.feed(p) for p in pieces) + trimmer.flush()
+		self.assertEqual(out, "abc</context-free")
+
+
+class TestLengthStats(unittest.TestCase):
+	def test_distribution_and_stop_reasons(self):
+		stats = LengthStats(window=10, legacy_cap=500)
+		for n in (10, 20, 30, 40):
+			stats.record("rag", n, 100, "eos", 0.1)
+		stats.record("rag", 100, 100, "budget", 1.0)
+		stats.record("rag", 60, 100, "stop_string", 0.5)
+		out = stats.stats()["rag"]
+		self.assertEqual(out["requests"], 6)
+		self.assertEqual(out["max"], 100)
+		self.assertEqual(out["stops"], {"eos": 4, "stop_string": 1, "budget": 1})
+		self.assertEqual(out["max_saved_tokens"], (500 - 100) + (500 - 60))
+		self.assertEqual(sum(out["histogram"].values()), 6)
+		self.assertEqual(out["mean_budget"], 100.0)
+
+	def test_window_bounds_memory(self):
+		stats = LengthStats(window=3)
+		for n in range(10):
+			stats.record("chat", n, 500, "eos", 0.0)
+		out = stats.stats()["chat"]
+		self.assertEqual(out["requests"], 10)
+		self.assertEqual(sum(out["histogram"].values()), 3)
+
+
+if __name__ == "__main__":
+	unittest.main()
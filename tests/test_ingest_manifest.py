@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+from chat_app.ingest_manifest import IngestManifest, fingerprint
+
+
+class TestIngestManifest(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="ingest_manifest_test_")
+		self.path = os.path.join(self.tmp, "ingest_manifest.json")
+		self.files = [self._write(name, f"content of {name}") for name in ("a.md", "b.md", "c.md")]
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def _write(self, name, text):
+		p = os.path.join(self.tmp, name)
+		with open(p, "w", encoding="utf-8") as f:
+			f.write(text)
+		return p
+
+	def _ingested(self, version="1|model"):
+		manifest = IngestManifest(self.path, version)
+		plan = manifest.plan(self.files)
+		for p in plan.new:
+			manifest.record(p, plan.fingerprints[p], [f"{os.path.basename(p)}#0"])
+		manifest.save()
+		return plan
+
+	def test_everything_is_new_then_unchanged_after_reload(self):
+		self.assertEqual(len(self._ingested().new), 3)
+		plan = IngestManifest(self.path, "1|model").plan(self.files)
+		self.assertEqual(len(plan.unchanged), 3)
+		self.assertEqual(plan.new + plan.changed + plan.rebuild + plan.deleted, [])
+		self.assertEqual(IngestManifest(self.path, "1|model").get(self.files[0]).chunk_ids, ["a.md#0"])
+
+	def test_touched_file_is_unchanged_and_edited_file_changed(self):
+		self._ingested()
+		st = os.stat(self.files[0])
+		os.utime(self.files[0], ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+		self._write("b.md", "edited content of b.md")
+		manifest = IngestManifest(self.path, "1|model")
+		plan = manifest.plan(self.files)
+		self.assertEqual(plan.changed, [self.files[1]])
+		self.assertEqual(sorted(plan.unchanged), sorted([self.files[0], self.files[2]]))
+		self.assertEqual(plan.fingerprints[self.files[1]], fingerprint(self.files[1]))
+		# the touch is remembered, so the next plan does not hash a.md again
+		self.assertEqual(manifest.get(self.files[0]).mtime_ns, os.stat(self.files[0]).st_mtime_ns)
+
+	def test_deleted_and_moved_files(self):
+		self._ingested()
+		moved = os.path.join(self.tmp, "sub")
+		os.makedirs(moved)
+		os.replace(self.files[2], os.path.join(moved, "c.md"))
+		os.remove(self.files[1])
+		plan = IngestManifest(self.path, "1|model").plan([self.files[0], os.path.join(moved, "c.md")])
+		self.assertEqual(sorted(plan.deleted), sorted(self.files[1:]))
+		self.assertEqual(plan.new, [os.path.join(moved, "c.md")])
+
+	def test_files_outside_the_scan_that_still_exist_are_kept(self):
+		self._ingested()
+		plan = IngestManifest(self.path, "1|model").plan(self.files[:1])
+		self.assertEqual(plan.deleted, [])
+
+	def test_new_pipeline_version_rebuilds(self):
+		self._ingested()
+		plan = IngestManifest(self.path, "2|model").plan(self.files)
+		self.assertEqual(len(plan.rebuild), 3)
+		self.assertEqual(set(plan.fingerprints), set(self.files))
+
+
+if __name__ == "__main__":
+	unittest.main()
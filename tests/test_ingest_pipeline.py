@@ -0,0 +1,109 @@
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+from chat_app import ingest_pipeline
+from chat_app.ingest_pipeline import IngestPipeline
+
+
+class _FakeEmbedder:
+	def __init__(self):
+		self.calls = []
+
+	def embed_documents(self, texts):
+		self.calls.append(list(texts))
+		return [[float(len(t))] for t in texts]
+
+
+class _FakeStore:
+	def __init__(self, existing=()):
+		self.embedder = _FakeEmbedder()
+		self.existing = set(existing)
+		self.written = []
+		self.tesseract_cmd = "tesseract"
+		self.tessdata_dir = None
+
+	def _build_text_chunks(self, path, records):
+		ids = [f"{path}#{i}" for i in range(len(records))]
+		return ids, [r.text for r in records], [{"source_file": path} for _ in records]
+
+	def _new_chunks(self, ids, texts, metas):
+		keep = [i not in self.existing for i in ids]
+		pick = lambda xs: [x for x, k in zip(xs, keep) if k]
+		return pick(ids), pick(texts), pick(metas)
+
+	def _write_chunks(self, ids, texts, metas, sources, embeddings):
+		self.written.append((ids, sources, embeddings))
+
+	def _debug(self, msg):
+		pass
+
+
+def _fake_convert(path):
+	if path == "bad":
+		raise RuntimeError("docling failed")
+	return [SimpleNamespace(text=f"{path} chunk {i}", page=1, type="text") for i in range(2)], \
+		{"load_s": 0.5 if path == "a" else 0.0, "convert_s": 0.01, "chunk_s": 0.0}
+
+
+class TestIngestPipeline(unittest.TestCase):
+	def _pipeline(self, store, **kw):
+		pipeline = IngestPipeline(store, **kw)
+		pipeline._pool = ThreadPoolExecutor(max_workers=2)		# no Docling processes in tests
+		self.addCleanup(pipeline.close)
+		return pipeline
+
+	def test_batches_across_files_and_writes_once_per_batch(self):
+		store = _FakeStore(existing={"b#0"})
+		pipeline = self._pipeline(store, embed_batch=3, queue_size=1)
+		with mock.patch.object(ingest_pipeline, "convert_and_chunk", _fake_convert):
+			added = pipeline.run(["a", "b", "c"])
+
+		self.assertEqual(sorted(added), ["a#0", "a#1", "b#1", "c#0", "c#1"])
+		self.assertEqual(sum(len(c) for c in store.embedder.calls), 5)
+		self.assertTrue(any(len(set(sources)) > 1 for _, sources, _ in store.written))
+		stages = pipeline.last_stats["stages"]
+		self.assertEqual(stages["convert"]["files"], 3)
+		self.assertEqual(stages["convert"]["load_s"], 0.5)
+		self.assertAlmostEqual(stages["convert"]["busy_s"], 0.03)
+		self.assertEqual(stages["write"]["chunks"], 5)
+		self.assertEqual(stages["embed"]["batches"], len(store.written))
+
+	def test_failed_file_is_counted_and_skipped(self):
+		store = _FakeStore()
+		pipeline = self._pipeline(store)
+		with mock.patch.object(ingest_pipeline, "convert_and_chunk", _fake_convert):
+			added = pipeline.run(["bad", "a"])
+		self.assertEqual(sorted(added), ["a#0", "a#1"])
+		self.assertEqual(pipeline.last_stats["failed"], 1)
+		self.assertGreater(pipeline.last_stats["files_per_min"], 0)
+
+	def test_broken_pool_fails_every_unfinished_file(self):
+		store = _FakeStore()
+		pipeline = self._pipeline(store, workers=1, queue_size=1)
+		broken = mock.Mock()
+		done = Future()
+		done.set_result(_fake_convert("a"))
+		# a converts, b is still in flight when submitting c finds the pool broken
+		broken.submit.side_effect = [done, Future(), RuntimeError("pool broke")]
+		pipeline._pool = broken
+		added = pipeline.run(["a", "b", "c"])
+		self.assertEqual(added, ["a#0", "a#1"])
+		self.assertEqual(sorted(pipeline.last_failed), ["b", "c"])
+		self.assertEqual(pipeline.last_stats["failed"], 2)
+		self.assertIsNone(pipeline._pool)
+		broken.shutdown.assert_called_once()
+
+	def test_embed_failure_fails_buffered_and_queued_files(self):
+		store = _FakeStore()
+		store.embedder.embed_documents = mock.Mock(side_effect=RuntimeError("out of memory"))
+		pipeline = self._pipeline(store, embed_batch=100, queue_size=1)
+		with mock.patch.object(ingest_pipeline, "convert_and_chunk", _fake_convert):
+			added = pipeline.run(["a", "b", "c"])
+		self.assertEqual(added, [])
+		self.assertEqual(sorted(pipeline.last_failed), ["a", "b", "c"])
+		self.assertEqual(pipeline.last_stats["failed"], 3)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import torch
+from transformers import DynamicCache
+from chat_app.kv_cache import PrefixCache, SessionKVCache, _cache_nbytes, _crop, _layers
+
+
+def _filled_cache(seq_len, layers=2):
+	cache = DynamicCache()
+	for layer in range(layers):
+		cache.update(torch.zeros(1, 2, seq_len, 4), torch.zeros(1, 2, seq_len, 4), layer)
+	return cache
+
+
+class TestPrefixCache(unittest.TestCase):
+	def setUp(self):
+		self.cache = PrefixCache(max_entries=2)
+		self.prefills = []
+
+	def _prefill(self, ids):
+		self.prefills.append(ids.tolist())
+		return {"kv": ids.clone()}
+
+	def test_miss_then_hit_returns_private_copy(self):
+		self.cache.register("sys", torch.tensor([[1, 2, 3]]))
+		prompt = torch.tensor([[1, 2, 3, 4, 5]])
+
+		first = self.cache.lookup(prompt, self._prefill)
+		second = self.cache.lookup(prompt, self._prefill)
+
+		self.assertEqual(self.prefills, [[[1, 2, 3]]])
+		self.assertTrue(torch.equal(second["kv"], torch.tensor([[1, 2, 3]])))
+		self.assertIsNot(first, second)
+		stats = self.cache.stats()
+		self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+		self.assertEqual(stats["saved_prefill_tokens"], 3)
+		self.assertEqual(stats["hit_rate"], 0.5)
+
+	def test_no_match_and_full_length_prefix_are_skipped(self):
+		self.cache.register("sys", torch.tensor([[1, 2, 3]]))
+		self.assertIsNone(self.cache.lookup(torch.tensor([[9, 2, 3, 4]]), self._prefill))
+		# the whole prompt equals the prefix: nothing would be left for generate()
+		self.assertIsNone(self.cache.lookup(torch.tensor([[1, 2, 3]]), self._prefill))
+		self.assertEqual(self.prefills, [])
+
+	def test_longest_prefix_wins_and_lru_bound(self):
+		self.cache.register("short", torch.tensor([[1, 2]]))
+		self.cache.register("long", torch.tensor([[1, 2, 3]]))
+		self.cache.lookup(torch.tensor([[1, 2, 3, 4]]), self._prefill)
+		self.assertEqual(self.prefills, [[[1, 2, 3]]])
+
+		self.cache.register("other", torch.tensor([[7]]))
+		self.assertFalse(self.cache.known("short"))
+		self.assertTrue(self.cache.known("long"))
+
+
+class TestSessionKVCache(unittest.TestCase):
+	def test_take_crops_to_common_prefix(self):
+		kv = SessionKVCache()
+		kv.put("s", _filled_cache(6), torch.tensor([1, 2, 3, 4, 5, 6, 7]))
+
+		past = kv.take("s", torch.tensor([[1, 2, 3, 4, 9, 9]]))
+
+		self.assertEqual(past.get_seq_length(), 4)
+		self.assertEqual(kv.stats()["reused_tokens"], 4)
+		# taken caches belong to the caller until put back
+		self.assertIsNone(kv.take("s", torch.tensor([[1, 2, 3]])))
+
+	def test_take_leaves_one_token_to_prefill(self):
+		kv = SessionKVCache()
+		kv.put("s", _filled_cache(3), torch.tensor([1, 2, 3]))
+		past = kv.take("s", torch.tensor([[1, 2, 3]]))
+		self.assertEqual(past.get_seq_length(), 2)
+
+	def test_memory_budget_evicts_oldest(self):
+		one = _filled_cache(8)
+		budget = 2 * _cache_nbytes(one)
+		kv = SessionKVCache(max_bytes=budget)
+		kv.put("a", one, torch.arange(9))
+		kv.put("b", _filled_cache(8), torch.arange(9))
+		kv.put("c", _filled_cache(8), torch.arange(9))
+
+		self.assertIsNone(kv.take("a", torch.arange(9).unsqueeze(0)))
+		self.assertIsNotNone(kv.take("c", torch.arange(9).unsqueeze(0)))
+		self.assertEqual(kv.stats()["evictions"], 1)
+
+
+class TestCacheLayers(unittest.TestCase):
+	def test_layers_and_crop_use_the_cache_api(self):
+		cache = _filled_cache(6, layers=3)
+		layers = _layers(cache)
+		self.assertEqual(len(layers), 3)
+		self.assertEqual(tuple(layers[0][0].shape), (1, 2, 6, 4))
+		self.assertEqual(_cache_nbytes(cache), 3 * 2 * 2 * 6 * 4 * 4)
+		self.assertEqual(_crop(cache, 2).get_seq_length(), 2)
+
+	def test_legacy_tuples_are_accepted(self):
+		legacy = tuple((torch.zeros(1, 2, 5, 4), torch.zeros(1, 2, 5, 4)) for _ in range(2))
+		self.assertEqual(_layers(legacy), legacy)
+		self.assertEqual(_crop(legacy, 3).get_seq_length(), 3)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -1,8 +1,10 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 import torch
-from chat_app.llm_handler import LLMHandler
+from chat_app.llm_handler import LLMHandler, load_model
+from chat_app.generation_budget import GenerationPlan
 import io
+import threading
 
 class TestLLMHandler(unittest.TestCase):
 	def setUp(self):
@@ -16,6 +18,8 @@ class TestLLMHandler(unittest.TestCase):
 		self.handler.tokenizer.eos_token_id = 99
 
 		self.handler.convo_log_file = io.StringIO()
+		self.handler._lock = threading.Lock()
+		self.handler.scheduler = None
 
 		self.fake_tensor_dict = {
 			"input_ids": torch.tensor([[1, 2, 3]]),
@@ -78,6 +82,73 @@ class TestLLMHandler(unittest.TestCase):
 		
 		self.assertEqual(output, "Hello World!")
 
+	def test_scheduler_path_stops_at_stop_strings(self):
+		self.handler.scheduler = MagicMock()
+		self.handler.scheduler.generate.return_value = [4, 5]
+		self.handler.generate_response(self.fake_tensor_dict, plan=GenerationPlan("chat", stop_strings=["\nUser:"]))
+
+		stop = self.handler.scheduler.generate.call_args.kwargs["stop"]
+		self.handler.tokenizer.decode.return_value = "Sure.\nUser:"
+		self.assertTrue(stop([4, 5]))
+		self.handler.tokenizer.decode.return_value = "Sure."
+		self.assertFalse(stop([4]))
+
+	@patch("chat_app.llm_handler.TextIteratorStreamer")
+	def test_chat_next_stream(self, mock_streamer_cls):
+		mock_streamer_cls.return_value = iter(["Hi", "", " there"])
+		self.handler.system_preamble = "system"
+		self.handler.tokenizer.apply_chat_template.return_value = "prompt"
+		self.handler.tokenizer.return_value = self.fake_tensor_dict
+
+		pieces = list(self.handler.chat_next_stream("Hello?!"))
+
+		self.assertEqual(pieces, ["Hi", " there"])
+		self.assertEqual(self.handler.conversation[-1], {"role": "assistant", "content": "Hi there"})
+		_, kwargs = self.handler.model.generate.call_args
+		self.assertIs(kwargs["streamer"], mock_streamer_cls.return_value)
+
+	@patch("chat_app.llm_handler.TextIteratorStreamer")
+	def test_closed_stream_keeps_partial_reply_and_stops_generation(self, mock_streamer_cls):
+		mock_streamer_cls.return_value = iter(["Hi", " there", " friend"])
+		self.handler.system_preamble = "system"
+		self.handler.tokenizer.apply_chat_template.return_value = "prompt"
+		self.handler.tokenizer.return_value = self.fake_tensor_dict
+
+		stream = self.handler.chat_next_stream("Hello?!")
+		self.assertEqual(next(stream), "Hi")
+		stream.close()		# client disconnected
+
+		self.assertEqual(self.handler.conversation[-2:], [
+			{"role": "user", "content": "Hello?!"},
+			{"role": "assistant", "content": "Hi"},
+		])
+		_, kwargs = self.handler.model.generate.call_args
+		cancelled = kwargs["stopping_criteria"][0]
+		self.assertTrue(cancelled(torch.tensor([[1, 2]]), None).all())
+
+
+class TestLoadModel(unittest.TestCase):
+	@patch("chat_app.llm_handler.AutoModelForCausalLM")
+	def test_cpu_fp32_has_no_quantization(self, mock_model_cls):
+		load_model("dummy", "cpu_fp32")
+		_, kwargs = mock_model_cls.from_pretrained.call_args
+		self.assertEqual(kwargs["torch_dtype"], torch.float32)
+		self.assertNotIn("quantization_config", kwargs)
+		self.assertNotIn("device_map", kwargs)
+
+	@patch("chat_app.llm_handler.torch.ao.quantization.quantize_dynamic")
+	@patch("chat_app.llm_handler.AutoModelForCausalLM")
+	def test_cpu_int8_quantizes_linear_layers(self, mock_model_cls, mock_quantize):
+		model = load_model("dummy", "cpu_int8")
+		self.assertIs(model, mock_quantize.return_value)
+		args, kwargs = mock_quantize.call_args
+		self.assertEqual(args[1], {torch.nn.Linear})
+		self.assertEqual(kwargs["dtype"], torch.qint8)
+
+	def test_unknown_backend(self):
+		with self.assertRaises(ValueError):
+			load_model("dummy", "tpu")
+
 
 if __name__ == "__main__":
 	unittest.main()
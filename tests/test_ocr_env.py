@@ -0,0 +1,90 @@
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from chat_app import ocr_env
+from chat_app.ocr_env import clear_ocr_env, get_ocr_env
+
+_FAKE_TESSERACT = """#!{python}
+import sys
+with open({calls!r}, "a") as f:
+	f.write(sys.argv[1] + "\\n")
+if sys.argv[1] == "--version":
+	print("tesseract 5.3.4\\n leptonica-1.82.0")
+elif sys.argv[1] == "--list-langs":
+	print('List of available languages in "/opt/tessdata/" (3):')
+	print("pol\\nosd\\neng")
+"""
+
+
+@unittest.skipIf(sys.platform.startswith("win"), "shebang script")
+class TestOcrEnv(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="ocr_env_test_")
+		self.bin_dir = os.path.join(self.tmp, "bin")
+		self.cache_dir = os.path.join(self.tmp, "cache")
+		self.calls = os.path.join(self.tmp, "calls.log")
+		os.makedirs(self.bin_dir)
+		self.script = os.path.join(self.bin_dir, "tesseract")
+		with open(self.script, "w") as f:
+			f.write(_FAKE_TESSERACT.format(python=sys.executable, calls=self.calls))
+		os.chmod(self.script, os.stat(self.script).st_mode | stat.S_IEXEC)
+		patcher = mock.patch.dict(os.environ, {"PATH": self.bin_dir + os.pathsep + os.environ.get("PATH", "")})
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		os.environ.pop("TESSDATA_PREFIX", None)
+		clear_ocr_env()
+		self.addCleanup(clear_ocr_env)
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def _probes(self):
+		if not os.path.exists(self.calls):
+			return 0
+		with open(self.calls) as f:
+			return f.read().count("--list-langs")
+
+	def test_probe_reads_binary_version_langs_and_tessdata(self):
+		env = get_ocr_env("tesseract", self.cache_dir)
+		self.assertTrue(env.available)
+		self.assertEqual(env.binary, os.path.realpath(self.script))
+		self.assertEqual(env.version, "5.3.4")
+		self.assertEqual(env.langs, ["eng", "osd", "pol"])
+		self.assertEqual(env.tessdata_dir, "/opt/tessdata/")
+
+	def test_probed_once_per_process_then_served_from_disk(self):
+		get_ocr_env("tesseract", self.cache_dir)
+		self.assertIs(get_ocr_env("tesseract", self.cache_dir), get_ocr_env("tesseract", self.cache_dir))
+		self.assertEqual(self._probes(), 1)
+
+		clear_ocr_env()		# a new process
+		env = get_ocr_env("tesseract", self.cache_dir)
+		self.assertEqual((env.source, env.langs), ("disk", ["eng", "osd", "pol"]))
+		self.assertEqual(self._probes(), 1)
+
+	def test_changed_binary_is_probed_again(self):
+		get_ocr_env("tesseract", self.cache_dir)
+		st = os.stat(self.script)
+		os.utime(self.script, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+		clear_ocr_env()
+		self.assertEqual(get_ocr_env("tesseract", self.cache_dir).source, "probe")
+		self.assertEqual(self._probes(), 2)
+
+	def test_missing_binary(self):
+		env = get_ocr_env("no-such-tesseract", self.cache_dir)
+		self.assertFalse(env.available)
+		self.assertIn("not found", env.error)
+
+	def test_failing_binary_is_not_cached_on_disk(self):
+		with mock.patch.object(ocr_env, "_run", side_effect=OSError("boom")):
+			self.assertFalse(get_ocr_env("tesseract", self.cache_dir).available)
+		clear_ocr_env()
+		self.assertTrue(get_ocr_env("tesseract", self.cache_dir).available)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -6,6 +6,8 @@ import os
 from pathlib import Path
 from PIL import Image
 from types import SimpleNamespace
+from unittest import mock
+from chat_app import rag_store
 from chat_app.rag_store import RAGStore
 from chat_app.rag_retriever import RAGRetriever
 
@@ -27,6 +29,12 @@ class _FakeEmbedder:
 			embs.append([val])
 		return embs
 
+	def embed_query(self, text):
+		return self.embed([text])[0]
+
+	def embed_documents(self, texts):
+		return self.embed(texts)
+
 class _FakeCaptioner:
 	def caption(self, image, prompt: str = "Describe this image."):
 		return "A red triangle with the number 2 in the center."
@@ -125,6 +133,34 @@ class TestRAGStore(unittest.TestCase):
 			"From User: What's in Test2?\nContext to base your answer: This is a test file 2\nThis is a test file 1"
 		)
 
+	def test_hybrid_query_hydrates_fused_top_k_once(self):
+		self.store.add_file_to_store(self.documents_paths[0])
+		self.store.add_file_to_store(self.documents_paths[1])
+
+		calls = []
+		hydrate = self.store.hydrate
+		self.store.hydrate = lambda ids: calls.append(list(ids)) or hydrate(calls[-1])
+
+		res = self.rag.hybrid_query("What's in test file 2?", top_k=1, include_ids=True)
+		self.assertIn("This is a test file 2", res["documents"][0][0])
+		self.assertEqual(calls, [res["ids"][0]])
+		for key in ("dense_ms", "sparse_ms", "fuse_ms", "hydrate_ms", "total_ms"):
+			self.assertGreaterEqual(res["timings"][key], 0.0)
+
+	def test_hydrate_serves_ingested_chunks_from_memory(self):
+		self.store.add_file_to_store(self.documents_paths[1])
+		ids = self.store.sparse_query("test file 2", n_results=1, hydrate=False)["ids"][0]
+		self.assertEqual(len(ids), 1)
+
+		collection = self.store.collection
+		self.store.collection = SimpleNamespace(get=lambda *a, **kw: self.fail("hydrate went to Chroma"))
+		try:
+			docs, metas = self.store.hydrate(ids)
+		finally:
+			self.store.collection = collection
+		self.assertIn("This is a test file 2", docs[ids[0]])
+		self.assertEqual(self.store.chunks.stats()["hits"], 1)
+
 	def test_dedup_on_reingest(self):
 		# first ingest
 		first_added = self.store.ingest(self.documents_paths)
@@ -213,5 +249,87 @@ class TestRAGStore(unittest.TestCase):
 		kinds = {s.get("type") for s in sources}
 		self.assertIn("picture_annotation", kinds)
 
+
+class TestRAGStoreSync(unittest.TestCase):
+	def setUp(self):
+		self._tmpdir = tempfile.mkdtemp(prefix="chroma_sync_test_")
+		self.data_dir = tempfile.mkdtemp(prefix="sync_data_")
+		self.store = RAGStore(self._tmpdir)
+		self.store.embedder = _FakeEmbedder()
+		self.store.ingest_workers = 0
+		self.converted = []
+
+		def _fake_convert(abs_path):
+			self.converted.append(abs_path)
+			return SimpleNamespace(document=abs_path)
+
+		def _fake_chunk(dl_doc):
+			with open(dl_doc, "r", encoding="utf-8") as f:
+				return [SimpleNamespace(text=ln, page=1, type="text") for ln in f.read().splitlines() if ln.strip()]
+
+		self.store._convert_auto_ocr = _fake_convert
+		self.store.chunker = SimpleNamespace(chunk=_fake_chunk)
+		self.a = self._write("a.md", "alpha chunk about kernels\nshared chunk about licenses")
+		self.b = self._write("b.md", "beta chunk about compilers")
+
+	def tearDown(self):
+		shutil.rmtree(self._tmpdir, ignore_errors=True)
+		shutil.rmtree(self.data_dir, ignore_errors=True)
+
+	def _write(self, name, text):
+		path = os.path.join(self.data_dir, name)
+		with open(path, "w", encoding="utf-8") as f:
+			f.write(text)
+		return os.path.realpath(path)
+
+	def _chroma_ids(self, path):
+		return set(self.store.collection.get(where={"source_file": path}, include=[])["ids"])
+
+	def test_new_unchanged_changed_and_deleted_files(self):
+		first = self.store.sync([self.a, self.b])
+		self.assertEqual((first["new"], len(first["added_ids"])), (2, 3))
+
+		self.converted.clear()
+		second = self.store.sync([self.a, self.b])
+		self.assertEqual((second["unchanged"], second["added_ids"]), (2, []))
+		self.assertEqual(self.converted, [])		# skipped before conversion
+
+		old_ids = self._chroma_ids(self.a)
+		self._write("a.md", "gamma chunk about kernels\nshared chunk about licenses")
+		changed = self.store.sync([self.a, self.b])
+		self.assertEqual((changed["changed"], changed["chunks_removed"]), (1, 1))
+		new_ids = self._chroma_ids(self.a)
+		self.assertEqual(len(new_ids), 2)
+		self.assertEqual(len(old_ids & new_ids), 1)		# the unchanged chunk keeps its id
+		self.assertEqual(set(self.store.manifest.get(self.a).chunk_ids), new_ids)
+		self.assertEqual(self.store.sparse_query("alpha", n_results=5, hydrate=False)["ids"][0], [])
+
+		os.remove(self.b)
+		deleted = self.store.sync([self.a])
+		self.assertEqual((deleted["deleted"], deleted["chunks_removed"]), (1, 1))
+		self.assertEqual(self._chroma_ids(self.b), set())
+		self.assertNotIn(self.b, self.store.manifest)
+		self.assertEqual(self.store.stats()["sources"], 1)
+
+	def test_new_bm25_analyzer_rebuilds_index_without_reconverting(self):
+		self.store.sync([self.a, self.b])
+		self.store.bm25.close()
+		cfg = rag_store.load_settings()
+		cfg.vectorstore.bm25_analyzer = ["stem_en"]
+		with mock.patch.object(rag_store, "load_settings", return_value=cfg):
+			stemmed = RAGStore(self._tmpdir)
+		self.assertEqual(stemmed.bm25.stats()["docs"], 3)
+		hits = stemmed.sparse_query("kernel", n_results=5, hydrate=False)["ids"][0]
+		self.assertTrue(hits)		# "kernels" only matches once stemmed
+		self.assertLessEqual(set(hits), self._chroma_ids(self.a))
+
+		stemmed._convert_auto_ocr = self.store._convert_auto_ocr
+		stemmed.chunker = self.store.chunker
+		self.converted.clear()
+		summary = stemmed.sync([self.a, self.b])
+		self.assertEqual((summary["unchanged"], summary["rebuilt"]), (2, 0))
+		self.assertEqual(self.converted, [])		# BM25 came from the stored chunks
+		stemmed.bm25.close()
+
 if __name__ == '__main__':
 	unittest.main()
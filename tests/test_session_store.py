@@ -0,0 +1,47 @@
+import unittest
+from chat_app.session_store import SessionStore
+
+
+def _words(text):
+	return len(text.split())
+
+
+class TestSessionStore(unittest.TestCase):
+	def setUp(self):
+		self.store = SessionStore("sys", count_tokens=_words, max_sessions=2, max_prompt_tokens=40)
+
+	def test_sessions_are_isolated(self):
+		self.store.append("a", "user", "hello from a")
+		self.store.append("b", "user", "hello from b")
+		self.assertEqual(self.store.window("a")[1:], [{"role": "user", "content": "hello from a"}])
+		self.assertEqual(self.store.window("b")[1:], [{"role": "user", "content": "hello from b"}])
+
+	def test_window_respects_token_budget(self):
+		for i in range(10):
+			self.store.append("a", "user", f"question {i}")
+			self.store.append("a", "assistant", f"answer {i}")
+		self.store.append("a", "user", "last question")
+
+		window = self.store.window("a")
+		self.assertEqual(window[0], {"role": "system", "content": "sys"})
+		self.assertEqual(window[1]["role"], "user")
+		self.assertEqual(window[-1], {"role": "user", "content": "last question"})
+		# each message costs words + template overhead (8); the system message too
+		self.assertLessEqual(sum(_words(m["content"]) + 8 for m in window), 40)
+
+	def test_last_message_kept_even_over_budget(self):
+		self.store.append("a", "user", "word " * 100)
+		self.assertEqual(len(self.store.window("a")), 2)
+
+	def test_lru_eviction(self):
+		self.store.append("a", "user", "1")
+		self.store.append("b", "user", "2")
+		self.store.window("a")	# a is now most recently used
+		self.store.append("c", "user", "3")
+		self.assertIn("a", self.store)
+		self.assertNotIn("b", self.store)
+		self.assertEqual(self.store.stats()["evicted"], 1)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -2,7 +2,7 @@ import os
 import unittest
 import tempfile
 from unittest import mock
-from chat_app.settings import Settings, save_settings, load_settings
+from chat_app.settings import Settings, save_settings, load_settings, merge_settings, get_settings, subscribe_settings
 
 
 class TestSettingsRoundtrip(unittest.TestCase):
@@ -30,5 +30,53 @@ class TestSettingsRoundtrip(unittest.TestCase):
             self.assertFalse(os.path.exists(path))
             self.assertTrue(os.path.exists(os.path.splitext(path)[0] + ".json"))
 
+    def test_secret_dirs_are_not_duplicated_across_saves(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "settings.toml")
+            from chat_app import settings as cfg
+            with mock.patch.object(cfg, "tomli_w", None):
+                save_settings({"paths": {"secret_dirs": ["private", "private", ".ssh"]}}, path)
+                for _ in range(2):
+                    save_settings(load_settings(path), path)
+                loaded = load_settings(path)
+            self.assertEqual(loaded.paths.secret_dirs, ["private", ".ssh"])
+
+
+class TestCachedSettings(unittest.TestCase):
+    def test_cached_until_saved(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "settings.toml")
+            first = get_settings(path)
+            self.assertIs(get_settings(path), first)
+
+            seen = []
+            unsubscribe = subscribe_settings(seen.append)
+            self.addCleanup(unsubscribe)
+            save_settings(merge_settings(first, {"app": {"port": 4242}}), path)
+            reloaded = get_settings(path)
+
+            self.assertIsNot(reloaded, first)
+            self.assertEqual(reloaded.app.port, 4242)
+            self.assertEqual([s.app.port for s in seen], [4242])
+            self.assertIs(get_settings(path), reloaded)
+
+    def test_reloads_when_file_changes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "settings.toml")
+            save_settings(Settings(), path)
+            self.assertEqual(get_settings(path).app.port, 8000)
+
+            # edited behind the provider's back: only the mtime tells it apart
+            from chat_app import settings as cfg
+            changed = Settings()
+            changed.app.port = 9001
+            with mock.patch.object(cfg._provider, "invalidate"):
+                save_settings(changed, path)
+            written = path if os.path.exists(path) else os.path.splitext(path)[0] + ".json"
+            stat = os.stat(written)
+            os.utime(written, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+            self.assertEqual(get_settings(path).app.port, 9001)
+
+
 if __name__ == '__main__':
     unittest.main()
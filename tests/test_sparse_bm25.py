@@ -0,0 +1,345 @@
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+from collections import Counter
+from chat_app.sparse_bm25 import BM25Index
+from chat_app import sparse_csr
+
+
+def _okapi_scores(corpus, query, k1=1.5, b=0.75, epsilon=0.25):
+	# brute-force rank_bm25.BM25Okapi.get_scores
+	n = len(corpus)
+	avgdl = sum(len(d) for d in corpus) / n
+	df = Counter(t for d in corpus for t in set(d))
+	idf = {t: math.log(n - c + 0.5) - math.log(c + 0.5) for t, c in df.items()}
+	floor = epsilon * sum(idf.values()) / len(idf)
+	idf = {t: (v if v >= 0 else floor) for t, v in idf.items()}
+	scores = []
+	for d in corpus:
+		tf = Counter(d)
+		s = 0.0
+		for q in query:
+			f = tf.get(q, 0)
+			s += idf.get(q, 0.0) * f * (k1 + 1) / (f + k1 * (1 - b + b * len(d) / avgdl))
+		scores.append(s)
+	return scores
+
+
+class TestBM25Index(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="bm25_test_")
+		self.path = os.path.join(self.tmp, "bm25_corpus.jsonl")
+		rng = random.Random(0)
+		vocab = [f"w{i}" for i in range(60)]
+		self.texts = [" ".join(rng.choices(vocab, k=rng.randint(3, 30))) for _ in range(200)]
+		self.ids = [f"doc{i}" for i in range(len(self.texts))]
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def test_scores_match_okapi(self):
+		index = BM25Index(self.path)
+		index.add(self.ids, self.texts)
+		corpus = [index._tok(t) for t in self.texts]
+		for query in ("w1 w2", "w3 w3 w40", "w59 unknown", "w0"):
+			expected = _okapi_scores(corpus, index._tok(query))
+			got = dict(index.search(query, top_k=len(self.ids)))
+			for _id, s in zip(self.ids, expected):
+				self.assertAlmostEqual(got.get(_id, 0.0), s, places=9)
+
+	def test_top_k_is_sorted_and_bounded(self):
+		index = BM25Index(self.path)
+		index.add(self.ids, self.texts)
+		hits = index.search("w5 w7 w11", top_k=5)
+		self.assertEqual(len(hits), 5)
+		scores = [s for _, s in hits]
+		self.assertEqual(scores, sorted(scores, reverse=True))
+		self.assertEqual(index.search("nothing matches", top_k=5), [])
+
+	def test_incremental_adds_match_okapi_on_whole_corpus(self):
+		index = BM25Index(self.path)
+		for start in range(0, len(self.ids), 30):
+			index.add(self.ids[start:start + 30], self.texts[start:start + 30])
+			index.search("w1", top_k=1)		# refresh statistics between batches
+		corpus = [index._tok(t) for t in self.texts]
+		expected = _okapi_scores(corpus, ["w2", "w8"])
+		got = dict(index.search("w2 w8", top_k=len(self.ids)))
+		for _id, s in zip(self.ids, expected):
+			self.assertAlmostEqual(got.get(_id, 0.0), s, places=9)
+
+	def test_load_restores_index(self):
+		index = BM25Index(self.path)
+		index.add(self.ids[:100], self.texts[:100])
+		index.add(self.ids[100:], self.texts[100:])
+		loaded = BM25Index(self.path)
+		loaded.load()
+		self.assertEqual(len(loaded), len(self.ids))
+		self.assertEqual(loaded.search("w9 w10", top_k=10), index.search("w9 w10", top_k=10))
+
+
+
+class TestBM25Delete(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="bm25_delete_test_")
+		self.path = os.path.join(self.tmp, "bm25_corpus.jsonl")
+		self.index = BM25Index(self.path, compact_ratio=0)
+		self.index.add(["a1", "a2"], ["alpha beta", "alpha gamma"], sources=["a.md", "a.md"])
+		self.index.add(["b1", "b2"], ["beta delta", "gamma delta"], sources=["b.md", "b.md"])
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def _hit_ids(self, query):
+		return {i for i, _ in self.index.search(query, top_k=10)}
+
+	def test_delete_by_id_hides_document(self):
+		self.assertEqual(self.index.delete(["a1", "missing"]), 1)
+		self.assertNotIn("a1", self._hit_ids("alpha beta"))
+		self.assertNotIn("a1", self.index)
+		self.assertEqual(len(self.index), 3)
+
+	def test_delete_by_source(self):
+		self.assertEqual(self.index.delete_source("a.md"), 2)
+		self.assertEqual(self._hit_ids("alpha beta gamma delta"), {"b1", "b2"})
+		self.assertEqual(self.index.stats()["sources"], 1)
+
+	def test_readd_replaces_previous_version(self):
+		self.index.add(["a1"], ["epsilon"], sources=["a.md"])
+		self.assertEqual(self._hit_ids("epsilon"), {"a1"})
+		self.assertNotIn("a1", self._hit_ids("beta"))
+		self.assertEqual(len(self.index), 4)
+
+	def test_deletes_survive_reload(self):
+		self.index.delete_source("b.md")
+		loaded = BM25Index(self.path)
+		loaded.load()
+		self.assertEqual(len(loaded), 2)
+		self.assertEqual({i for i, _ in loaded.search("delta beta", top_k=10)}, {"a1"})
+
+	def test_compaction_rewrites_file_and_matches_fresh_index(self):
+		self.index.delete(["a2", "b2"])
+		self.index.compact()
+		with open(self.path, encoding="utf-8") as f:
+			self.assertEqual(f.read(), "")		# journal emptied into the segment
+		stats = self.index.stats()
+		self.assertEqual((stats["deleted"], stats["segment_docs"], stats["journal_docs"]), (0, 2, 0))
+
+		fresh = BM25Index(os.path.join(self.tmp, "fresh.jsonl"))
+		fresh.add(["a1", "b1"], ["alpha beta", "beta delta"])
+		self.assertEqual(self.index.search("beta delta", top_k=5), fresh.search("beta delta", top_k=5))
+
+	def test_auto_compaction(self):
+		index = BM25Index(os.path.join(self.tmp, "auto.jsonl"), compact_ratio=0.5)
+		index.add(["x", "y", "z", "w"], ["one", "two", "three", "four"])
+		index.delete(["x"])
+		self.assertEqual(index.stats()["deleted"], 1)
+		index.delete(["y"])
+		self.assertEqual(index.stats()["deleted"], 0)
+		self.assertEqual(len(index), 2)
+
+
+class TestBM25Segment(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="bm25_segment_test_")
+		self.path = os.path.join(self.tmp, "bm25_corpus.jsonl")
+		rng = random.Random(1)
+		vocab = [f"w{i}" for i in range(80)] + ["zażółć", "gęślą"]
+		self.texts = [" ".join(rng.choices(vocab, k=rng.randint(3, 30))) for _ in range(150)]
+		self.ids = [f"doc{i}" for i in range(len(self.texts))]
+		self.sources = [f"f{i % 7}.md" for i in range(len(self.texts))]
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def _reloaded(self):
+		index = BM25Index(self.path)
+		index.load()
+		return index
+
+	def test_legacy_jsonl_is_migrated_on_load(self):
+		with open(self.path, "w", encoding="utf-8") as f:
+			for _id, text in zip(self.ids, self.texts):
+				f.write(json.dumps({"id": _id, "tokens": text.split()}, ensure_ascii=False) + "\n")
+		index = self._reloaded()
+		self.assertTrue(os.path.exists(index.segment_path))
+		self.assertEqual(os.path.getsize(self.path), 0)
+		self.assertEqual(index.stats()["segment_docs"], len(self.ids))
+		corpus = [t.split() for t in self.texts]
+		for query in ("w1 w2", "zażółć w3", "gęślą"):
+			expected = _okapi_scores(corpus, query.split())
+			got = dict(index.search(query, top_k=len(self.ids)))
+			for _id, s in zip(self.ids, expected):
+				self.assertAlmostEqual(got.get(_id, 0.0), s, places=9)
+		index.close()
+
+	def test_segment_plus_journal_matches_okapi(self):
+		index = BM25Index(self.path, compact_ratio=0)
+		index.add(self.ids[:100], self.texts[:100], sources=self.sources[:100])
+		index.compact()
+		index.add(self.ids[100:], self.texts[100:], sources=self.sources[100:])
+		index.add(["doc3"], ["w5 w5 zażółć"], sources=["f3.md"])		# replaces a segment document
+		index.delete(["doc7", "doc120"])
+		reloaded = self._reloaded()
+		texts = dict(zip(self.ids, self.texts))
+		texts["doc3"] = "w5 w5 zażółć"
+		del texts["doc7"], texts["doc120"]
+		for idx in (index, reloaded):
+			self.assertEqual(len(idx), len(texts))
+			self.assertIn("doc3", idx)
+			self.assertNotIn("doc7", idx)
+		# tombstones still count in N/df until compaction, so compare scores after it
+		reloaded.compact()
+		corpus = [index._tok(t) for t in texts.values()]
+		for query in ("w5 zażółć", "w10 w11 w12"):
+			expected = _okapi_scores(corpus, index._tok(query))
+			got = dict(reloaded.search(query, top_k=len(texts)))
+			for _id, s in zip(texts, expected):
+				self.assertAlmostEqual(got.get(_id, 0.0), s, places=9)
+		self.assertEqual(reloaded.stats()["journal_docs"], 0)
+		index.close()
+		reloaded.close()
+
+	def test_delete_source_reaches_segment_documents(self):
+		index = BM25Index(self.path, compact_ratio=0)
+		index.add(self.ids, self.texts, sources=self.sources)
+		index.compact()
+		n = self.sources.count("f2.md")
+		self.assertEqual(index.delete_source("f2.md"), n)
+		self.assertEqual(self._reloaded().stats()["sources"], 6)
+		self.assertFalse({_id for _id, _ in index.search("w1 w2 w3", top_k=200)} &
+						 {i for i, s in zip(self.ids, self.sources) if s == "f2.md"})
+		index.close()
+
+	def test_source_table_is_binary_searched(self):
+		sources = [f"dir{i % 31}/file{(i * 17) % 53}.md" for i in range(len(self.ids))]
+		index = BM25Index(self.path, compact_ratio=0)
+		index.add(self.ids, self.texts, sources=sources)
+		index.compact()
+		seg = index._seg
+		self.assertEqual(seg.n_sources, len(set(sources)))
+		for src in set(sources):
+			s = seg.source_index(src)
+			self.assertEqual(seg.source(s), src)
+			self.assertEqual(list(seg.source_docs(s)), [d for d, x in enumerate(sources) if x == src])
+		for missing in ("", "dir0", "dir99/file0.md", "zzz"):
+			self.assertIsNone(seg.source_index(missing))
+		index.close()
+
+
+@unittest.skipIf(sparse_csr.np is None, "numpy/scipy not installed")
+class TestCSRBM25Index(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="bm25_csr_test_")
+		rng = random.Random(2)
+		vocab = [f"w{i}" for i in range(70)]
+		self.texts = [" ".join(rng.choices(vocab, k=rng.randint(3, 30))) for _ in range(180)]
+		self.ids = [f"doc{i}" for i in range(len(self.texts))]
+		self.queries = ["w1 w2", "w3 w3 w40", "w69 unknown", "nothing here", "w0"]
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def _pair(self):
+		inv = BM25Index(os.path.join(self.tmp, "inv", "bm25_corpus.jsonl"), compact_ratio=0)
+		csr = sparse_csr.CSRBM25Index(os.path.join(self.tmp, "csr", "bm25_corpus.jsonl"), compact_ratio=0)
+		for idx in (inv, csr):
+			idx.add(self.ids[:120], self.texts[:120])
+			idx.compact()		# segment + journal, with a replaced and a deleted doc
+			idx.add(self.ids[120:], self.texts[120:])
+			idx.add(["doc5"], ["w1 w1 w2"])
+			idx.delete(["doc9", "doc150"])
+		return inv, csr
+
+	def test_matches_inverted_index(self):
+		inv, csr = self._pair()
+		for q in self.queries:
+			want = dict(inv.search(q, top_k=len(self.ids)))
+			got = dict(csr.search(q, top_k=len(self.ids)))
+			self.assertEqual(set(got), set(want))
+			for _id, s in want.items():
+				self.assertAlmostEqual(got[_id], s, places=9)
+		inv.close()
+		csr.close()
+
+	def test_batch_equals_single_queries(self):
+		_, csr = self._pair()
+		batch = csr.search_batch(self.queries, top_k=7)
+		self.assertEqual(batch, [csr.search(q, top_k=7) for q in self.queries])
+		for hits in batch:
+			self.assertLessEqual(len(hits), 7)
+			self.assertEqual([s for _, s in hits], sorted((s for _, s in hits), reverse=True))
+			self.assertFalse({"doc9", "doc150"} & {i for i, _ in hits})
+		csr.close()
+
+	def test_scores_match_okapi_after_compaction(self):
+		_, csr = self._pair()
+		csr.compact()
+		texts = dict(zip(self.ids, self.texts))
+		texts["doc5"] = "w1 w1 w2"
+		del texts["doc9"], texts["doc150"]
+		corpus = [csr._tok(t) for t in texts.values()]
+		expected = _okapi_scores(corpus, ["w1", "w2"])
+		got = dict(csr.search("w1 w2", top_k=len(texts)))
+		for _id, s in zip(texts, expected):
+			self.assertAlmostEqual(got.get(_id, 0.0), s, places=9)
+		csr.close()
+
+
+class TestBM25Concurrency(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix="bm25_concurrency_test_")
+		rng = random.Random(2)
+		vocab = [f"w{i}" for i in range(40)]
+		self.texts = [" ".join(rng.choices(vocab, k=rng.randint(3, 20))) for _ in range(300)]
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp, ignore_errors=True)
+
+	def _hammer(self, index):
+		# searches keep running while every add/delete compacts the segment under them
+		index.add([f"doc{i}" for i in range(100)], self.texts[:100])
+		stop = threading.Event()
+		errors = []
+
+		def search():
+			while not stop.is_set():
+				try:
+					index.search("w1 w2 w3", top_k=5)
+					index.search_batch(["w4", "w5 w6"], top_k=5)
+					len(index)
+					index.stats()
+				except Exception as e:
+					errors.append(e)
+					return
+
+		readers = [threading.Thread(target=search) for _ in range(4)]
+		for t in readers:
+			t.start()
+		try:
+			for i in range(100, 300, 10):
+				index.add([f"doc{j}" for j in range(i, i + 10)], self.texts[i:i + 10])
+				index.delete([f"doc{i - 100}"])
+		finally:
+			stop.set()
+			for t in readers:
+				t.join()
+		self.assertEqual(errors, [])
+		self.assertEqual(len(index), 300 - 20)
+		self.assertTrue(index.search("w1", top_k=3))
+		self.assertEqual([f for f in os.listdir(self.tmp) if f.endswith(".new")], [])
+		index.close()
+
+	def test_search_during_compaction(self):
+		self._hammer(BM25Index(os.path.join(self.tmp, "inverted.jsonl"), compact_ratio=1e-9, merge_docs=1))
+
+	def test_csr_search_during_compaction(self):
+		self._hammer(sparse_csr.CSRBM25Index(os.path.join(self.tmp, "csr.jsonl"), compact_ratio=1e-9, merge_docs=1))
+
+
+if __name__ == "__main__":
+	unittest.main()
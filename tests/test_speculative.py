@@ -0,0 +1,64 @@
+import unittest
+import torch
+from transformers import LlamaConfig, LlamaForCausalLM
+from chat_app.speculative import SpeculativeDecoder
+
+
+def _tiny_model(layers=2, seed=0):
+	torch.manual_seed(seed)
+	config = LlamaConfig(
+		vocab_size=128, hidden_size=32, intermediate_size=64,
+		num_hidden_layers=layers, num_attention_heads=2, num_key_value_heads=2,
+		pad_token_id=0, eos_token_id=None,
+	)
+	return LlamaForCausalLM(config).eval()
+
+
+def _greedy(model, prompt, n):
+	return model.generate(
+		input_ids=prompt.unsqueeze(0),
+		attention_mask=torch.ones(1, prompt.numel(), dtype=torch.long),
+		max_new_tokens=n, do_sample=False, pad_token_id=0,
+	)[0]
+
+
+class TestSpeculativeDecoder(unittest.TestCase):
+	def setUp(self):
+		self.target = _tiny_model(layers=2, seed=0)
+		self.prompt = torch.tensor([5, 6, 7, 8, 9])
+
+	def test_same_draft_accepts_everything(self):
+		decoder = SpeculativeDecoder(self.target, self.target, num_draft_tokens=4)
+		seq, stats, _ = decoder.generate(self.prompt.unsqueeze(0), max_new_tokens=12)
+		self.assertTrue(torch.equal(seq[0], _greedy(self.target, self.prompt, 12)))
+		self.assertEqual(stats.new_tokens, 12)
+		self.assertEqual(stats.acceptance_rate, 1.0)
+		self.assertLess(stats.target_passes, 12)
+
+	def test_other_draft_matches_target_greedy(self):
+		draft = _tiny_model(layers=1, seed=1)
+		decoder = SpeculativeDecoder(self.target, draft, num_draft_tokens=3)
+		seq, stats, _ = decoder.generate(self.prompt.unsqueeze(0), max_new_tokens=10)
+		self.assertTrue(torch.equal(seq[0], _greedy(self.target, self.prompt, 10)))
+		self.assertEqual(stats.new_tokens, 10)
+		self.assertLessEqual(stats.accepted, stats.proposed)
+
+	def test_stops_at_eos(self):
+		first = int(_greedy(self.target, self.prompt, 1)[-1])
+		decoder = SpeculativeDecoder(self.target, self.target, num_draft_tokens=4)
+		seq, stats, _ = decoder.generate(self.prompt.unsqueeze(0), max_new_tokens=10, eos_token_id=first)
+		self.assertEqual(seq[0, 5:].tolist(), [first])
+		self.assertEqual(stats.new_tokens, 1)
+
+	def test_stop_callback_ends_generation(self):
+		decoder = SpeculativeDecoder(self.target, self.target, num_draft_tokens=4)
+		rounds = []
+		seq, stats, _ = decoder.generate(self.prompt.unsqueeze(0), max_new_tokens=12,
+										 stop=lambda: rounds.append(1) or len(rounds) > 1)
+		self.assertEqual(stats.target_passes, 1)
+		self.assertTrue(torch.equal(seq[0], _greedy(self.target, self.prompt, 12)[:seq.shape[-1]]))
+		self.assertLess(stats.new_tokens, 12)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,59 @@
+import threading
+import time
+import unittest
+from chat_app.worker_pool import WorkerPool, Overloaded
+
+
+class TestWorkerPool(unittest.TestCase):
+	def setUp(self):
+		self.pool = WorkerPool("test", max_workers=1, max_queue=1, timeout_s=5)
+
+	def tearDown(self):
+		self.pool.shutdown()
+
+	def test_run_returns_result_on_pool_thread(self):
+		name = self.pool.run(lambda: threading.current_thread().name)
+		self.assertTrue(name.startswith("test-pool"))
+		self.assertEqual(self.pool.snapshot()["completed"], 1)
+
+	def test_run_propagates_errors(self):
+		def _boom():
+			raise ValueError("boom")
+		with self.assertRaises(ValueError):
+			self.pool.run(_boom)
+		snap = self.pool.snapshot()
+		self.assertEqual(snap["failed"], 1)
+		self.assertEqual(snap["in_flight"], 0)
+
+	def test_rejects_beyond_workers_plus_queue(self):
+		gate = threading.Event()
+		threads = [threading.Thread(target=self.pool.run, args=(gate.wait,)) for _ in range(2)]
+		for t in threads:
+			t.start()
+		deadline = time.time() + 5
+		while self.pool.snapshot()["in_flight"] < 2 and time.time() < deadline:
+			time.sleep(0.01)
+
+		with self.assertRaises(Overloaded):
+			self.pool.run(lambda: None)
+		gate.set()
+		for t in threads:
+			t.join(timeout=5)
+		snap = self.pool.snapshot()
+		self.assertEqual(snap["rejected"], 1)
+		self.assertEqual(snap["completed"], 2)
+		self.assertEqual(self.pool.run(lambda: 42), 42)
+
+	def test_reserve_holds_slot_until_released(self):
+		releases = [self.pool.reserve(), self.pool.reserve()]
+		with self.assertRaises(Overloaded):
+			self.pool.reserve()
+		releases[0]()
+		releases[0]()	# idempotent
+		self.assertEqual(self.pool.snapshot()["in_flight"], 1)
+		releases[1]()
+		self.assertEqual(self.pool.snapshot()["in_flight"], 0)
+
+
+if __name__ == "__main__":
+	unittest.main()